@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import Optional
 
 
 class Settings(BaseSettings):
@@ -16,9 +17,131 @@ class Settings(BaseSettings):
     secret_key: str
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 1440  # 24 hours
+    token_cache_size: int = 10000  # Verified tokens kept in memory
     
     # AI Provider Configuration
     groq_api_key: str
+    groq_base_url: Optional[str] = None  # Override to point at a local stand-in
+    
+    # Gmail API endpoint override (benchmarks / offline runs)
+    gmail_api_endpoint: Optional[str] = None
+    
+    # Shared state (sessions, OAuth state tokens, conversations).
+    # memory:// only works with a single worker; use redis://host:6379/0 to scale out.
+    state_backend_url: str = "memory://"
+    oauth_state_ttl_seconds: int = 600
+    
+    # Conversation store limits
+    conversation_max_messages: int = 100
+    conversation_idle_ttl_seconds: int = 6 * 3600
+    conversation_max_bytes: int = 64 * 1024 * 1024
+    
+    # Logging: JSON lines by default; gmail/ai success logs kept for this
+    # fraction of requests (warnings and errors are never sampled)
+    log_level: str = "INFO"
+    log_format: str = "json"  # json | text
+    log_success_sample_rate: float = 0.1
+    
+    # Load Google/Groq client libraries in the background at startup
+    # (otherwise on first use)
+    warm_up_on_startup: bool = True
+    
+    # Shared resources (created in the lifespan). Inbox messages are processed
+    # on one shared pool, at most email_worker_threads_per_user jobs per user at
+    # a time (0 disables); Groq calls share one HTTP connection pool.
+    email_worker_threads: int = 16
+    email_worker_threads_per_user: int = 5
+    llm_http_max_connections: int = 20
+    llm_http_timeout_seconds: float = 60.0
+    shutdown_drain_seconds: float = 20.0
+
+    # Response compression (brotli when installed, else gzip) for bodies of at
+    # least this many bytes; 0 disables
+    compression_min_bytes: int = 1024
+    compression_gzip_level: int = 6
+    compression_brotli_quality: int = 4
+    
+    # Per-user Gmail quota governor. Calls are paced to stay under
+    # gmail_quota_units_per_second (Gmail meters each method in quota units;
+    # Google's per-user limit is 250/s) and queue when the budget is spent.
+    # Concurrent calls per user adapt between the min and max (AIMD): up while
+    # latency stays within gmail_latency_tolerance x its baseline, halved on a
+    # 429. Rate-limited calls are retried after a pause of Retry-After (capped).
+    gmail_quota_units_per_second: float = 250.0
+    gmail_quota_burst_units: float = 250.0
+    gmail_initial_concurrency: int = 5
+    gmail_min_concurrency: int = 1
+    gmail_max_concurrency: int = 16
+    gmail_latency_tolerance: float = 2.0
+    gmail_rate_limit_retries: int = 3
+    gmail_max_pause_seconds: float = 30.0
+    
+    # Per-user LLM budgets over a sliding window (0 disables a limit).
+    # Above llm_degrade_ratio of the budget calls use the fallback model; over
+    # budget, summaries come from cache or the local extractive summarizer and
+    # replies get 429.
+    llm_budget_window_seconds: int = 3600
+    llm_user_token_budget: int = 200_000
+    llm_user_request_budget: int = 1000
+    llm_degrade_ratio: float = 0.8
+    llm_fallback_model: str = "llama-3.1-8b-instant"
+    llm_user_max_concurrency: int = 5  # Concurrent LLM calls per user; extra calls queue
+    llm_queue_timeout_seconds: float = 30.0
+    summary_cache_size: int = 5000
+    # Only the top-K threads of an inbox page (by local triage score) get LLM
+    # summaries; the rest get a local preview. 0 summarizes every thread.
+    triage_llm_top_k: int = 3
+    # Messages shorter than this are summarized locally (extractive); LLM
+    # summaries that fail or take longer than the timeout degrade to the same
+    extractive_max_chars: int = 400
+    llm_summary_timeout_seconds: float = 15.0
+    # Digests of many emails (map-reduce): threads are summarized at most
+    # digest_map_concurrency at a time, then merged in groups of up to
+    # digest_reduce_input_tokens per LLM call until one digest is left.
+    # Finished steps are checkpointed so an interrupted digest resumes.
+    digest_max_messages: int = 500
+    digest_map_concurrency: int = 4
+    digest_reduce_input_tokens: int = 3000
+    digest_checkpoint_ttl_seconds: int = 6 * 3600
+    
+    # Reply outbox: sends are accepted at once, persisted to a local SQLite
+    # file and delivered by background workers with exponential backoff.
+    # A claimed send not finished within the lease is retried.
+    outbox_path: str = "outbox.sqlite3"
+    outbox_workers: int = 2
+    outbox_max_attempts: int = 6
+    outbox_backoff_seconds: float = 2.0
+    outbox_backoff_max_seconds: float = 300.0
+    outbox_lease_seconds: float = 120.0
+    outbox_poll_seconds: float = 1.0
+    outbox_retention_seconds: int = 7 * 24 * 3600  # Finished sends kept for status lookups
+    reply_header_cache_size: int = 5000
+    
+    # Local search over summarized threads: hashed TF-IDF vectors in
+    # vector_index_dims buckets, at most vector_index_max_docs threads per
+    # user (oldest evicted). Memory is dims * 4 bytes per thread; see
+    # benchmarks/bench_vector_index.py for the recall/latency trade-off.
+    # Users idle for vector_index_idle_ttl_seconds are dropped, and beyond
+    # vector_index_max_bytes (all users) the least recently used go first.
+    vector_index_dims: int = 512
+    vector_index_max_docs: int = 20000
+    vector_index_idle_ttl_seconds: int = 24 * 3600
+    vector_index_max_bytes: int = 256 * 1024 * 1024
+    
+    # Admin API (profiles, usage); disabled unless a token is set.
+    # Send it as the X-Admin-Token header.
+    admin_token: Optional[str] = None
+    
+    # Request profiling: off | header (X-Profile: <admin token>) | threshold
+    profiling_mode: str = "off"
+    profiling_threshold_ms: int = 2000
+    profiling_interval_ms: float = 5.0
+    profiling_dir: str = "profiles"
+    
+    # Tracing: none | console | file | otlp
+    trace_exporter: str = "none"
+    trace_file: str = "traces.jsonl"
+    trace_sample_rate: float = 1.0
     
     # Frontend URL
     frontend_url: str = "http://localhost:5173"
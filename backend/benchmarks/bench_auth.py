@@ -0,0 +1,79 @@
+"""
+Micro-benchmark of the auth dependency chain.
+
+Compares, per request that needs both the user and Google credentials:
+
+- ``baseline``: full JWT decode plus two session lookups (the previous chain)
+- ``context``: ``get_auth_context`` with a cold verified-token cache
+- ``cached``: ``get_auth_context`` with the token already verified
+
+Run from ``backend/``::
+
+    python -m benchmarks.bench_auth --iterations 20000
+"""
+from typing import List, Optional
+import argparse
+import asyncio
+import logging
+import sys
+import time
+from fastapi.security import HTTPAuthorizationCredentials
+from benchmarks.harness import configure_environment, seed_session
+
+
+def _time_per_call(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args(argv)
+    logging.disable(logging.INFO)
+
+    configure_environment("http://127.0.0.1:9", "http://127.0.0.1:9")
+    from services.auth_service import auth_service
+    from utils.dependencies import get_auth_context, get_current_user, get_google_credentials
+    from utils.jwt_handler import verify_token, verified_tokens
+
+    token = seed_session()
+    bearer = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+    loop = asyncio.new_event_loop()
+
+    def baseline():
+        payload = verify_token(token)
+        auth_service.get_user_session(payload["sub"])
+        auth_service.get_user_session(payload["sub"])
+
+    async def resolve():
+        context = await get_auth_context(bearer)
+        await get_current_user(context)
+        await get_google_credentials(context)
+
+    def cold():
+        verified_tokens.invalidate_subject("bench.user@example.com")
+        loop.run_until_complete(resolve())
+
+    def cached():
+        loop.run_until_complete(resolve())
+
+    def loop_overhead():
+        loop.run_until_complete(asyncio.sleep(0))
+
+    overhead = _time_per_call(loop_overhead, args.iterations)
+    results = {
+        "baseline": _time_per_call(baseline, args.iterations),
+        "context": _time_per_call(cold, args.iterations) - overhead,
+        "cached": _time_per_call(cached, args.iterations) - overhead,
+    }
+    for name, micros in results.items():
+        print(f"{name:<10}{micros:>10.2f} us/request")
+    print(f"speedup (baseline/cached): {results['baseline'] / results['cached']:.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+"""
+Gmail rate limiting with and without the per-user quota governor.
+
+The Gmail stand-in enforces a per-user budget of ``--units`` quota units per
+second, charging each method its Gmail cost (``threads.get`` 10 units,
+``messages.list`` 5, ...) and answering 429 ``userRateLimitExceeded`` beyond
+it. Against it, one user builds a digest of the whole mailbox (a burst of
+``threads.get`` calls) while loading their inbox ``--inbox`` times. Each
+mode runs as a fresh user so no summaries or checkpoints carry over:
+
+- ``off``: no pacing and no retries (the previous behaviour)
+- ``on``: ``gmail_quota`` pacing, AIMD concurrency and 429 retries
+
+Reports the 429s Gmail returned, digest threads lost to errors, inbox loads
+that failed or came back empty, and wall time. Run from ``backend/``::
+
+    python -m benchmarks.bench_gmail_quota
+    python -m benchmarks.bench_gmail_quota --units 100 --mailbox 300
+"""
+from typing import List, Optional
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import httpx
+from benchmarks.fakes.common import LatencyModel, RateLimiter
+from benchmarks.fakes.gmail import create_gmail_app
+from benchmarks.fakes.groq import create_groq_app
+from benchmarks.harness import offline_stack, seed_session
+
+
+def _run_digest(api: str, headers: dict, result: dict) -> None:
+    listed = threads = 0
+    with httpx.stream("POST", f"{api}/api/emails/digest", json={"days": 365, "refresh": True},
+                      headers=headers, timeout=600) as response:
+        for line in response.iter_lines():
+            event = json.loads(line)
+            if event["type"] == "progress" and event.get("stage") == "map":
+                listed = event.get("total", listed)
+            elif event["type"] == "digest":
+                threads = event["digest"]["threads"]
+    result.update(listed=listed, threads=threads)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--units", type=float, default=250.0, help="Per-user quota units per second enforced by the stand-in")
+    parser.add_argument("--mailbox", type=int, default=200, help="Messages in the stand-in mailbox")
+    parser.add_argument("--inbox", type=int, default=10, help="Inbox loads during the digest")
+    parser.add_argument("--gmail-latency", default="lognormal:30:0.5")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    os.environ["OUTBOX_PATH"] = os.environ.get("OUTBOX_PATH", "/tmp/bench-gmail-quota.sqlite3")
+    gmail_app = create_gmail_app(
+        latency=LatencyModel.parse(args.gmail_latency, seed=args.seed),
+        limiter=RateLimiter(rate=args.units, burst=int(args.units)),
+        mailbox_size=args.mailbox,
+        seed=args.seed,
+        unit_costs=True
+    )
+    rows = []
+    with offline_stack(gmail_app, create_groq_app(per_token_ms=0)) as stack:
+        logging.disable(logging.WARNING)
+        from app.config import get_settings
+        from services.gmail_quota import gmail_quota
+
+        settings = get_settings()
+        units_per_second, retries = gmail_quota.rate, settings.gmail_rate_limit_retries
+        for mode in ("off", "on"):
+            gmail_quota.rate = units_per_second if mode == "on" else 0
+            settings.gmail_rate_limit_retries = retries if mode == "on" else 0
+            headers = {"Authorization": f"Bearer {seed_session(f'quota-{mode}@example.com')}"}
+            stats = gmail_app.state.stats
+            before_requests, before_limited = stats["requests"], stats["rate_limited"]
+            started = time.perf_counter()
+
+            digest: dict = {}
+            worker = threading.Thread(target=_run_digest, args=(stack["api"], headers, digest))
+            worker.start()
+            failed = empty = 0
+            for _ in range(args.inbox):
+                response = httpx.get(f"{stack['api']}/api/emails/recent", headers=headers, timeout=120)
+                if response.status_code != 200:
+                    failed += 1
+                elif not response.json():
+                    empty += 1
+                time.sleep(0.2)
+            worker.join()
+            rows.append((
+                mode, stats["requests"] - before_requests, stats["rate_limited"] - before_limited,
+                digest.get("threads", 0), digest.get("listed", 0), failed, empty, time.perf_counter() - started
+            ))
+        gmail_quota.rate, settings.gmail_rate_limit_retries = units_per_second, retries
+
+    print(f"stand-in limit {args.units:.0f} units/s; {args.mailbox}-message mailbox; {args.inbox} inbox loads during the digest")
+    print(f"{'governor':<10}{'gmail calls':>12}{'429s':>7}{'digest threads':>16}{'inbox failed':>14}{'inbox empty':>13}{'seconds':>9}")
+    for mode, calls, limited, threads, listed, failed, empty, seconds in rows:
+        print(f"{mode:<10}{calls:>12}{limited:>7}{f'{threads}/{listed}':>16}{failed:>14}{empty:>13}{seconds:>9.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
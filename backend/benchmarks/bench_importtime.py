@@ -0,0 +1,134 @@
+"""
+Cold-start cost of importing the API (``python -X importtime``).
+
+Imports ``main`` in fresh interpreters and reports the median cumulative
+import time of ``main``, the heaviest top-level packages it pulls in and the
+wall-clock time to a constructed app. Append runs to a JSON-lines history
+file to track startup cost over time.
+
+Run from ``backend/``::
+
+    python -m benchmarks.bench_importtime --runs 5
+    python -m benchmarks.bench_importtime --history benchmarks/importtime.jsonl
+"""
+from collections import defaultdict
+from datetime import datetime, timezone
+from statistics import median
+from typing import Dict, List, Optional, Tuple
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+# Packages worth watching individually
+WATCHED = (
+    "fastapi", "pydantic", "groq", "httpx", "googleapiclient", "google_auth_oauthlib",
+    "google", "bs4", "jose", "opentelemetry", "redis", "orjson", "tenacity",
+)
+
+_DUMMY_ENV = {
+    "GOOGLE_CLIENT_ID": "bench",
+    "GOOGLE_CLIENT_SECRET": "bench",
+    "GOOGLE_REDIRECT_URI": "http://localhost/callback",
+    "SECRET_KEY": "bench",
+    "GROQ_API_KEY": "bench",
+}
+
+
+def _parse(stderr: str) -> Tuple[int, Dict[str, int]]:
+    """Return (cumulative us of ``main``, cumulative us per top-level package)."""
+    total = 0
+    packages: Dict[str, int] = defaultdict(int)
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        try:
+            _, cumulative, name = line[len("import time:"):].split("|")
+            cumulative_us = int(cumulative)
+        except ValueError:
+            continue
+        stripped = name.strip()
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if stripped == "main" and depth == 0:
+            total = cumulative_us
+        top = stripped.split(".")[0]
+        # Count each package once: at its shallowest appearance in the tree
+        if "." not in stripped:
+            packages[top] = max(packages[top], cumulative_us)
+    return total, packages
+
+
+def _run_once(env: dict) -> Tuple[int, Dict[str, int], float]:
+    code = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        env=env, capture_output=True, text=True, check=True
+    )
+    wall = time.perf_counter() - start
+    total, packages = _parse(result.stderr)
+    return total, packages, wall
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="Heaviest top-level packages to show")
+    parser.add_argument("--history", help="Append the result to this JSON-lines file")
+    args = parser.parse_args(argv)
+
+    env = dict(os.environ)
+    for key, value in _DUMMY_ENV.items():
+        env.setdefault(key, value)
+    env.setdefault("PYTHONDONTWRITEBYTECODE", "0")
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env["PYTHONPATH"] = backend_dir + os.pathsep + env.get("PYTHONPATH", "")
+
+    _run_once(env)  # warm the bytecode cache so runs measure imports, not compilation
+    totals, walls = [], []
+    per_package: Dict[str, List[int]] = defaultdict(list)
+    for _ in range(args.runs):
+        total, packages, wall = _run_once(env)
+        totals.append(total)
+        walls.append(wall)
+        for name, us in packages.items():
+            per_package[name].append(us)
+
+    result = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "runs": args.runs,
+        "import_main_ms": round(median(totals) / 1000, 1),
+        "process_wall_ms": round(median(walls) * 1000, 1),
+        "packages_ms": {
+            name: round(median(values) / 1000, 1)
+            for name, values in per_package.items()
+            if name in WATCHED or name in ("main", "routers", "services", "utils")
+        },
+    }
+    try:
+        result["commit"] = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=backend_dir
+        ).stdout.strip() or None
+    except OSError:
+        result["commit"] = None
+
+    print(f"import main         {result['import_main_ms']:>8.1f} ms (median of {args.runs})")
+    print(f"interpreter + main  {result['process_wall_ms']:>8.1f} ms")
+    heaviest = sorted(
+        ((name, round(median(values) / 1000, 1)) for name, values in per_package.items() if name != "main"),
+        key=lambda item: item[1], reverse=True
+    )[:args.top]
+    for name, ms in heaviest:
+        print(f"  {name:<24}{ms:>8.1f} ms")
+
+    if args.history:
+        with open(args.history, "a", encoding="utf-8") as f:
+            f.write(json.dumps(result) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
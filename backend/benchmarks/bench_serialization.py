@@ -0,0 +1,120 @@
+"""
+Serialization and compression cost of the large API payloads.
+
+For a chat history page and an inbox page of ``--size`` items, compares:
+
+- ``encoder``: ``jsonable_encoder`` + ``json.dumps`` (FastAPI's path for
+  routes without a response model, which ``/api/chat/history`` used)
+- ``pydantic``: ``TypeAdapter.dump_json`` (FastAPI's path for routes with a
+  response model, e.g. ``/api/emails/recent``)
+- ``orjson``: plain dicts rendered by ``ORJSONResponse``
+
+and then the size and time of gzip and brotli on the rendered body.
+
+Run from ``backend/``::
+
+    python -m benchmarks.bench_serialization --size 500
+"""
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional
+import argparse
+import json
+import sys
+import time
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from benchmarks.harness import configure_environment
+
+_PARAGRAPH = (
+    "Thanks for the update on the quarterly numbers. Could you send the revised "
+    "forecast before Thursday's review, and flag anything that changed since the last draft? "
+)
+
+
+def _time_per_call(fn: Callable[[], object], iterations: int) -> float:
+    fn()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1000
+
+
+def _history(size: int):
+    from services.conversation_store import StoredMessage
+
+    now = time.time()
+    return [
+        StoredMessage("user" if i % 2 == 0 else "assistant", _PARAGRAPH * (1 + i % 4), now - (size - i) * 30, i + 1)
+        for i in range(size)
+    ]
+
+
+def _inbox(size: int):
+    from models.email import EmailSummary
+
+    start = datetime(2024, 5, 1, 9, 30)
+    return [
+        EmailSummary(
+            id=f"18f{i:013x}",
+            sender=f"Sender {i % 37}",
+            sender_email=f"sender{i % 37}@example.com",
+            subject=f"Re: Quarterly planning, item {i}",
+            summary=_PARAGRAPH * 2,
+            date=start - timedelta(minutes=17 * i)
+        )
+        for i in range(size)
+    ]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=500, help="Messages / emails per payload")
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    configure_environment("http://127.0.0.1:9", "http://127.0.0.1:9")
+    from models.chat import ChatMessage
+    from models.email import EmailSummary
+    from utils.responses import CompressionMiddleware, ORJSONResponse, brotli
+
+    history = _history(args.size)
+    inbox = _inbox(args.size)
+    chat_adapter = TypeAdapter(List[ChatMessage])
+    inbox_adapter = TypeAdapter(List[EmailSummary])
+
+    def history_models():
+        return [ChatMessage(**m.to_dict()) for m in history]
+
+    cases = {
+        "history": {
+            "encoder": lambda: json.dumps(jsonable_encoder({"messages": history_models()})).encode(),
+            "pydantic": lambda: chat_adapter.dump_json(history_models()),
+            "orjson": lambda: ORJSONResponse({"messages": [m.to_dict() for m in history]}).body,
+        },
+        "inbox": {
+            "encoder": lambda: json.dumps(jsonable_encoder(inbox)).encode(),
+            "pydantic": lambda: inbox_adapter.dump_json(inbox_adapter.validate_python(inbox)),
+            "orjson": lambda: ORJSONResponse([e.model_dump() for e in inbox]).body,
+        },
+    }
+
+    compressor = CompressionMiddleware(app=None)
+    encodings = ["gzip"] + (["br"] if brotli is not None else [])
+    for payload, variants in cases.items():
+        print(f"{payload} ({args.size} items)")
+        timings = {name: _time_per_call(fn, args.iterations) for name, fn in variants.items()}
+        for name, ms in timings.items():
+            print(f"  {name:<10}{ms:>9.3f} ms  ({timings['encoder'] / ms:>5.1f}x vs encoder)")
+        body = variants["orjson"]()
+        print(f"  {'identity':<10}{len(body) / 1024:>9.1f} KiB")
+        for encoding in encodings:
+            compressed = compressor.compress(body, encoding)
+            ms = _time_per_call(lambda: compressor.compress(body, encoding), max(args.iterations // 10, 5))
+            print(f"  {encoding:<10}{len(compressed) / 1024:>9.1f} KiB  {ms:>7.3f} ms  ({len(body) / len(compressed):.1f}x smaller)")
+    if brotli is None:
+        print("brotli not installed: only gzip measured")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""
+LLM prompt tokens spent summarizing long email threads.
+
+Messages of each synthetic thread arrive one at a time, and the inbox is
+summarized after every arrival. Every reply quotes the whole conversation
+before it, as mail clients do. Compares:
+
+- ``per_message``: each new message summarized on its own, quotes included
+  (the previous behaviour; each message once, thanks to the cache)
+- ``thread_full``: the whole thread re-summarized on every arrival, quotes removed
+- ``incremental``: ``thread_summarizer``, which sends the previous summary plus
+  only the new message
+
+Prompt tokens come from the Groq stand-in's usage accounting (~4 characters
+per token). Run from ``backend/``::
+
+    python -m benchmarks.bench_thread_summaries --threads 10 --length 12
+"""
+from typing import List, Optional
+import argparse
+import logging
+import os
+import random
+import sys
+from benchmarks.fakes.fixtures import PARAGRAPHS, SENDERS, SIGNATURE
+from benchmarks.fakes.groq import create_groq_app
+from benchmarks.harness import _ServerThread, configure_environment, free_port
+
+
+def _build_thread(length: int, rng: random.Random) -> List[dict]:
+    """Messages of one thread, oldest first; each reply quotes everything before it."""
+    participants = rng.sample(SENDERS, 2)
+    messages = []
+    previous_body = ""
+    for k in range(length):
+        name, address = participants[k % 2]
+        body = "\n\n".join(rng.sample(PARAGRAPHS, rng.randint(1, 3)))
+        body += SIGNATURE.format(name=name, domain=address.split("@")[1])
+        if previous_body:
+            quoted = "\n".join(f"> {line}" for line in previous_body.splitlines())
+            body += f"\n\nOn Mon, 6 Oct 2025 at 09:{k:02d}, {messages[-1]['sender']} wrote:\n{quoted}"
+        messages.append({
+            "id": f"m{k:03d}",
+            "sender": f"{name} <{address}>",
+            "subject": "Re: Budget approval for Q3" if k else "Budget approval for Q3",
+            "body": body,
+        })
+        previous_body = body
+    return messages
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=10)
+    parser.add_argument("--length", type=int, default=12, help="Messages per thread")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    groq_app = create_groq_app(per_token_ms=0)
+    groq = _ServerThread(groq_app, free_port()).start()
+    try:
+        configure_environment("http://127.0.0.1:9", groq.url)
+        # Measure token use, not budget enforcement
+        os.environ["LLM_USER_TOKEN_BUDGET"] = "0"
+        os.environ["LLM_USER_REQUEST_BUDGET"] = "0"
+        logging.disable(logging.INFO)
+        from services.ai_service import ai_service
+        from services.summary_cache import SummaryCache
+        from services.normalizer import strip_quoted
+        from services.thread_summarizer import ThreadMessage, ThreadSummarizer
+
+        rng = random.Random(args.seed)
+        threads = [_build_thread(args.length, rng) for _ in range(args.threads)]
+        stats = groq_app.state.stats
+
+        def per_message(thread_id, thread, arrived):
+            newest = thread[arrived - 1]
+            ai_service.summarize_email(newest["body"], newest["subject"])
+
+        def thread_full(thread_id, thread, arrived):
+            if arrived == 1:
+                ai_service.summarize_email(thread[0]["body"], thread[0]["subject"])
+            else:
+                ai_service.summarize_thread(
+                    [(m["sender"], strip_quoted(m["body"])) for m in thread[:arrived]], thread[0]["subject"]
+                )
+
+        summarizer = ThreadSummarizer(SummaryCache(max_entries=args.threads))
+
+        def incremental(thread_id, thread, arrived):
+            messages = [ThreadMessage(m["id"], m["sender"], m["subject"], m["body"]) for m in thread[:arrived]]
+            summarizer.summarize("bench", thread_id, messages)
+
+        results = {}
+        for name, strategy in (("per_message", per_message), ("thread_full", thread_full), ("incremental", incremental)):
+            before_tokens, before_calls = stats["prompt_tokens"], stats["requests"]
+            for index, thread in enumerate(threads):
+                for arrived in range(1, args.length + 1):
+                    strategy(f"t{index}", thread, arrived)
+            results[name] = (stats["requests"] - before_calls, stats["prompt_tokens"] - before_tokens)
+    finally:
+        groq.stop()
+
+    print(f"{args.threads} threads x {args.length} messages, summarized after every arrival")
+    print(f"{'strategy':<14}{'calls':>7}{'prompt tokens':>15}{'per thread':>12}{'vs per_message':>16}")
+    baseline = results["per_message"][1]
+    for name, (calls, tokens) in results.items():
+        print(f"{name:<14}{calls:>7}{tokens:>15}{tokens // args.threads:>12}{tokens / baseline:>15.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
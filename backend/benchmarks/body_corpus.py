@@ -0,0 +1,195 @@
+"""
+Email bodies in the formats common clients produce, for the body normalizer.
+
+Each case lists phrases the normalized text must keep and phrases it must
+drop. Used by ``benchmarks.check_normalizer``.
+"""
+
+GMAIL_SIGNATURE = """--
+John Smith
+Senior Manager | acme-corp.com
++1 (555) 010-2000"""
+
+DISCLAIMER = (
+    "CONFIDENTIALITY NOTICE: This e-mail message, including any attachments, is for the sole use of the "
+    "intended recipient(s) and may contain confidential and privileged information. Any unauthorized review, "
+    "use, disclosure or distribution is prohibited. If you are not the intended recipient, please contact "
+    "the sender by reply e-mail and destroy all copies of the original message."
+)
+
+CORPUS = [
+    {
+        "name": "gmail-reply",
+        "client": "Gmail",
+        "body": (
+            "Hi Priya,\r\n\r\nThe revised budget is approved. Please send the final invoice by Friday.\r\n\r\n"
+            f"{GMAIL_SIGNATURE}\r\n\r\n"
+            "On Mon, Oct 6, 2025 at 9:12 AM Priya Patel <priya@designstudio.io> wrote:\r\n"
+            "> Could you approve the revised budget?\r\n> The total is now $12,400.\r\n>\r\n"
+            "> On Fri, Oct 3, 2025 at 4:01 PM John Smith <john.smith@acme-corp.com> wrote:\r\n"
+            ">> Let's revisit the numbers next week.\r\n"
+        ),
+        "keep": ["revised budget is approved", "final invoice by Friday"],
+        "drop": ["Could you approve", "Senior Manager", "Let's revisit", "wrote:"],
+    },
+    {
+        "name": "gmail-wrapped-header",
+        "client": "Gmail",
+        "body": (
+            "Sounds good, I'll book the room for Tuesday at 3pm.\n\n"
+            "On Mon, Oct 6, 2025 at 9:12 AM Maria Garcia (University Research Office) <\n"
+            "m.garcia@university.edu> wrote:\n\n"
+            "> Does Tuesday afternoon work for the project kickoff?\n"
+        ),
+        "keep": ["book the room for Tuesday at 3pm"],
+        "drop": ["Does Tuesday afternoon work", "m.garcia@university.edu"],
+    },
+    {
+        "name": "apple-mail-iphone",
+        "client": "Apple Mail",
+        "body": (
+            "Yes, confirmed. See you at the airport at 7.\n\nSent from my iPhone\n\n"
+            "On Oct 6, 2025, at 09:12, Alex Chen <alex.chen@startup.dev> wrote:\n\n"
+            "> Can you confirm the pickup time?\n"
+        ),
+        "keep": ["See you at the airport at 7"],
+        "drop": ["Sent from my iPhone", "pickup time"],
+    },
+    {
+        "name": "apple-mail-macos",
+        "client": "Apple Mail",
+        "body": (
+            "Attached are the signed contracts. Let me know if anything is missing.\n\n"
+            "Best regards,\nHR Department\nacme-corp.com\n\n"
+            "> On 6 Oct 2025, at 09:12, John Smith <john.smith@acme-corp.com> wrote:\n>\n"
+            "> Please send over the signed contracts when ready.\n"
+        ),
+        "keep": ["signed contracts. Let me know if anything is missing"],
+        "drop": ["Best regards", "Please send over"],
+    },
+    {
+        "name": "outlook-desktop",
+        "client": "Outlook",
+        "body": (
+            "Hi John,\r\n\r\nPayment was sent this morning, reference INV-1042.\r\n\r\n"
+            "Kind regards,\r\nBilling Team\r\n\r\n"
+            f"{DISCLAIMER}\r\n\r\n"
+            "________________________________\r\n"
+            "From: John Smith <john.smith@acme-corp.com>\r\n"
+            "Sent: Monday, October 6, 2025 9:12 AM\r\n"
+            "To: Billing Team <billing@cloudhost.example>\r\n"
+            "Subject: Invoice #1042 overdue\r\n\r\n"
+            "Hello, invoice #1042 is now 15 days overdue. Please advise.\r\n"
+        ),
+        "keep": ["Payment was sent this morning, reference INV-1042"],
+        "drop": ["CONFIDENTIALITY NOTICE", "15 days overdue", "Sent: Monday", "Kind regards"],
+    },
+    {
+        "name": "outlook-original-message",
+        "client": "Outlook",
+        "body": (
+            "Approved - go ahead with the vendor.\n\n"
+            "-----Original Message-----\n"
+            "From: Priya Patel\nSent: Friday, October 3, 2025 4:01 PM\nTo: John Smith\n"
+            "Subject: Vendor selection\n\nShall we go with the second vendor?\n"
+        ),
+        "keep": ["go ahead with the vendor"],
+        "drop": ["Original Message", "second vendor"],
+    },
+    {
+        "name": "outlook-mobile",
+        "client": "Outlook",
+        "body": (
+            "Running 10 minutes late, start without me.\n\nGet Outlook for iOS<https://aka.ms/o0ukef>\n"
+            "________________________________\n"
+            "From: Maria Garcia <m.garcia@university.edu>\nSent: Monday, October 6, 2025 8:50:12 AM\n"
+            "To: Team <team@university.edu>\nSubject: Standup\n\nStandup in 10 minutes.\n"
+        ),
+        "keep": ["Running 10 minutes late"],
+        "drop": ["Get Outlook", "Standup in 10 minutes"],
+    },
+    {
+        "name": "newsletter-html-text",
+        "client": "HTML to text",
+        "body": (
+            "[image: Tech Daily]  View this email in your browser "
+            "( https://techdaily.example/view?utm_source=newsletter&utm_medium=email&utm_campaign=1234567 )\n\n"
+            "This week: three new features make your workflow faster than ever. "
+            "Read more https://click.techdaily.example/ls/click?upn=aHR0cHM6Ly90ZWNoZGFpbHkuZXhhbXBsZS9hcnRpY2xlLzQy"
+            "&amp;data=04%7C01%7C%7Cabcdef1234567890\n\n\n\n"
+            "You are receiving this email because you signed up at techdaily.example.\n"
+            "Unsubscribe https://techdaily.example/u?id=abc123def456ghi789 | Update your preferences\n"
+        ),
+        "keep": ["three new features", "[link: click.techdaily.example]"],
+        "drop": ["upn=aHR0c", "You are receiving", "[image:", "Unsubscribe"],
+    },
+    {
+        "name": "disclaimer-only-paragraph",
+        "client": "Corporate",
+        "body": (
+            "Please review the attached NDA before our call.\n\n"
+            "This email and any attachments are confidential and may be privileged. If you are not the intended "
+            "recipient, please notify the sender and delete it.\n"
+        ),
+        "keep": ["review the attached NDA"],
+        "drop": ["notify the sender"],
+    },
+    {
+        "name": "thanks-up-front",
+        "client": "Gmail",
+        "body": (
+            "Thanks!\n\n"
+            "I went through the design review feedback and made the following changes to the onboarding flow, "
+            "which I think address every point that was raised during the session last Thursday afternoon.\n"
+            "The login screen now explains why we ask for calendar access before the permission prompt appears.\n"
+            "Let me know if you want to walk through the remaining open items before we ship the release.\n"
+        ),
+        "keep": ["design review feedback", "remaining open items"],
+        "drop": [],
+    },
+    {
+        "name": "short-note",
+        "client": "Gmail",
+        "body": "Thanks, see you at 3",
+        "keep": ["Thanks, see you at 3"],
+        "drop": [],
+    },
+    {
+        "name": "thanks-mid-body",
+        "client": "Gmail",
+        "body": (
+            "Hi Sam,\n\nThanks!\n\n"
+            "One more thing: can we move the meeting to 3pm tomorrow and loop in legal?\n\nAlex"
+        ),
+        "keep": ["move the meeting to 3pm tomorrow", "loop in legal"],
+        "drop": [],
+    },
+    {
+        "name": "thanks-before-request",
+        "client": "Gmail",
+        "body": "Hi team,\nthanks\nPlease approve the budget by Friday.",
+        "keep": ["Please approve the budget by Friday."],
+        "drop": [],
+    },
+    {
+        "name": "unsubscribe-request",
+        "client": "Gmail",
+        "body": (
+            "Hi,\n\nPlease unsubscribe me from the vendor list and cancel order 5512.\n\n"
+            "Thanks,\nDana Lee\nProcurement | +1 (555) 010-3000\n\n"
+            "You are receiving this email because you are subscribed to vendor updates.\n"
+        ),
+        "keep": ["Please unsubscribe me from the vendor list and cancel order 5512."],
+        "drop": ["You are receiving", "Procurement"],
+    },
+    {
+        "name": "bare-forward",
+        "client": "Gmail",
+        "body": (
+            "On Mon, Oct 6, 2025 at 9:12 AM Deals <offers@shopmart.example> wrote:\n"
+            "> Flash sale: 40% off everything until midnight.\n"
+        ),
+        "keep": ["Flash sale: 40% off everything"],
+        "drop": [],
+    },
+]
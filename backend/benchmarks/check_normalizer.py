@@ -0,0 +1,60 @@
+"""
+Check the email body normalizer against the fixture corpus and time it.
+
+For every case in ``benchmarks.body_corpus`` the normalized text must keep
+the listed phrases and drop the others. Prints bytes removed per case and
+the mean time per body; exits non-zero if any case fails.
+
+Run from ``backend/``::
+
+    python -m benchmarks.check_normalizer
+    python -m benchmarks.check_normalizer --show gmail-reply
+"""
+from typing import List, Optional
+import argparse
+import sys
+import time
+from benchmarks.body_corpus import CORPUS
+from benchmarks.harness import configure_environment
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000, help="Timing iterations per body")
+    parser.add_argument("--show", help="Print the normalized text of this case")
+    args = parser.parse_args(argv)
+
+    configure_environment("http://127.0.0.1:9", "http://127.0.0.1:9")
+    from services.normalizer import normalize_body
+
+    failures = 0
+    total_in = total_removed = 0
+    print(f"{'case':<28}{'client':<14}{'bytes':>7}{'removed':>9}{'us':>8}  result")
+    for case in CORPUS:
+        result = normalize_body(case["body"], record=False)
+        missing = [p for p in case["keep"] if p not in result.text]
+        leaked = [p for p in case["drop"] if p in result.text]
+
+        start = time.perf_counter()
+        for _ in range(args.iterations):
+            normalize_body(case["body"], record=False)
+        micros = (time.perf_counter() - start) / args.iterations * 1e6
+
+        ok = not missing and not leaked
+        failures += not ok
+        total_in += result.original_bytes
+        total_removed += result.removed_bytes
+        share = result.removed_bytes / result.original_bytes if result.original_bytes else 0.0
+        status = "ok" if ok else f"FAIL missing={missing} leaked={leaked}"
+        print(f"{case['name']:<28}{case['client']:<14}{result.original_bytes:>7}{share:>9.0%}{micros:>8.1f}  {status}")
+        if args.show == case["name"]:
+            print("-" * 60 + f"\n{result.text}\n" + "-" * 60)
+            print(f"removed by stage: {result.removed}")
+
+    print(f"\n{len(CORPUS) - failures}/{len(CORPUS)} cases pass; {total_removed}/{total_in} bytes removed "
+          f"({total_removed / total_in:.0%})")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1 @@
+# Local stand-ins for the Gmail REST API and the Groq chat completions API
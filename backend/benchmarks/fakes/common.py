@@ -0,0 +1,80 @@
+import math
+import random
+import threading
+import time
+from typing import Optional
+
+
+class LatencyModel:
+    """
+    Seeded latency distribution for a stand-in endpoint.
+
+    Specs are ``"<distribution>:<median_ms>[:<spread>]"``:
+
+    - ``constant:40``: always 40 ms
+    - ``uniform:40:0.5``: 40 ms +/- 50%
+    - ``lognormal:40:0.6``: median 40 ms, sigma 0.6 (long right tail)
+    """
+
+    def __init__(self, distribution: str = "lognormal", median_ms: float = 30.0, spread: float = 0.5, seed: int = 0):
+        if distribution not in ("constant", "uniform", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {distribution}")
+        self.distribution = distribution
+        self.median_ms = median_ms
+        self.spread = spread
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def parse(cls, spec: str, seed: int = 0) -> "LatencyModel":
+        parts = spec.split(":")
+        distribution = parts[0]
+        median_ms = float(parts[1]) if len(parts) > 1 else 30.0
+        spread = float(parts[2]) if len(parts) > 2 else 0.5
+        return cls(distribution, median_ms, spread, seed)
+
+    def sample(self) -> float:
+        """Draw one latency in seconds."""
+        with self._lock:
+            if self.distribution == "constant":
+                ms = self.median_ms
+            elif self.distribution == "uniform":
+                ms = self.median_ms * (1 + self._rng.uniform(-self.spread, self.spread))
+            else:
+                ms = self.median_ms * math.exp(self._rng.gauss(0, self.spread))
+        return max(ms, 0.0) / 1000.0
+
+
+class RateLimiter:
+    """
+    Token bucket that decides when a stand-in answers 429.
+
+    ``rate`` is requests (or cost units) per second (``None`` disables
+    limiting); ``error_rate`` additionally injects random 429s with a seeded RNG.
+    """
+
+    def __init__(self, rate: Optional[float] = None, burst: Optional[int] = None, error_rate: float = 0.0, seed: int = 0):
+        self.rate = rate
+        self.capacity = float(burst if burst is not None else (rate or 0))
+        self.tokens = self.capacity
+        self.error_rate = error_rate
+        self._updated = time.monotonic()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def allow(self, cost: float = 1.0) -> bool:
+        with self._lock:
+            if self.error_rate and self._rng.random() < self.error_rate:
+                self.rejected += 1
+                return False
+            if self.rate is None:
+                return True
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self.tokens >= cost:
+                self.tokens -= cost
+                return True
+            self.rejected += 1
+            return False
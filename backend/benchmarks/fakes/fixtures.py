@@ -0,0 +1,142 @@
+"""
+Deterministic Gmail message fixtures.
+
+Messages are built with the stdlib ``email`` package and converted into the
+Gmail API ``users.messages`` resource shape (``payload`` with headers, nested
+``parts`` and base64url ``body.data``), so the real parsing code in
+``services/gmail_service.py`` runs against realistic MIME trees.
+"""
+from email.message import EmailMessage
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+import base64
+import random
+
+SENDERS = [
+    ("John Smith", "john.smith@acme-corp.com"),
+    ("Priya Patel", "priya@designstudio.io"),
+    ("Billing Team", "billing@cloudhost.example"),
+    ("Maria Garcia", "m.garcia@university.edu"),
+    ("Weekly Digest", "newsletter@techdaily.example"),
+    ("Alex Chen", "alex.chen@startup.dev"),
+    ("HR Department", "hr@acme-corp.com"),
+    ("Deals", "offers@shopmart.example"),
+]
+
+SUBJECTS = [
+    "Invoice #{n} for October",
+    "Project kickoff next Tuesday",
+    "Re: Design review feedback",
+    "Your weekly summary",
+    "Quick question about the contract",
+    "Flash sale: 40% off everything",
+    "Updated onboarding documents",
+    "Re: Re: Budget approval for Q{q}",
+]
+
+PARAGRAPHS = [
+    "I wanted to follow up on our conversation from last week regarding the timeline for the next milestone.",
+    "Could you please review the attached document and let me know if you have any comments by Friday?",
+    "The invoice total is $1,240.00 and payment is due within 30 days of receipt.",
+    "We are excited to announce new features that will make your workflow faster than ever.",
+    "Please confirm whether the meeting on Tuesday at 3pm still works for your team.",
+    "As discussed, I've updated the budget spreadsheet with the revised figures from finance.",
+    "Let me know if there is anything else you need from my side before we proceed.",
+]
+
+SIGNATURE = "\n\n--\nBest regards,\n{name}\nSenior Manager | {domain}\nThis email and any attachments are confidential."
+
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode()
+
+
+def _to_gmail_payload(part) -> dict:
+    """Convert an ``email.message`` part tree to a Gmail API payload dict."""
+    payload = {
+        "partId": "",
+        "mimeType": part.get_content_type(),
+        "filename": part.get_filename() or "",
+        "headers": [{"name": k, "value": str(v)} for k, v in part.items()],
+    }
+    if part.is_multipart():
+        payload["body"] = {"size": 0}
+        payload["parts"] = []
+        for i, child in enumerate(part.iter_parts()):
+            child_payload = _to_gmail_payload(child)
+            child_payload["partId"] = str(i)
+            payload["parts"].append(child_payload)
+    else:
+        data = part.get_payload(decode=True) or b""
+        payload["body"] = {"size": len(data), "data": _b64(data)}
+    return payload
+
+
+def _html(text: str) -> str:
+    paragraphs = "".join(f"<p style=\"margin:0 0 12px\">{p}</p>" for p in text.split("\n\n"))
+    return (
+        "<html><head><style>td{font-family:Arial}</style>"
+        "<script>var t=1;</script></head><body>"
+        f"<table><tr><td>{paragraphs}</td></tr></table>"
+        "<img src=\"https://tracking.example/open.gif?id=abc123\" width=1 height=1>"
+        "</body></html>"
+    )
+
+
+def build_message(index: int, rng: random.Random, now: datetime, thread_of: Dict[int, str]) -> dict:
+    """Build one Gmail API message resource."""
+    name, address = SENDERS[index % len(SENDERS)]
+    subject = SUBJECTS[index % len(SUBJECTS)].format(n=1000 + index, q=rng.randint(1, 4))
+    body = "\n\n".join(rng.sample(PARAGRAPHS, rng.randint(2, 5)))
+    body += SIGNATURE.format(name=name, domain=address.split("@")[1])
+    if subject.startswith("Re:"):
+        quoted = "\n".join(f"> {line}" for line in rng.choice(PARAGRAPHS).split(". "))
+        body += f"\n\nOn Mon, 6 Oct 2025 at 09:12, {name} <{address}> wrote:\n{quoted}"
+
+    msg = EmailMessage()
+    msg["From"] = f"{name} <{address}>"
+    msg["To"] = "me@example.com"
+    msg["Subject"] = subject
+    msg["Date"] = format_datetime(now - timedelta(minutes=37 * index))
+    msg["Message-ID"] = f"<fixture-{index}@{address.split('@')[1]}>"
+
+    labels = ["INBOX", "UNREAD"] if index % 3 else ["INBOX"]
+    shape = index % 3
+    if "newsletter" in address or "offers" in address:
+        msg["List-Unsubscribe"] = f"<mailto:unsubscribe@{address.split('@')[1]}>"
+        labels.append("CATEGORY_PROMOTIONS")
+        msg.set_content(_html(body), subtype="html")
+    elif shape == 0:
+        msg.set_content(body)
+        msg.add_alternative(_html(body), subtype="html")
+        labels.append("IMPORTANT")
+    elif shape == 1:
+        msg.set_content(body)
+    else:
+        msg.set_content(body)
+        msg.add_alternative(_html(body), subtype="html")
+        msg.add_attachment(b"%PDF-1.4 fixture", maintype="application", subtype="pdf", filename="report.pdf")
+
+    message_id = f"{index:016x}"
+    thread_id = thread_of.get(index % 6, message_id) if subject.startswith("Re:") else message_id
+    thread_of.setdefault(index % 6, message_id)
+    raw = msg.as_bytes()
+    return {
+        "id": message_id,
+        "threadId": thread_id,
+        "labelIds": labels,
+        "snippet": body[:120].replace("\n", " "),
+        "historyId": str(100000 + index),
+        "internalDate": str(int((now - timedelta(minutes=37 * index)).timestamp() * 1000)),
+        "sizeEstimate": len(raw),
+        "payload": _to_gmail_payload(msg),
+    }
+
+
+def build_mailbox(count: int = 50, seed: int = 0) -> List[dict]:
+    """Build ``count`` messages, newest first."""
+    rng = random.Random(seed)
+    now = datetime(2025, 10, 20, 9, 0, tzinfo=timezone.utc)
+    thread_of: Dict[int, str] = {}
+    return [build_message(i, rng, now, thread_of) for i in range(count)]
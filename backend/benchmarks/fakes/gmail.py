@@ -0,0 +1,179 @@
+"""
+Stand-in for the subset of the Gmail REST API the backend uses.
+
+Point the backend at it with ``GMAIL_API_ENDPOINT=http://127.0.0.1:<port>/``.
+"""
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from typing import Dict, List, Optional
+import asyncio
+import base64
+import copy
+import re
+import threading
+from benchmarks.fakes.common import LatencyModel, RateLimiter
+from benchmarks.fakes.fixtures import build_mailbox
+
+_QUERY_RE = re.compile(r'(from|subject):"([^"]*)"|(from|subject):(\S+)')
+
+
+def _header(message: dict, name: str) -> str:
+    for h in message["payload"]["headers"]:
+        if h["name"].lower() == name.lower():
+            return h["value"]
+    return ""
+
+
+def _matches_query(message: dict, query: Optional[str]) -> bool:
+    """Tiny subset of Gmail search: ``from:`` and ``subject:`` substring terms."""
+    if not query:
+        return True
+    for match in _QUERY_RE.finditer(query):
+        field = match.group(1) or match.group(3)
+        value = (match.group(2) or match.group(4) or "").lower()
+        header = _header(message, "From" if field == "from" else "Subject").lower()
+        if value not in header:
+            return False
+    return True
+
+
+def _rate_limited() -> JSONResponse:
+    return JSONResponse(
+        status_code=429,
+        content={"error": {
+            "code": 429,
+            "message": "User-rate limit exceeded.",
+            "errors": [{"domain": "usageLimits", "reason": "userRateLimitExceeded", "message": "User-rate limit exceeded."}],
+            "status": "RESOURCE_EXHAUSTED",
+        }},
+    )
+
+
+def _quota_units(request: Request) -> int:
+    """Gmail quota units of a request (getProfile 1, threads.get 10, send 100, others 5)."""
+    path = request.url.path
+    if path.endswith("/profile"):
+        return 1
+    if "/threads/" in path:
+        return 10
+    if path.endswith("/messages/send"):
+        return 100
+    return 5
+
+
+def create_gmail_app(
+    latency: Optional[LatencyModel] = None,
+    limiter: Optional[RateLimiter] = None,
+    mailbox_size: int = 50,
+    seed: int = 0,
+    unit_costs: bool = False
+) -> FastAPI:
+    """
+    Build the Gmail stand-in app.
+
+    Args:
+        latency: Per-request latency model (defaults to lognormal, 30 ms median)
+        limiter: Optional rate limiter producing ``userRateLimitExceeded`` 429s
+        mailbox_size: Number of fixture messages in the inbox
+        seed: Seed for the fixtures and latency draws
+        unit_costs: Charge the limiter each method's Gmail quota units
+            instead of one per request
+
+    Returns:
+        FastAPI application serving ``/gmail/v1/users/{userId}/...``
+    """
+    latency = latency or LatencyModel(seed=seed)
+    limiter = limiter or RateLimiter()
+    messages: List[dict] = build_mailbox(mailbox_size, seed)
+    by_id: Dict[str, dict] = {m["id"]: m for m in messages}
+    sent: List[dict] = []
+    lock = threading.Lock()
+    state = {"history_id": 200000}
+
+    app = FastAPI(title="Gmail stand-in")
+    app.state.stats = {"requests": 0, "rate_limited": 0}
+
+    @app.middleware("http")
+    async def simulate_network(request: Request, call_next):
+        app.state.stats["requests"] += 1
+        await asyncio.sleep(latency.sample())
+        if not limiter.allow(_quota_units(request) if unit_costs else 1):
+            app.state.stats["rate_limited"] += 1
+            return _rate_limited()
+        return await call_next(request)
+
+    @app.get("/gmail/v1/users/{user_id}/profile")
+    async def get_profile(user_id: str):
+        return {
+            "emailAddress": "me@example.com",
+            "messagesTotal": len(messages),
+            "threadsTotal": len({m["threadId"] for m in messages}),
+            "historyId": str(state["history_id"]),
+        }
+
+    @app.get("/gmail/v1/users/{user_id}/messages")
+    async def list_messages(user_id: str, request: Request):
+        params = request.query_params
+        max_results = int(params.get("maxResults", 100))
+        label_ids = params.getlist("labelIds")
+        query = params.get("q")
+        page_start = int(params.get("pageToken", 0))
+        matched = [
+            m for m in messages
+            if all(label in m["labelIds"] for label in label_ids) and _matches_query(m, query)
+        ]
+        page = matched[page_start:page_start + max_results]
+        body = {
+            "messages": [{"id": m["id"], "threadId": m["threadId"]} for m in page],
+            "resultSizeEstimate": len(matched),
+        }
+        if page_start + max_results < len(matched):
+            body["nextPageToken"] = str(page_start + max_results)
+        return body
+
+    @app.get("/gmail/v1/users/{user_id}/messages/{message_id}")
+    async def get_message(user_id: str, message_id: str, request: Request):
+        message = by_id.get(message_id)
+        if message is None:
+            return JSONResponse(status_code=404, content={"error": {"code": 404, "message": "Requested entity was not found."}})
+        fmt = request.query_params.get("format", "full")
+        if fmt == "full":
+            return message
+        result = copy.deepcopy(message)
+        wanted = request.query_params.getlist("metadataHeaders")
+        headers = result["payload"]["headers"]
+        if wanted:
+            headers = [h for h in headers if h["name"] in wanted]
+        result["payload"] = {"mimeType": result["payload"]["mimeType"], "headers": headers}
+        return result
+
+    @app.get("/gmail/v1/users/{user_id}/threads/{thread_id}")
+    async def get_thread(user_id: str, thread_id: str):
+        # The mailbox is newest first; threads list their messages oldest first
+        thread = [m for m in reversed(messages) if m["threadId"] == thread_id]
+        if not thread:
+            return JSONResponse(status_code=404, content={"error": {"code": 404, "message": "Requested entity was not found."}})
+        return {"id": thread_id, "historyId": thread[-1]["historyId"], "messages": thread}
+
+    @app.post("/gmail/v1/users/{user_id}/messages/{message_id}/trash")
+    async def trash_message(user_id: str, message_id: str):
+        message = by_id.get(message_id)
+        if message is None:
+            return JSONResponse(status_code=404, content={"error": {"code": 404, "message": "Requested entity was not found."}})
+        with lock:
+            message["labelIds"] = [l for l in message["labelIds"] if l != "INBOX"] + ["TRASH"]
+            state["history_id"] += 1
+        return {"id": message_id, "threadId": message["threadId"], "labelIds": message["labelIds"]}
+
+    @app.post("/gmail/v1/users/{user_id}/messages/send")
+    async def send_message(user_id: str, request: Request):
+        body = await request.json()
+        raw = base64.urlsafe_b64decode(body.get("raw", ""))
+        with lock:
+            message_id = f"sent{len(sent):012x}"
+            sent.append({"id": message_id, "threadId": body.get("threadId"), "raw": raw})
+            state["history_id"] += 1
+        return {"id": message_id, "threadId": body.get("threadId") or message_id, "labelIds": ["SENT"]}
+
+    app.state.sent = sent
+    return app
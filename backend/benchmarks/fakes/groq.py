@@ -0,0 +1,134 @@
+"""
+Stand-in for Groq's OpenAI-compatible chat completions endpoint.
+
+Point the backend at it with ``GROQ_BASE_URL=http://127.0.0.1:<port>``.
+Completion latency grows with the requested ``max_tokens`` so summary and
+reply calls cost more than intent parsing, roughly like the real service.
+"""
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import Optional
+import asyncio
+import json
+import time
+from benchmarks.fakes.common import LatencyModel, RateLimiter
+
+INTENT_KEYWORDS = [
+    ("digest", "DIGEST"),
+    ("everything from", "DIGEST"),
+    ("find", "SEARCH"),
+    ("search", "SEARCH"),
+    ("delete", "DELETE_EMAIL"),
+    ("send", "SEND_REPLY"),
+    ("repl", "GENERATE_REPLIES"),
+    ("email", "READ_EMAILS"),
+    ("inbox", "READ_EMAILS"),
+    ("hello", "GREETING"),
+    ("hi ", "GREETING"),
+]
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token)."""
+    return max(1, len(text) // 4)
+
+
+def _classify(text: str) -> dict:
+    lowered = text.lower() + " "
+    for keyword, intent in INTENT_KEYWORDS:
+        if keyword in lowered:
+            return {"intent": intent, "confidence": 0.9, "parameters": {}}
+    return {"intent": "GENERAL_QUERY", "confidence": 0.6, "parameters": {}}
+
+
+async def _stream_chunks(content: str, model: str, first_token_delay: float, per_token_ms: float):
+    """Server-sent events in the OpenAI ``chat.completion.chunk`` format."""
+    await asyncio.sleep(first_token_delay)
+    created = int(time.time())
+    for word in content.split(" "):
+        chunk = {
+            "id": "chatcmpl-stream",
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}],
+        }
+        yield f"data: {json.dumps(chunk)}\n\n"
+        await asyncio.sleep(per_token_ms / 1000.0)
+    yield "data: [DONE]\n\n"
+
+
+def create_groq_app(
+    latency: Optional[LatencyModel] = None,
+    limiter: Optional[RateLimiter] = None,
+    per_token_ms: float = 0.5,
+    seed: int = 0
+) -> FastAPI:
+    """
+    Build the Groq stand-in app.
+
+    Args:
+        latency: Time-to-first-token model (defaults to lognormal, 30 ms median)
+        limiter: Optional rate limiter producing 429s with ``retry-after``
+        per_token_ms: Extra generation time per completion token
+        seed: Seed for latency draws
+
+    Returns:
+        FastAPI application serving ``/openai/v1/chat/completions``
+    """
+    latency = latency or LatencyModel(seed=seed)
+    limiter = limiter or RateLimiter()
+    app = FastAPI(title="Groq stand-in")
+    app.state.stats = {"requests": 0, "rate_limited": 0, "prompt_tokens": 0, "completion_tokens": 0}
+
+    @app.post("/openai/v1/chat/completions")
+    async def chat_completions(request: Request):
+        payload = await request.json()
+        stats = app.state.stats
+        stats["requests"] += 1
+        if not limiter.allow():
+            stats["rate_limited"] += 1
+            return JSONResponse(
+                status_code=429,
+                headers={"retry-after": "0"},
+                content={"error": {"message": "Rate limit reached", "type": "tokens", "code": "rate_limit_exceeded"}},
+            )
+
+        messages = payload.get("messages", [])
+        last = messages[-1]["content"] if messages else ""
+        if (payload.get("response_format") or {}).get("type") == "json_object":
+            content = json.dumps(_classify(last))
+        else:
+            words = " ".join(last.split()[:40])
+            content = f"Summary: {words}"
+        max_tokens = payload.get("max_tokens") or 120
+        prompt_tokens = sum(estimate_tokens(m.get("content") or "") for m in messages)
+        completion_tokens = min(estimate_tokens(content), max_tokens)
+        stats["prompt_tokens"] += prompt_tokens
+        stats["completion_tokens"] += completion_tokens
+
+        if payload.get("stream"):
+            return StreamingResponse(
+                _stream_chunks(content, payload.get("model"), latency.sample(), per_token_ms),
+                media_type="text/event-stream",
+            )
+
+        await asyncio.sleep(latency.sample() + completion_tokens * per_token_ms / 1000.0)
+        return {
+            "id": f"chatcmpl-{stats['requests']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    return app
@@ -0,0 +1,170 @@
+"""
+End-to-end load test against offline Gmail/Groq stand-ins.
+
+Example (from ``backend/``)::
+
+    python -m benchmarks.load_test --scenario all --concurrency 8 --requests 200
+    python -m benchmarks.load_test --scenario recent --gmail-latency lognormal:80:0.7 \\
+        --groq-rate 20 --json results.json
+
+Everything runs on loopback with seeded latency draws, so results are
+reproducible in CI without network access.
+"""
+from typing import Callable, Dict, List, Optional
+import argparse
+import asyncio
+import json
+import logging
+import statistics
+import sys
+import time
+import httpx
+from benchmarks.fakes.common import LatencyModel, RateLimiter
+from benchmarks.fakes.gmail import create_gmail_app
+from benchmarks.fakes.groq import create_groq_app
+from benchmarks.harness import offline_stack
+
+SCENARIOS = ("chat", "recent", "generate-reply")
+CHAT_MESSAGES = [
+    "Hello there",
+    "Show me my recent emails",
+    "What can you do?",
+    "Generate replies for these",
+]
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(name: str, latencies: List[float], statuses: Dict[int, int], errors: int, elapsed: float) -> dict:
+    ordered = sorted(latencies)
+    ms = lambda v: round(v * 1000, 2)
+    return {
+        "scenario": name,
+        "requests": len(latencies),
+        "errors": errors,
+        "statuses": {str(k): v for k, v in sorted(statuses.items())},
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": ms(statistics.fmean(ordered)) if ordered else 0.0,
+        "p50_ms": ms(percentile(ordered, 50)),
+        "p95_ms": ms(percentile(ordered, 95)),
+        "p99_ms": ms(percentile(ordered, 99)),
+        "max_ms": ms(ordered[-1]) if ordered else 0.0,
+    }
+
+
+def _request_factory(scenario: str, email_ids: List[str]) -> Callable[[httpx.AsyncClient, int], "asyncio.Future"]:
+    if scenario == "chat":
+        return lambda client, i: client.post("/api/chat/message", json={"message": CHAT_MESSAGES[i % len(CHAT_MESSAGES)]})
+    if scenario == "recent":
+        return lambda client, i: client.get("/api/emails/recent")
+    if scenario == "generate-reply":
+        return lambda client, i: client.post("/api/emails/generate-reply", json={"email_id": email_ids[i % len(email_ids)]})
+    raise ValueError(f"Unknown scenario: {scenario}")
+
+
+async def run_scenario(base_url: str, token: str, scenario: str, concurrency: int, total: int, email_ids: List[str]) -> dict:
+    """Drive ``total`` requests for one scenario with ``concurrency`` workers."""
+    make_request = _request_factory(scenario, email_ids)
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    errors = 0
+    counter = iter(range(total))
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(
+        base_url=base_url,
+        headers={"Authorization": f"Bearer {token}"},
+        limits=limits,
+        timeout=120.0,
+    ) as client:
+        async def worker():
+            nonlocal errors
+            for i in counter:
+                start = time.perf_counter()
+                try:
+                    response = await make_request(client, i)
+                    statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+                    if response.status_code >= 400:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return summarize(scenario, latencies, statuses, errors, elapsed)
+
+
+def _limiter(rate: Optional[float], error_rate: float, seed: int) -> RateLimiter:
+    return RateLimiter(rate=rate, burst=int(rate) if rate else None, error_rate=error_rate, seed=seed)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", choices=SCENARIOS + ("all",), default="all")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=50, help="Requests per scenario")
+    parser.add_argument("--gmail-latency", default="lognormal:30:0.5", help="distribution:median_ms[:spread]")
+    parser.add_argument("--groq-latency", default="lognormal:120:0.5", help="distribution:median_ms[:spread]")
+    parser.add_argument("--gmail-rate", type=float, default=None, help="Gmail stand-in requests/s before 429")
+    parser.add_argument("--groq-rate", type=float, default=None, help="Groq stand-in requests/s before 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Random 429 probability on both stand-ins")
+    parser.add_argument("--mailbox-size", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", dest="json_path", help="Write results as JSON to this path")
+    parser.add_argument("--verbose", action="store_true", help="Keep INFO logs from the API under test")
+    args = parser.parse_args(argv)
+    if not args.verbose:
+        logging.disable(logging.INFO)
+
+    gmail_app = create_gmail_app(
+        latency=LatencyModel.parse(args.gmail_latency, seed=args.seed),
+        limiter=_limiter(args.gmail_rate, args.error_rate, args.seed),
+        mailbox_size=args.mailbox_size,
+        seed=args.seed,
+    )
+    groq_app = create_groq_app(
+        latency=LatencyModel.parse(args.groq_latency, seed=args.seed + 1),
+        limiter=_limiter(args.groq_rate, args.error_rate, args.seed + 1),
+        seed=args.seed,
+    )
+
+    scenarios = SCENARIOS if args.scenario == "all" else (args.scenario,)
+    results = []
+    with offline_stack(gmail_app, groq_app) as stack:
+        email_ids = httpx.get(f"{stack['gmail']}/gmail/v1/users/me/messages", params={"maxResults": 10}).json()["messages"]
+        email_ids = [m["id"] for m in email_ids]
+        for scenario in scenarios:
+            results.append(asyncio.run(
+                run_scenario(stack["api"], stack["token"], scenario, args.concurrency, args.requests, email_ids)
+            ))
+
+    report = {
+        "config": vars(args),
+        "results": results,
+        "gmail_stand_in": gmail_app.state.stats,
+        "groq_stand_in": groq_app.state.stats,
+    }
+    header = f"{'scenario':<16}{'reqs':>6}{'err':>5}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['scenario']:<16}{r['requests']:>6}{r['errors']:>5}{r['throughput_rps']:>9}"
+              f"{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}")
+    if args.json_path:
+        with open(args.json_path, "w") as fh:
+            json.dump(report, fh, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,74 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from routers import auth, chat, emails
+from routers import admin, auth, chat, emails
+from starlette.concurrency import run_in_threadpool
 from app.config import get_settings
+from services.ai_service import ai_service
+from services.auth_service import auth_service
+from services.conversation_store import conversation_store
+from services.digest import digest_service
+from services.gmail_quota import gmail_quota
+from services.gmail_service import gmail_service
+from services.outbox import outbox
+from services.reply_headers import reply_header_cache
+from services.summary_cache import summary_cache
+from services.vector_index import vector_index
+from utils.jwt_handler import verified_tokens
+from utils.logger import api_logger, setup_logging
+from utils.metrics import MetricsMiddleware, STATE_GAUGE, registry
+from utils.profiling import ProfilingMiddleware, profile_store, stack_sampler
+from utils.request_context import RequestContextMiddleware
+from utils.resources import resources
+from utils.responses import CompressionMiddleware
+from utils.singleflight import singleflight
+from utils.tracing import TracingMiddleware, configure_tracing, shutdown_tracing
+import asyncio
+import time
 
 settings = get_settings()
 
+setup_logging(settings.log_level, settings.log_format == "json", settings.log_success_sample_rate)
+configure_tracing(settings.trace_exporter, settings.trace_sample_rate, settings.trace_file, settings.app_name)
+
+
+
+def _warm_up() -> None:
+    """Import client libraries and load discovery documents off the request path."""
+    start = time.perf_counter()
+    for service in (gmail_service, auth_service, ai_service):
+        try:
+            service.warm_up()
+        except Exception as e:
+            api_logger.warning("Warm-up of %s failed: %s", type(service).__name__, e)
+    api_logger.info("Warm-up finished in %.0f ms", (time.perf_counter() - start) * 1000)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    api_logger.info("AI Email Assistant API starting in %s mode", settings.environment)
+    api_logger.info("Gmail scopes configured: %d scopes", len(settings.gmail_scopes))
+    resources.start()
+    await outbox.start()
+    if settings.warm_up_on_startup:
+        # In the background: the server accepts requests right away, and a
+        # request that needs a module still loading waits on its import lock
+        resources.track_task(asyncio.create_task(run_in_threadpool(_warm_up)))
+    yield
+    # The server has stopped taking requests; let in-flight summary work finish
+    api_logger.info("AI Email Assistant API shutting down")
+    drain_start = time.monotonic()
+    await outbox.stop(settings.shutdown_drain_seconds)
+    await resources.shutdown(max(settings.shutdown_drain_seconds - (time.monotonic() - drain_start), 0.0))
+    shutdown_tracing()
+
+
 app = FastAPI(
     title="AI Email Assistant API",
     description="Backend API for AI-powered email assistant with Gmail integration",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS configuration
@@ -22,6 +82,13 @@ if settings.environment == "production":
     # Add production frontend URL
     allowed_origins = [settings.frontend_url]
 
+if settings.compression_min_bytes > 0:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.compression_min_bytes,
+        gzip_level=settings.compression_gzip_level,
+        brotli_quality=settings.compression_brotli_quality
+    )
 app.add_middleware(
     CORSMiddleware,
     allow_origins=allowed_origins,
@@ -29,11 +96,25 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
+if settings.profiling_mode in ("header", "threshold"):
+    # Not installed at all when profiling is off
+    app.add_middleware(
+        ProfilingMiddleware,
+        store=profile_store,
+        sampler=stack_sampler,
+        mode=settings.profiling_mode,
+        threshold_ms=settings.profiling_threshold_ms,
+        admin_token=settings.admin_token
+    )
+app.add_middleware(TracingMiddleware)
+app.add_middleware(RequestContextMiddleware)
 
 # Include routers
 app.include_router(auth.router)
 app.include_router(chat.router)
 app.include_router(emails.router)
+app.include_router(admin.router)
 
 @app.get("/")
 async def root():
@@ -45,15 +126,44 @@ async def root():
 
 @app.get("/health")
 async def health():
-    return {"status": "healthy"}
+    return {
+        "status": "healthy",
+        "conversation_store": conversation_store.stats(),
+        "coalesced_calls": singleflight.stats(),
+        "resources": resources.stats()
+    }
+
+
+
+def _collect_state() -> None:
+    """Refresh state gauges from the in-process stores before each scrape."""
+    for field, value in conversation_store.stats().items():
+        if isinstance(value, (int, float)):
+            STATE_GAUGE.set(value, component="conversation_store", field=field)
+    for field, value in summary_cache.stats().items():
+        STATE_GAUGE.set(value, component="summary_cache", field=field)
+    for field, value in verified_tokens.stats().items():
+        STATE_GAUGE.set(value, component="verified_tokens", field=field)
+    for field, value in resources.stats().items():
+        STATE_GAUGE.set(value, component="resources", field=field)
+    for field, value in digest_service.stats().items():
+        STATE_GAUGE.set(value, component="digest", field=field)
+    for field, value in reply_header_cache.stats().items():
+        STATE_GAUGE.set(value, component="reply_header_cache", field=field)
+    for field, value in outbox.stats().items():
+        STATE_GAUGE.set(value, component="outbox", field=field)
+    for field, value in gmail_quota.stats().items():
+        STATE_GAUGE.set(value, component="gmail_quota", field=field)
+    for field, value in vector_index.stats().items():
+        STATE_GAUGE.set(value, component="vector_index", field=field)
+    for operation, counts in singleflight.stats().items():
+        for field, value in counts.items():
+            STATE_GAUGE.set(value, component=f"singleflight.{operation}", field=field)
 
 
-@app.on_event("startup")
-async def startup_event():
-    print(f"🚀 AI Email Assistant API starting in {settings.environment} mode")
-    print(f"📧 Gmail scopes configured: {len(settings.gmail_scopes)} scopes")
+registry.add_collector(_collect_state)
 
 
-@app.on_event("shutdown")
-async def shutdown_event():
-    print("👋 AI Email Assistant API shutting down")
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
@@ -7,6 +7,7 @@ class ChatMessage(BaseModel):
     role: Literal["user", "assistant", "system"]
     content: str
     timestamp: Optional[datetime] = None
+    seq: Optional[int] = None  # Per-conversation cursor for incremental history
 
 
 class ChatRequest(BaseModel):
@@ -19,6 +20,8 @@ class IntentClassification(BaseModel):
         "GENERATE_REPLIES", 
         "DELETE_EMAIL",
         "SEND_REPLY",
+        "DIGEST",
+        "SEARCH",
         "GENERAL_QUERY",
         "GREETING"
     ]
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, Field
+from typing import Optional, List, Literal
 from datetime import datetime
 
 
@@ -22,6 +22,52 @@ class EmailSummary(BaseModel):
     subject: str
     summary: str
     date: datetime
+    priority_score: Optional[float] = None
+    priority_rank: Optional[int] = None  # 1 = most important on this page
+    # extractive: short message summarized locally (cached); fallback: local summary
+    # standing in for a failed or over-budget LLM call (not cached); preview: below the LLM top-K
+    summary_source: Literal["llm", "extractive", "fallback", "preview"] = "llm"
+
+
+class DigestRequest(BaseModel):
+    days: int = Field(7, ge=1, le=365)  # How far back to look
+    query: Optional[str] = None  # Extra Gmail search terms, e.g. "from:boss@acme.com"
+    max_messages: Optional[int] = Field(None, ge=1)  # Defaults to DIGEST_MAX_MESSAGES
+    refresh: bool = False  # Ignore a finished digest and checkpoints of its listing
+
+
+class DigestItem(BaseModel):
+    thread_id: str
+    email_id: str
+    sender: str
+    subject: str
+    summary: str
+    summary_source: Literal["llm", "extractive", "fallback", "preview"] = "llm"
+    priority_score: float = 0.0
+    messages: int = 1
+
+
+class Digest(BaseModel):
+    digest_id: str
+    query: str
+    digest: str
+    digest_source: Literal["llm", "extractive"] = "llm"
+    threads: int
+    messages: int
+    resumed: int = 0  # Thread summaries taken from checkpoints
+    items: List[DigestItem] = []
+    created_at: datetime
+
+
+class SearchResult(BaseModel):
+    id: str  # Newest message of the thread when it was indexed
+    thread_id: str
+    sender: str
+    sender_email: str
+    subject: str
+    summary: str
+    date: datetime
+    score: float  # Cosine similarity to the query, 0-1
 
 
 class EmailReply(BaseModel):
@@ -29,6 +75,18 @@ class EmailReply(BaseModel):
     reply_content: str
 
 
+class OutboxEntry(BaseModel):
+    id: str
+    email_id: str
+    status: Literal["queued", "sending", "sent", "failed"]
+    attempts: int = 0
+    last_error: Optional[str] = None
+    sent_message_id: Optional[str] = None  # Gmail ID of the delivered reply
+    created_at: datetime
+    updated_at: datetime
+    next_attempt_at: Optional[datetime] = None  # When a queued send is due
+
+
 class GeneratedReply(BaseModel):
     email_id: str
     original_subject: str
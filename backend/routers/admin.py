@@ -0,0 +1,54 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse
+from typing import List, Optional
+from services.gmail_quota import gmail_quota
+from services.llm_budget import llm_budget
+from utils.dependencies import require_admin
+from utils.profiling import profile_store, user_tag
+
+router = APIRouter(prefix="/api/admin", tags=["Admin"], dependencies=[Depends(require_admin)])
+
+
+@router.get("/profiles")
+async def list_profiles(
+    route: Optional[str] = Query(None, description="Route template, e.g. /api/emails/recent"),
+    user: Optional[str] = Query(None, description="User email")
+) -> List[dict]:
+    """List saved request profiles, newest first."""
+    return profile_store.list(route=route, user=user_tag(user))
+
+
+@router.get("/profiles/{name}")
+async def get_profile(name: str, format: str = Query("json", pattern="^(json|folded)$")):
+    """
+    Fetch one profile.
+    
+    ``format=folded`` returns collapsed stacks for flamegraph.pl / speedscope.
+    """
+    profile = profile_store.load(name)
+    if profile is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    if format == "folded":
+        return PlainTextResponse("\n".join(f"{stack} {count}" for stack, count in profile["stacks"].items()) + "\n")
+    return profile
+
+
+@router.get("/llm-usage")
+async def llm_usage(limit: int = Query(10, ge=1, le=500)) -> dict:
+    """Top LLM consumers in the current budget window."""
+    return {
+        "window_seconds": llm_budget.window,
+        "token_budget": llm_budget.token_budget,
+        "request_budget": llm_budget.request_budget,
+        "users": llm_budget.top_consumers(limit)
+    }
+
+
+@router.get("/gmail-quota")
+async def gmail_quota_usage(limit: int = Query(10, ge=1, le=500)) -> dict:
+    """Per-user Gmail quota governor state: units spent, concurrency limits, queues and 429s."""
+    return {
+        "units_per_second": gmail_quota.rate,
+        "burst_units": gmail_quota.burst,
+        "users": gmail_quota.usage(limit)
+    }
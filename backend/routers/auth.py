@@ -1,7 +1,13 @@
 from fastapi import APIRouter, HTTPException, status, Query
 from fastapi.responses import RedirectResponse
+from starlette.concurrency import run_in_threadpool
 from services.auth_service import auth_service
-from utils.jwt_handler import create_access_token
+from services.conversation_store import conversation_store
+from services.email_index import email_index
+from services.vector_index import vector_index
+from services.realtime import connection_manager
+from services.state_backend import run_state_call, state_backend
+from utils.jwt_handler import create_access_token, verified_tokens
 from models.user import Token, UserProfile
 from utils.dependencies import get_current_user
 from fastapi import Depends
@@ -11,8 +17,9 @@ import secrets
 settings = get_settings()
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
-# Store state tokens for CSRF protection (in production, use Redis)
-state_tokens = set()
+# State tokens for CSRF protection live in the shared backend so the
+# callback can land on any worker
+STATE_TOKEN_KEY = "oauth_state:{}"
 
 
 @router.get("/google/login")
@@ -25,7 +32,7 @@ async def google_login():
     """
     # Generate random state for CSRF protection
     state = secrets.token_urlsafe(32)
-    state_tokens.add(state)
+    await run_state_call(state_backend.set, STATE_TOKEN_KEY.format(state), b"1", ttl=settings.oauth_state_ttl_seconds)
     
     # Get authorization URL
     auth_url = auth_service.get_authorization_url(state)
@@ -48,19 +55,17 @@ async def google_callback(
     Returns:
         Redirect to frontend with JWT token
     """
-    # Verify state token
-    if state not in state_tokens:
+    # Verify and consume state token in one step
+    if await run_state_call(state_backend.pop, STATE_TOKEN_KEY.format(state)) is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid state token. Possible CSRF attack."
         )
     
-    # Remove used state token
-    state_tokens.discard(state)
-    
     try:
-        # Exchange code for tokens and get user profile
-        google_tokens, user_profile = auth_service.exchange_code_for_tokens(code)
+        # Exchange code for tokens and get user profile (Google round trips
+        # plus the session write, so off the event loop)
+        google_tokens, user_profile = await run_in_threadpool(auth_service.exchange_code_for_tokens, code)
         
         # Create JWT token
         access_token = create_access_token(
@@ -94,6 +99,15 @@ async def get_current_user_info(
     return current_user
 
 
+def _drop_user_state(user_email: str) -> None:
+    """Remove the session and every per-user cache and index."""
+    auth_service.logout_user(user_email)
+    verified_tokens.invalidate_subject(user_email)
+    email_index.drop(user_email)
+    vector_index.drop(user_email)
+    conversation_store.drop(user_email)
+
+
 @router.post("/logout")
 async def logout(current_user: UserProfile = Depends(get_current_user)):
     """
@@ -102,7 +116,8 @@ async def logout(current_user: UserProfile = Depends(get_current_user)):
     Returns:
         Success message
     """
-    auth_service.logout_user(current_user.email)
+    await run_state_call(_drop_user_state, current_user.email)
+    await connection_manager.close_user(current_user.email)
     
     return {"message": "Successfully logged out"}
 
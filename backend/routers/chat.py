@@ -1,29 +1,302 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from models.chat import ChatRequest, ChatResponse, ChatMessage, ConversationContext
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Header, Response, WebSocket, WebSocketDisconnect
+from starlette.concurrency import run_in_threadpool, iterate_in_threadpool
+from models.chat import ChatRequest, ChatResponse, IntentClassification
 from models.user import UserProfile
-from utils.dependencies import get_current_user
+from utils.dependencies import get_current_user, get_google_credentials, resolve_session, token_expiry
 from services.ai_service import ai_service
+from services.conversation_store import conversation_store
+from services.digest import digest_service
+from services.email_index import email_index
+from services.gmail_quota import GmailRateLimited
+from services.gmail_service import gmail_service
+from services.outbox import outbox
+from services.realtime import Connection, connection_manager
+from services.state_backend import run_state_call
+from services.vector_index import vector_index
+from routers.emails import INBOX_PAGE_SIZE, fetch_recent_emails_coalesced, remember_recent_emails, search_emails_local
+from utils.logger import api_logger
+from utils.metrics import record_cache
+from utils.request_context import current_user_email
+from utils.responses import ORJSONResponse
 from datetime import datetime
-from typing import Dict
+from typing import Awaitable, Callable, List, Optional, Tuple
+import asyncio
+import json
+import time
 
 router = APIRouter(prefix="/api/chat", tags=["Chat"])
-conversations: Dict[str, ConversationContext] = {}
 
+# Seconds a socket opened without ?token= has to send its auth frame
+SOCKET_AUTH_TIMEOUT = 10
+
+# Chat actions that change the mailbox (pushed to the user's other sockets)
+INBOX_ACTIONS = {"deleted", "queued"}
+
+# Results a SEARCH intent lists
+SEARCH_RESULTS = 5
+
+# Candidates listed when a delete/reply selector is ambiguous
+MAX_CANDIDATES = 3
+
+
+def _build_search_query(sender: Optional[str], subject_keyword: Optional[str]) -> Optional[str]:
+    """Build a Gmail ``q=`` expression from chat selectors."""
+    terms = []
+    if sender:
+        terms.append(f'from:"{sender}"')
+    if subject_keyword:
+        terms.append(f'subject:"{subject_keyword}"')
+    return " ".join(terms) or None
+
+
+def _digest_days(parameters: Optional[dict]) -> int:
+    """Days a DIGEST intent covers (default a week)."""
+    try:
+        days = int((parameters or {}).get("days") or 7)
+    except (TypeError, ValueError):
+        days = 7
+    return min(max(days, 1), 365)
+
+
+def resolve_target_email(user_email: str, credentials, parameters: Optional[dict]) -> Tuple[List[str], bool]:
+    """
+    Resolve intent selectors to candidate message IDs.
+
+    A bare number answers an open "which one?" question when there is one
+    (see ``_ask_which``). Otherwise the local email index (the emails the
+    user was last shown) answers most selectors without any network call;
+    Gmail search is only used on an index miss.
+
+    Args:
+        user_email: Current user's email address
+        credentials: Google tokens for the fallback search
+        parameters: Intent parameters (sender, subject_keyword, reference_number)
+
+    Returns:
+        Tuple of (candidate message IDs, most recent first; True if they come
+        from the index, False if from the Gmail fallback). Actions run only on
+        a single index match; anything else needs the user to pick.
+    """
+    parameters = parameters or {}
+    if parameters.get("email_id"):
+        return [parameters["email_id"]], True
+
+    sender = parameters.get("sender") or None
+    subject_keyword = parameters.get("subject_keyword") or None
+    reference_number = parameters.get("reference_number") or parameters.get("reply_number")
+    try:
+        reference_number = int(reference_number) if reference_number is not None else None
+    except (TypeError, ValueError):
+        reference_number = None
+
+    if sender is None and subject_keyword is None and reference_number is None:
+        return [], True
+    if reference_number is not None and reference_number < 1:
+        return [], True
+
+    if sender is None and subject_keyword is None:
+        choice = conversation_store.pop_pending_choice(user_email)
+        if choice is not None:
+            return ([choice[reference_number - 1]] if reference_number <= len(choice) else []), True
+
+    matches = email_index.resolve(user_email, sender, subject_keyword, reference_number)
+    record_cache("email_index", bool(matches))
+    if matches:
+        return matches, True
+
+    query = _build_search_query(sender, subject_keyword)
+    if query is None:
+        # Only a position was given: list the inbox page the way it is shown
+        # (one entry per thread) and take that slot
+        if reference_number > INBOX_PAGE_SIZE:
+            return [], False
+        threads = gmail_service.list_threads(credentials, limit=INBOX_PAGE_SIZE)
+        return ([threads[reference_number - 1][1]] if len(threads) >= reference_number else []), False
+    return gmail_service.search_message_ids(credentials, query=query, limit=MAX_CANDIDATES), False
 
-def get_or_create_conversation(user_email: str) -> ConversationContext:
-    """Get existing conversation or create new one."""
-    if user_email not in conversations:
-        conversations[user_email] = ConversationContext(
-            user_email=user_email,
-            messages=[]
-        )
-    return conversations[user_email]
+
+def _ask_which(user_email: str, credentials, candidates: List[str], action: str) -> str:
+    """
+    List candidate emails and ask the user to pick one by number.
+
+    The candidates are kept as a pending choice, so the answer ("number 2")
+    resolves against this list on the next turn while the inbox numbering
+    and email index stay as they were.
+    """
+    shown = {e["id"]: e for e in conversation_store.recent_emails(user_email) or []}
+    emails = []
+    for email_id in candidates[:MAX_CANDIDATES]:
+        email = shown.get(email_id) or gmail_service.get_email_content(credentials, email_id)
+        if email:
+            emails.append({"id": email_id, "sender": email.get("sender") or "", "subject": email.get("subject") or ""})
+    if not emails:
+        return "I couldn't find an email matching that description. Could you tell me the sender, a word from the subject, or its number in the list?"
+    conversation_store.set_pending_choice(user_email, [e["id"] for e in emails])
+    lines = "\n".join(f"{i}. {e['sender']} | {e['subject']}" for i, e in enumerate(emails, 1))
+    if len(emails) == 1:
+        return f"Is this the email you want me to {action}?\n\n{lines}\n\nSay \"{action} number 1\" to confirm."
+    return f"I found several emails that could match. Which one should I {action}?\n\n{lines}\n\nTell me its number."
+
+
+def _respond_to_intent(current_user: UserProfile, credentials, message: str, intent: IntentClassification):
+    """
+    Act on a parsed intent (blocking; run off the event loop).
+    
+    Returns:
+        Tuple of (response_text, data); ``response_text`` is None for
+        general queries, which are answered by the LLM afterwards.
+    """
+    user_email = current_user.email
+    data = None
+
+    # Generate appropriate response based on intent
+    if intent.intent == "GREETING":
+        response_text = f"Hello {current_user.name}! 👋 I'm your AI email assistant. I can help you:\n\n" \
+                      "• Read and summarize your recent emails\n" \
+                      "• Generate professional replies\n" \
+                      "• Find emails by topic, sender or keyword\n" \
+                      "• Delete specific emails\n" \
+                      "• Send replies on your behalf\n\n" \
+                      "Just tell me what you'd like to do!"
+    
+    elif intent.intent == "READ_EMAILS":
+        response_text = "I'll fetch your recent emails now. Please wait a moment..."
+        # Over HTTP the frontend calls the emails endpoint; over the WebSocket
+        # the summaries are pushed when ready
+    
+    elif intent.intent == "DIGEST":
+        days = _digest_days(intent.parameters)
+        response_text = f"I'll put together a digest of your emails from the last {days} days. " \
+                        "A busy inbox can take a minute; I'll show progress as I go..."
+        # Over HTTP the frontend calls the digest endpoint; over the WebSocket
+        # progress and the digest are pushed
+    
+    elif intent.intent == "SEARCH":
+        parameters = intent.parameters or {}
+        query = parameters.get("query") or message
+        try:
+            days = int(parameters["days"]) if parameters.get("days") else None
+        except (TypeError, ValueError):
+            days = None
+        results = search_emails_local(user_email, query, SEARCH_RESULTS, days)
+        if results:
+            # The hits become the list "reply to the second one" refers to
+            remember_recent_emails(user_email, results)
+            lines = [f"{i}. {r.sender} | {r.subject}: {r.summary}" for i, r in enumerate(results, 1)]
+            response_text = "Here's what I found:\n\n" + "\n".join(lines)
+        else:
+            response_text = "I couldn't find any emails about that among the ones I've read so far. " \
+                            "Try asking for your recent emails or a digest first."
+        data = {"action": "search", "query": query, "results": [r.model_dump(mode="json") for r in results]}
+    
+    elif intent.intent == "GENERATE_REPLIES":
+        if conversation_store.recent_emails(user_email):
+            response_text = "I'll generate professional replies for your recent emails. This may take a moment..."
+        else:
+            response_text = "I don't see any emails to generate replies for. Would you like me to fetch your recent emails first?"
+    
+    elif intent.intent == "DELETE_EMAIL":
+        candidates, from_index = resolve_target_email(user_email, credentials, intent.parameters)
+        email_id = candidates[0] if len(candidates) == 1 and from_index else None
+        if not candidates:
+            response_text = "I couldn't find an email matching that description. Could you tell me the sender, a word from the subject, or its number in the list?"
+        elif email_id is None:
+            # Several matches, or a match the user was never shown: confirm first
+            response_text = _ask_which(user_email, credentials, candidates, "delete")
+        elif gmail_service.delete_email(credentials, email_id):
+            email_index.remove(user_email, email_id)
+            vector_index.remove(user_email, email_id)
+            conversation_store.forget_email(user_email, email_id)
+            response_text = "Done! I've moved that email to the trash. 🗑️"
+            data = {"action": "deleted", "email_id": email_id}
+        else:
+            response_text = "I found the email but couldn't delete it. Please try again."
+    
+    elif intent.intent == "SEND_REPLY":
+        candidates, from_index = resolve_target_email(user_email, credentials, intent.parameters)
+        email_id = candidates[0] if len(candidates) == 1 and from_index else None
+        reply_content = conversation_store.get_generated_reply(user_email, email_id) if email_id else None
+        if not candidates:
+            response_text = "I couldn't tell which email to reply to. Which number in the list is it?"
+        elif email_id is None:
+            response_text = _ask_which(user_email, credentials, candidates, "reply to")
+        elif reply_content is None:
+            response_text = "I haven't generated a reply for that email yet. Would you like me to draft one first?"
+        else:
+            # Delivered by the outbox; a repeated request reuses the queued send
+            entry, _ = outbox.enqueue(user_email, email_id, reply_content)
+            conversation_store.discard_generated_reply(user_email, email_id)
+            response_text = "Your reply is on its way! ✉️"
+            data = {"action": "queued", "email_id": email_id, "outbox_id": entry.id}
+    
+    else:
+        response_text = None
+    
+    return response_text, data
+
+
+async def process_chat_turn(
+    current_user: UserProfile,
+    credentials,
+    message: str,
+    on_delta: Optional[Callable[[str], Awaitable[None]]] = None
+) -> ChatResponse:
+    """
+    Run one chat turn: record the message, classify it, act and reply.
+    
+    Args:
+        current_user: Authenticated user
+        credentials: Google tokens used to act on resolved emails
+        message: The user's message
+        on_delta: If given, general answers are streamed through it chunk by chunk
+        
+    Returns:
+        ChatResponse with AI reply and intent classification
+    """
+    user_email = current_user.email
+    
+    # Add user message to history
+    await run_state_call(conversation_store.append_message, user_email, "user", message)
+    
+    # Parse intent
+    intent = await run_in_threadpool(
+        ai_service.parse_intent,
+        message,
+        await run_state_call(conversation_store.history, user_email, last=5)
+    )
+    
+    response_text, data = await run_in_threadpool(_respond_to_intent, current_user, credentials, message, intent)
+    
+    if response_text is None:
+        history, context = await run_state_call(_chat_context, user_email)
+        if on_delta is None:
+            response_text = await run_in_threadpool(ai_service.generate_chat_response, message, history, context)
+        else:
+            chunks = []
+            async for chunk in iterate_in_threadpool(ai_service.stream_chat_response(message, history, context)):
+                chunks.append(chunk)
+                await on_delta(chunk)
+            response_text = "".join(chunks).strip()
+    
+    # Add assistant response to history
+    await run_state_call(conversation_store.append_message, user_email, "assistant", response_text)
+    
+    if data is not None and data.get("action") in INBOX_ACTIONS:
+        await connection_manager.push(user_email, {"type": "inbox_updated", **data})
+    
+    return ChatResponse(
+        message=response_text,
+        intent=intent,
+        data=data,
+        timestamp=datetime.utcnow()
+    )
 
 
 @router.post("/message", response_model=ChatResponse)
 async def send_message(
     request: ChatRequest,
-    current_user: UserProfile = Depends(get_current_user)
+    current_user: UserProfile = Depends(get_current_user),
+    credentials: dict = Depends(get_google_credentials)
 ):
     """
     Send a chat message and get AI response.
@@ -31,100 +304,217 @@ async def send_message(
     Args:
         request: Chat message request
         current_user: Authenticated user
+        credentials: Google tokens used to act on resolved emails
         
     Returns:
         ChatResponse with AI reply and intent classification
     """
     try:
-        # Get conversation context
-        conversation = get_or_create_conversation(current_user.email)
-        
-        # Add user message to history
-        user_message = ChatMessage(
-            role="user",
-            content=request.message,
-            timestamp=datetime.utcnow()
-        )
-        conversation.messages.append(user_message)
-        
-        # Parse intent
-        intent = ai_service.parse_intent(
-            request.message,
-            conversation.messages
-        )
-        
-        # Generate appropriate response based on intent
-        if intent.intent == "GREETING":
-            response_text = f"Hello {current_user.name}! 👋 I'm your AI email assistant. I can help you:\n\n" \
-                          "• Read and summarize your recent emails\n" \
-                          "• Generate professional replies\n" \
-                          "• Delete specific emails\n" \
-                          "• Send replies on your behalf\n\n" \
-                          "Just tell me what you'd like to do!"
-        
-        elif intent.intent == "READ_EMAILS":
-            response_text = "I'll fetch your recent emails now. Please wait a moment..."
-            # The actual email fetching will be handled by the frontend calling the emails endpoint
-        
-        elif intent.intent == "GENERATE_REPLIES":
-            if conversation.recent_emails:
-                response_text = "I'll generate professional replies for your recent emails. This may take a moment..."
-            else:
-                response_text = "I don't see any emails to generate replies for. Would you like me to fetch your recent emails first?"
-        
-        elif intent.intent == "DELETE_EMAIL":
-            response_text = "I'll help you delete that email. Let me confirm the details first..."
-        
-        elif intent.intent == "SEND_REPLY":
-            response_text = "I'll send that reply for you. Please confirm you want to proceed."
-        
-        else:
-            response_text = ai_service.generate_chat_response(
-                request.message,
-                conversation.messages,
-                {
-                    "has_recent_emails": conversation.recent_emails is not None,
-                    "has_generated_replies": conversation.generated_replies is not None
-                }
-            )
-        
-        # Add assistant response to history
-        assistant_message = ChatMessage(
-            role="assistant",
-            content=response_text,
-            timestamp=datetime.utcnow()
-        )
-        conversation.messages.append(assistant_message)
-        
-        return ChatResponse(
-            message=response_text,
-            intent=intent,
-            timestamp=datetime.utcnow()
-        )
-        
+        return await process_chat_turn(current_user, credentials, request.message)
     except Exception as e:
-        print(f"Chat error: {e}")
+        api_logger.exception("Chat error: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to process message: {str(e)}"
         )
 
 
-@router.get("/history")
+def _chat_context(user_email: str) -> Tuple[list, dict]:
+    """Recent history and context flags for a general chat answer."""
+    history = conversation_store.history(user_email, last=10)
+    context = {
+        "has_recent_emails": conversation_store.recent_emails(user_email) is not None,
+        "has_generated_replies": conversation_store.has_generated_replies(user_email)
+    }
+    return history, context
+
+
+async def _push_recent_emails(connection: Connection, current_user: UserProfile, credentials, turn_id) -> None:
+    """Fetch and summarize the inbox in the background, then push the result."""
+    try:
+        emails = await fetch_recent_emails_coalesced(current_user.email, credentials)
+        await run_state_call(remember_recent_emails, current_user.email, emails)
+    except GmailRateLimited as e:
+        await connection.send({
+            "type": "error", "id": turn_id, "retry_after": e.retry_after,
+            "detail": "Gmail is rate-limiting this account. Please try again shortly."
+        })
+        return
+    except Exception as e:
+        api_logger.exception("Inbox push error: %s", e)
+        await connection.send({"type": "error", "id": turn_id, "detail": f"Failed to fetch emails: {str(e)}"})
+        return
+    await connection.send({
+        "type": "emails",
+        "id": turn_id,
+        "emails": [e.model_dump() for e in emails]
+    })
+
+
+async def _push_digest(connection: Connection, current_user: UserProfile, credentials, turn_id, days: int) -> None:
+    """Build a digest in the background, pushing progress events and then the digest."""
+    async def on_progress(event: dict) -> None:
+        await connection.send({**event, "type": "digest_progress", "id": turn_id})
+
+    try:
+        digest = await digest_service.run(current_user.email, credentials, days, on_progress=on_progress)
+    except Exception as e:
+        api_logger.exception("Digest error: %s", e)
+        await connection.send({"type": "error", "id": turn_id, "detail": f"Failed to build digest: {str(e)}"})
+        return
+    await connection.send({"type": "digest", "id": turn_id, "digest": digest.model_dump()})
+
+
+async def _run_socket_turn(connection: Connection, current_user: UserProfile, credentials, frame: dict) -> None:
+    """Handle one ``message`` frame received on the chat socket."""
+    turn_id = frame.get("id")
+    message = frame.get("message")
+    if not isinstance(message, str) or not message.strip():
+        await connection.send({"type": "error", "id": turn_id, "detail": "message must be a non-empty string"})
+        return
+
+    async def on_delta(chunk: str) -> None:
+        await connection.send({"type": "delta", "id": turn_id, "content": chunk})
+
+    try:
+        response = await process_chat_turn(current_user, credentials, message, on_delta=on_delta)
+    except Exception as e:
+        api_logger.exception("Chat socket error: %s", e)
+        await connection.send({"type": "error", "id": turn_id, "detail": f"Failed to process message: {str(e)}"})
+        return
+
+    await connection.send({"type": "response", "id": turn_id, "response": response.model_dump()})
+    if response.intent.intent == "READ_EMAILS":
+        await _push_recent_emails(connection, current_user, credentials, turn_id)
+    elif response.intent.intent == "DIGEST":
+        await _push_digest(connection, current_user, credentials, turn_id, _digest_days(response.intent.parameters))
+
+
+@router.websocket("/ws")
+async def chat_socket(
+    websocket: WebSocket,
+    token: Optional[str] = Query(None, description="JWT; alternatively send {\"type\": \"auth\", \"token\": ...} first")
+):
+    """
+    Multiplexed chat channel.
+    
+    The token is verified when the socket opens, and the socket is closed
+    (1008) when it expires. Each turn re-reads the session, so a logout ends
+    the socket and refreshed Google tokens are picked up. Client frames are
+    ``{"type": "message", "id": ..., "message": ...}`` (turns run concurrently
+    and are correlated by ``id``) or ``{"type": "ping"}``. The server sends
+    ``delta``/``response`` frames per turn and pushes ``emails`` (background
+    summaries), ``digest_progress``/``digest`` and ``inbox_updated`` events.
+    """
+    await websocket.accept()
+    if token is None:
+        try:
+            frame = await asyncio.wait_for(websocket.receive_json(), timeout=SOCKET_AUTH_TIMEOUT)
+            if isinstance(frame, dict) and frame.get("type") == "auth" and isinstance(frame.get("token"), str):
+                token = frame["token"]
+        except (asyncio.TimeoutError, ValueError, WebSocketDisconnect):
+            pass
+    
+    session = await run_state_call(resolve_session, token) if token else None
+    if session is None or 'google_tokens' not in session:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Invalid authentication credentials")
+        return
+    
+    current_user = session['profile']
+    expires_at = token_expiry(token)
+    current_user_email.set(current_user.email)
+    connection = connection_manager.connect(current_user.email, websocket)
+    tasks = set()
+    await connection.send({"type": "ready", "user": current_user.email})
+    try:
+        while True:
+            try:
+                # Bounded by the token's expiry so an idle socket is closed too
+                timeout = max(expires_at - time.time(), 0.0) if expires_at is not None else None
+                frame = json.loads(await asyncio.wait_for(websocket.receive_text(), timeout=timeout))
+            except asyncio.TimeoutError:
+                await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Token expired")
+                break
+            except ValueError:
+                await connection.send({"type": "error", "detail": "Frames must be JSON objects"})
+                continue
+            frame_type = frame.get("type") if isinstance(frame, dict) else None
+            if frame_type == "ping":
+                await connection.send({"type": "pong"})
+            elif frame_type == "message":
+                # Verifies the token again and picks up logout or refreshed Google tokens
+                session = await run_state_call(resolve_session, token)
+                if session is None or 'google_tokens' not in session:
+                    await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Session expired")
+                    break
+                current_user, credentials = session['profile'], session['google_tokens']
+                task = asyncio.create_task(_run_socket_turn(connection, current_user, credentials, frame))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            else:
+                await connection.send({"type": "error", "detail": f"Unknown frame type: {frame_type}"})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        connection_manager.disconnect(connection)
+        for task in tasks:
+            task.cancel()
+
+
+def _page_messages(messages: List, since: Optional[int], before: Optional[int], limit: int):
+    """
+    Slice history records by ``seq`` cursors.
+
+    With ``since`` the page runs forward from the cursor (polling for new
+    messages); otherwise it is the newest ``limit`` messages before ``before``.
+
+    Returns:
+        Tuple of (page, has_more)
+    """
+    if since is not None:
+        newer = [m for m in messages if m.seq > since]
+        return newer[:limit], len(newer) > limit
+    if before is not None:
+        messages = [m for m in messages if m.seq < before]
+    return messages[-limit:], len(messages) > limit
+
+
+@router.get("/history", response_class=ORJSONResponse)
 async def get_chat_history(
+    since: Optional[int] = Query(None, description="Only messages with seq greater than this cursor"),
+    before: Optional[int] = Query(None, description="Only messages with seq lower than this cursor"),
+    limit: int = Query(50, ge=1, le=500, description="Maximum number of messages to return"),
+    if_none_match: Optional[str] = Header(None),
     current_user: UserProfile = Depends(get_current_user)
 ):
     """
     Get conversation history for current user.
     
+    Supports incremental polling: pass the last seen ``seq`` as ``since`` and
+    the previous ``ETag`` as ``If-None-Match`` to get a 304 when nothing changed.
+    
+    Args:
+        since: Forward cursor (exclusive)
+        before: Backward cursor (exclusive) for loading older pages
+        limit: Page size
+        if_none_match: ETag from a previous identical request
+        
     Returns:
-        List of chat messages
+        Page of chat messages with cursors, or 304 Not Modified
     """
-    conversation = get_or_create_conversation(current_user.email)
-    return {
-        "messages": conversation.messages,
-        "total": len(conversation.messages)
-    }
+    version = await run_state_call(conversation_store.version, current_user.email)
+    etag = f'W/"{version}.{since if since is not None else ""}.{before if before is not None else ""}.{limit}"'
+    if if_none_match and etag in {tag.strip() for tag in if_none_match.split(",")}:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    
+    records = await run_state_call(conversation_store.history, current_user.email)
+    page, has_more = _page_messages(records, since, before, limit)
+    return ORJSONResponse({
+        "messages": [m.to_dict() for m in page],
+        "total": len(records),
+        "version": version,
+        "has_more": has_more
+    }, headers={"ETag": etag})
 
 
 @router.delete("/history")
@@ -137,11 +527,7 @@ async def clear_chat_history(
     Returns:
         Success message
     """
-    if current_user.email in conversations:
-        conversations[current_user.email] = ConversationContext(
-            user_email=current_user.email,
-            messages=[]
-        )
+    await run_state_call(conversation_store.clear_history, current_user.email)
     
     return {"message": "Chat history cleared"}
 
@@ -160,7 +546,7 @@ async def update_email_context(
     Returns:
         Success message
     """
-    conversation = get_or_create_conversation(current_user.email)
-    conversation.recent_emails = emails
+    await run_state_call(conversation_store.set_recent_emails, current_user.email, emails)
+    email_index.update(current_user.email, emails)
     
     return {"message": "Email context updated", "count": len(emails)}
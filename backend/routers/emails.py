@@ -1,32 +1,174 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
-from models.email import EmailSummary, EmailReply, GeneratedReply
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from datetime import datetime, timedelta
+from typing import List, Optional, Sequence, Union
+from models.email import DigestRequest, EmailSummary, EmailReply, GeneratedReply, OutboxEntry, SearchResult
 from models.user import UserProfile
 from utils.dependencies import get_current_user, get_google_credentials
+from services.gmail_quota import GmailRateLimited
 from services.gmail_service import gmail_service
 from services.ai_service import ai_service
+from services.llm_budget import LLMBudgetExceeded
 from services.auth_service import auth_service
+from services.conversation_store import conversation_store
+from services.digest import digest_service
+from services.email_index import email_index
+from services.outbox import IdempotencyConflict, outbox
+from services.summary_cache import summary_cache
+from services.realtime import connection_manager
+from services.state_backend import run_state_call
+from services.vector_index import vector_index
+from utils.logger import api_logger
+from utils.serialization import dumps
+from utils.singleflight import singleflight
+import asyncio
 
 router = APIRouter(prefix="/api/emails", tags=["Emails"])
 
+# Inbox entries (threads) per page; chat positions ("delete email 2") refer to this page
+INBOX_PAGE_SIZE = 5
+
+# Header fields the chat context and email index keep; summaries and dates are not copied
+_EMAIL_REF_FIELDS = {"id", "sender", "sender_email", "subject"}
+
+
+def remember_recent_emails(user_email: str, emails: Sequence[Union[EmailSummary, SearchResult]]) -> None:
+    """Record the emails a user was just shown in their chat context and email index."""
+    email_dicts = [e.model_dump(include=_EMAIL_REF_FIELDS) for e in emails]
+    conversation_store.set_recent_emails(user_email, email_dicts)
+    email_index.update(user_email, email_dicts)
+
+
+async def fetch_recent_emails_coalesced(user_email: str, credentials, limit: int = INBOX_PAGE_SIZE) -> List[EmailSummary]:
+    """Fetch the inbox, sharing one in-flight fetch between concurrent callers for a user."""
+    return await singleflight.run(
+        "fetch_recent_emails", (user_email, limit),
+        gmail_service.fetch_recent_emails, credentials, limit
+    )
+
+
+def _inbox_etag(user_email: str, history_id: str, limit: int) -> str:
+    """Weak validator for an inbox page: mailbox state plus the user's cached summaries."""
+    return f'W/"{history_id}.{summary_cache.version(user_email)}.{limit}"'
+
+
 @router.get("/recent", response_model=List[EmailSummary])
 async def get_recent_emails(
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
     current_user: UserProfile = Depends(get_current_user),
     credentials: dict = Depends(get_google_credentials)
 ):
-    """Fetch and summarize recent emails."""
-    emails = gmail_service.fetch_recent_emails(credentials, limit=5)
+    """
+    Fetch and summarize recent emails.
+    
+    The response carries an ``ETag`` built from the mailbox ``historyId`` and
+    the user's summary-cache version. Sending it back as ``If-None-Match``
+    costs one Gmail profile call and returns 304 if nothing changed. Pages
+    with a fallback summary (a failed LLM call, not cached) carry no ``ETag``.
+    """
+    limit = INBOX_PAGE_SIZE
+    history_id = await singleflight.run(
+        "mailbox_history_id", (current_user.email,),
+        gmail_service.mailbox_history_id, credentials
+    )
+    if history_id is not None and if_none_match:
+        etag = _inbox_etag(current_user.email, history_id, limit)
+        if etag in {tag.strip() for tag in if_none_match.split(",")}:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    
+    try:
+        emails = await fetch_recent_emails_coalesced(current_user.email, credentials, limit=limit)
+    except GmailRateLimited as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Gmail is rate-limiting this account. Please try again shortly.",
+            headers={"Retry-After": str(e.retry_after)}
+        )
     
     # Update conversation context with these emails
-    # We need to access the chat service or shared state
-    # For now, we'll rely on the frontend to send context back if needed
-    # or update the in-memory store if we import it
-    from routers.chat import get_or_create_conversation
-    conversation = get_or_create_conversation(current_user.email)
-    conversation.recent_emails = [e.dict() for e in emails]
+    await run_state_call(remember_recent_emails, current_user.email, emails)
     
+    # Read after the fetch so summaries it cached are part of the version. An
+    # empty page may be a failed fetch, and a fallback summary stands in for a
+    # failed LLM call (not cached); neither is validated, so the next load
+    # tries again instead of getting a 304
+    if history_id is not None and emails and not any(e.summary_source == "fallback" for e in emails):
+        response.headers["ETag"] = _inbox_etag(current_user.email, history_id, limit)
     return emails
 
+@router.post("/digest")
+async def create_digest(
+    request: DigestRequest,
+    current_user: UserProfile = Depends(get_current_user),
+    credentials: dict = Depends(get_google_credentials)
+):
+    """
+    Build a digest of many emails, streaming progress as NDJSON.
+    
+    Each line is one JSON event: ``progress`` events (``stage`` is list, map,
+    reduce, final or done, with ``done``/``total`` counts) while the digest
+    runs, then a ``digest`` event with the result or an ``error`` event.
+    Sending the same request again resumes an interrupted digest from its
+    checkpoints, or returns a finished one at once.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def produce() -> None:
+        try:
+            digest = await digest_service.run(
+                current_user.email, credentials, request.days, request.query,
+                request.max_messages, request.refresh, on_progress=queue.put
+            )
+            await queue.put({"type": "digest", "digest": digest.model_dump()})
+        except Exception as e:
+            api_logger.exception("Digest error: %s", e)
+            await queue.put({"type": "error", "detail": f"Failed to build digest: {str(e)}"})
+        finally:
+            await queue.put(None)
+
+    async def events():
+        producer = asyncio.create_task(produce())
+        try:
+            while (event := await queue.get()) is not None:
+                yield dumps(event) + b"\n"
+        finally:
+            # The digest itself keeps running and checkpointing if the client goes away
+            producer.cancel()
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+def search_emails_local(user_email: str, query: str, k: int = 10, days: Optional[int] = None) -> List[SearchResult]:
+    """Search the user's locally indexed threads (blocking; scores every indexed thread)."""
+    since = (datetime.now() - timedelta(days=days)).timestamp() if days else None
+    return [
+        SearchResult(
+            id=hit.email_id, thread_id=hit.thread_id, sender=hit.sender, sender_email=hit.sender,
+            subject=hit.subject, summary=hit.summary, date=datetime.fromtimestamp(hit.timestamp),
+            score=round(hit.score, 4)
+        )
+        for hit in vector_index.search(user_email, query, k, since)
+    ]
+
+@router.get("/search", response_model=List[SearchResult])
+async def search_emails(
+    q: str = Query(..., min_length=1, max_length=500),
+    k: int = Query(10, ge=1, le=100),
+    days: Optional[int] = Query(None, ge=1, le=3650),
+    current_user: UserProfile = Depends(get_current_user)
+):
+    """
+    Search threads the assistant has already summarized (inbox pages and digests).
+    
+    Runs locally against the in-memory index, with no Gmail or LLM calls, so
+    only threads seen since the server started (or re-summarized) are found.
+    Results become the chat context, so "reply to the first one" works after a search.
+    """
+    results = await run_in_threadpool(search_emails_local, current_user.email, q, k, days)
+    await run_state_call(remember_recent_emails, current_user.email, results)
+    return results
+
 @router.post("/generate-reply", response_model=GeneratedReply)
 async def generate_reply(
     request: dict, # Expecting {"email_id": "..."}
@@ -39,16 +181,28 @@ async def generate_reply(
         raise HTTPException(status_code=400, detail="Email ID required")
         
     # Fetch full email content
-    email_data = gmail_service.get_email_content(credentials, email_id)
+    email_data = await singleflight.run(
+        "get_email_content", (current_user.email, email_id),
+        gmail_service.get_email_content, credentials, email_id
+    )
     if not email_data:
         raise HTTPException(status_code=404, detail="Email not found")
         
     # Generate reply
-    reply_content = ai_service.generate_email_reply(
-        email_data['body'],
-        email_data['subject'],
-        email_data['sender']
-    )
+    try:
+        reply_content = await singleflight.run(
+            "generate_email_reply", (current_user.email, email_id),
+            ai_service.generate_email_reply, email_data['body'], email_data['subject'], email_data['sender']
+        )
+    except LLMBudgetExceeded as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="AI usage limit reached. Please try again later.",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    
+    # Remember the draft so "send reply number N" in chat can act on it
+    await run_state_call(conversation_store.set_generated_reply, current_user.email, email_id, reply_content)
     
     return GeneratedReply(
         email_id=email_id,
@@ -57,18 +211,51 @@ async def generate_reply(
         reply_content=reply_content
     )
 
-@router.post("/send-reply")
+@router.post("/send-reply", response_model=OutboxEntry, status_code=status.HTTP_202_ACCEPTED)
 async def send_reply(
     reply: EmailReply,
-    current_user: UserProfile = Depends(get_current_user),
-    credentials: dict = Depends(get_google_credentials)
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, max_length=200),
+    current_user: UserProfile = Depends(get_current_user)
 ):
-    """Send a reply via Gmail."""
-    success = gmail_service.send_reply(credentials, reply.email_id, reply.reply_content)
-    if not success:
-        raise HTTPException(status_code=500, detail="Failed to send email")
-        
-    return {"message": "Reply sent successfully"}
+    """
+    Queue a reply for sending via Gmail.
+    
+    Returns 202 with the outbox entry as soon as the send is persisted;
+    delivery happens in the background (poll ``Location``, or wait for the
+    ``inbox_updated`` push). Retrying with the same ``Idempotency-Key`` (by
+    default, the same reply to the same email) returns the original entry
+    with ``Idempotent-Replayed: true`` instead of sending twice.
+    """
+    try:
+        entry, created = await run_in_threadpool(
+            outbox.enqueue, current_user.email, reply.email_id, reply.reply_content, idempotency_key
+        )
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    response.headers["Location"] = f"/api/emails/outbox/{entry.id}"
+    if not created:
+        response.headers["Idempotent-Replayed"] = "true"
+    return entry
+
+@router.get("/outbox", response_model=List[OutboxEntry])
+async def list_outbox(
+    limit: int = Query(20, ge=1, le=100),
+    current_user: UserProfile = Depends(get_current_user)
+):
+    """The current user's most recent sends and their delivery state."""
+    return await run_in_threadpool(outbox.recent, current_user.email, limit)
+
+@router.get("/outbox/{entry_id}", response_model=OutboxEntry)
+async def get_outbox_entry(
+    entry_id: str,
+    current_user: UserProfile = Depends(get_current_user)
+):
+    """Delivery state of one queued reply."""
+    entry = await run_in_threadpool(outbox.get, current_user.email, entry_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Outbox entry not found")
+    return entry
 
 @router.delete("/delete/{email_id}")
 async def delete_email(
@@ -77,8 +264,13 @@ async def delete_email(
     credentials: dict = Depends(get_google_credentials)
 ):
     """Delete an email."""
-    success = gmail_service.delete_email(credentials, email_id)
+    # Off the event loop: the call may wait out the user's Gmail quota pause
+    success = await run_in_threadpool(gmail_service.delete_email, credentials, email_id)
     if not success:
         raise HTTPException(status_code=500, detail="Failed to delete email")
+    email_index.remove(current_user.email, email_id)
+    vector_index.remove(current_user.email, email_id)
+    await run_state_call(conversation_store.forget_email, current_user.email, email_id)
+    await connection_manager.push(current_user.email, {"type": "inbox_updated", "action": "deleted", "email_id": email_id})
         
     return {"message": "Email deleted successfully"}
@@ -1,18 +1,98 @@
-from groq import Groq
 from app.config import get_settings
 from models.chat import IntentClassification, ChatMessage
-from typing import List, Optional
+from typing import Iterator, List, Optional, Tuple
 import json
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
-from utils.logger import log_ai_call, log_ai_success, log_ai_error, log_ai_retry
+import threading
+from tenacity import retry, stop_after_attempt, stop_after_delay, wait_exponential, retry_if_not_exception_type
+from services.normalizer import normalize_body
+from services.llm_budget import ADMIT_DENIED, ADMIT_FULL, LLMBudgetExceeded, llm_budget
+from utils.metrics import track, record_admission, record_llm_usage, record_retry
+from utils.request_context import current_user_email
+from utils.resources import resources
 
 settings = get_settings()
 
+CHAT_FALLBACK_RESPONSE = "I apologize, but I'm having trouble processing your request right now. Please try again."
+
 
 class AIService:
     def __init__(self):
-        self.client = Groq(api_key=settings.groq_api_key)
+        self._client = None
+        self._summary_client = None
+        self._http_client = None
+        self._client_lock = threading.Lock()
         self.model = "llama-3.3-70b-versatile"  # Fast and high-quality 
+        self.fallback_model = settings.llm_fallback_model  # Used when a user nears their budget
+    
+    @property
+    def client(self):
+        """
+        Groq client, created on first use (importing groq pulls in httpx/httpcore).
+        
+        It sends through the app's shared HTTP pool and is rebuilt if that pool
+        was replaced (after a shutdown/start cycle).
+        """
+        http_client = resources.http_client
+        if self._client is None or self._http_client is not http_client:
+            with self._client_lock:
+                if self._client is None or self._http_client is not http_client:
+                    from groq import Groq
+                    self._client = Groq(
+                        api_key=settings.groq_api_key,
+                        base_url=settings.groq_base_url,
+                        http_client=http_client
+                    )
+                    self._summary_client = self._client.with_options(max_retries=0)
+                    self._http_client = http_client
+        return self._client
+    
+    @property
+    def summary_client(self):
+        """
+        Groq client without SDK-level retries, for summaries.
+        
+        Summaries retry through tenacity under a total deadline; SDK retries
+        inside each attempt would multiply the attempts and overrun it.
+        """
+        self.client
+        return self._summary_client
+    
+    def warm_up(self) -> None:
+        """Create the Groq client ahead of the first request."""
+        self.client
+    
+    def _admit(self, operation: str, degrade_when_denied: bool) -> Tuple[Optional[str], str]:
+        """
+        Apply the current user's LLM budget to one call.
+        
+        Args:
+            operation: Operation name for metrics
+            degrade_when_denied: Use the fallback model instead of refusing
+                when the user is over budget (for interactive chat calls)
+            
+        Returns:
+            (user, model) to run the call with
+            
+        Raises:
+            LLMBudgetExceeded: If over budget and the call can't be degraded
+        """
+        user = current_user_email.get()
+        decision = llm_budget.admit(user)
+        record_admission(operation, decision)
+        if decision == ADMIT_DENIED and not degrade_when_denied:
+            raise LLMBudgetExceeded(user, llm_budget.retry_after(user))
+        return user, self.model if decision == ADMIT_FULL else self.fallback_model
+    
+    def _complete(self, operation: str, degrade_when_denied: bool = False, client=None, **kwargs):
+        """Run one budgeted, instrumented chat completion (on ``client``, default :attr:`client`)."""
+        user, model = self._admit(operation, degrade_when_denied)
+        client = client or self.client
+        with llm_budget.slot(user):
+            with track("llm", operation):
+                response = client.chat.completions.create(model=model, **kwargs)
+        record_llm_usage(operation, model, response.usage)
+        llm_budget.record(user, response.usage)
+        return response
     
     def parse_intent(self, user_message: str, conversation_history: List[ChatMessage] = None) -> IntentClassification:
         """
@@ -32,6 +112,8 @@ Analyze the user's message and classify it into one of these intents:
 - GENERATE_REPLIES: User wants to generate AI replies for emails
 - DELETE_EMAIL: User wants to delete a specific email
 - SEND_REPLY: User wants to send a generated reply
+- DIGEST: User wants an overview of many emails over a period (e.g. everything from this week)
+- SEARCH: User wants to find emails about a topic, person or thing (e.g. an old invoice)
 - GREETING: User is greeting or starting conversation
 - GENERAL_QUERY: General questions or unclear intent
 
@@ -41,7 +123,9 @@ Return a JSON object with:
     "confidence": 0.0-1.0,
     "parameters": {
         // For DELETE_EMAIL: {"sender": "name", "subject_keyword": "word", "reference_number": 1}
-        // For SEND_REPLY: {"reply_number": 1}
+        // For SEND_REPLY: {"reply_number": 1} or {"sender": "name", "subject_keyword": "word"}
+        // For DIGEST: {"days": 7} (how far back to look)
+        // For SEARCH: {"query": "what to look for", "days": 30} (days only if a period is given)
         // For others: {}
     }
 }
@@ -50,7 +134,10 @@ Examples:
 - "Show me my recent emails" -> READ_EMAILS
 - "Generate replies for these" -> GENERATE_REPLIES
 - "Delete the email from John" -> DELETE_EMAIL with {"sender": "John"}
+- "Delete the second email" -> DELETE_EMAIL with {"reference_number": 2}
 - "Send reply number 2" -> SEND_REPLY with {"reply_number": 2}
+- "Summarize everything from this week" -> DIGEST with {"days": 7}
+- "Find the invoice from Acme last month" -> SEARCH with {"query": "invoice from Acme", "days": 30}
 """
         
         messages = [{"role": "system", "content": system_prompt}]
@@ -62,8 +149,9 @@ Examples:
         messages.append({"role": "user", "content": user_message})
         
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
+            response = self._complete(
+                "intent",
+                degrade_when_denied=True,
                 messages=messages,
                 temperature=0.3,
                 response_format={"type": "json_object"}
@@ -76,8 +164,8 @@ Examples:
                 confidence=result.get("confidence", 0.5),
                 parameters=result.get("parameters", {})
             )
-        except Exception as e:
-            print(f"Intent parsing error: {e}")
+        except Exception:
+            # Logged and counted by track()
             return IntentClassification(
                 intent="GENERAL_QUERY",
                 confidence=0.0,
@@ -85,10 +173,11 @@ Examples:
             )
     
     @retry(
-        stop=stop_after_attempt(3),
+        # The caller waits on summaries: cap attempts and total time
+        stop=stop_after_attempt(3) | stop_after_delay(settings.llm_summary_timeout_seconds),
         wait=wait_exponential(multiplier=1, min=2, max=10),
-        retry=retry_if_exception_type(Exception),
-        before_sleep=lambda retry_state: log_ai_retry("email_summary", retry_state.attempt_number)
+        retry=retry_if_not_exception_type(LLMBudgetExceeded),
+        before_sleep=lambda retry_state: record_retry("llm", "email_summary", retry_state.attempt_number)
     )
     def summarize_email(self, email_body: str, subject: str) -> str:
         """
@@ -100,8 +189,11 @@ Examples:
             
         Returns:
             AI-generated summary
+            
+        Raises:
+            LLMBudgetExceeded: If the current user is over their LLM budget
         """
-        log_ai_call("email_summary", "system")
+        email_body = normalize_body(email_body, max_quoted_chars=1000).text
         prompt = f"""Summarize this email in 2-3 concise sentences. Focus on the main point and any action items.
 
 Subject: {subject}
@@ -111,28 +203,185 @@ Email:
 
 Summary:"""
         
-        try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are a helpful email summarizer. Be concise and clear."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3,
-                max_tokens=120
+        response = self._complete(
+            "email_summary",
+            client=self.summary_client,
+            messages=[
+                {"role": "system", "content": "You are a helpful email summarizer. Be concise and clear."},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.3,
+            max_tokens=120,
+            timeout=settings.llm_summary_timeout_seconds
+        )
+        return response.choices[0].message.content.strip()
+
+    @staticmethod
+    def _format_thread_messages(messages: List[Tuple[str, str]], limit: int = 10000) -> str:
+        """Render (sender, body) pairs oldest first, dropping the oldest ones past ``limit`` chars."""
+        rendered = []
+        used = 0
+        for sender, body in reversed(messages):
+            block = f"From: {sender}\n{body[:4000]}"
+            if rendered and used + len(block) > limit:
+                break
+            rendered.append(block)
+            used += len(block)
+        return "\n\n---\n\n".join(reversed(rendered))
+
+    @retry(
+        # The caller waits on summaries: cap attempts and total time
+        stop=stop_after_attempt(3) | stop_after_delay(settings.llm_summary_timeout_seconds),
+        wait=wait_exponential(multiplier=1, min=2, max=10),
+        retry=retry_if_not_exception_type(LLMBudgetExceeded),
+        before_sleep=lambda retry_state: record_retry("llm", "thread_summary", retry_state.attempt_number)
+    )
+    def summarize_thread(self, messages: List[Tuple[str, str]], subject: str) -> str:
+        """
+        Summarize a whole email thread in one call.
+
+        Args:
+            messages: (sender, body) pairs, oldest first, bodies already normalized
+            subject: The thread subject
+
+        Returns:
+            AI-generated thread summary
+
+        Raises:
+            LLMBudgetExceeded: If the current user is over their LLM budget
+        """
+        prompt = f"""Summarize this email thread in 2-3 concise sentences. Focus on where the conversation stands and any open action items.
+
+Subject: {subject}
+
+Messages (oldest first):
+{self._format_thread_messages(messages)}
+
+Summary:"""
+
+        response = self._complete(
+            "thread_summary",
+            client=self.summary_client,
+            messages=[
+                {"role": "system", "content": "You are a helpful email summarizer. Be concise and clear."},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.3,
+            max_tokens=150,
+            timeout=settings.llm_summary_timeout_seconds
+        )
+        return response.choices[0].message.content.strip()
+
+    @retry(
+        # The caller waits on summaries: cap attempts and total time
+        stop=stop_after_attempt(3) | stop_after_delay(settings.llm_summary_timeout_seconds),
+        wait=wait_exponential(multiplier=1, min=2, max=10),
+        retry=retry_if_not_exception_type(LLMBudgetExceeded),
+        before_sleep=lambda retry_state: record_retry("llm", "thread_update", retry_state.attempt_number)
+    )
+    def update_thread_summary(self, previous_summary: str, new_messages: List[Tuple[str, str]], subject: str) -> str:
+        """
+        Fold new messages into an existing thread summary.
+
+        Only the previous summary and the new messages are sent, so the cost
+        of an update doesn't grow with the length of the thread.
+
+        Args:
+            previous_summary: Summary covering the earlier messages
+            new_messages: (sender, body) pairs that arrived since, oldest first
+            subject: The thread subject
+
+        Returns:
+            Updated thread summary
+
+        Raises:
+            LLMBudgetExceeded: If the current user is over their LLM budget
+        """
+        prompt = f"""Here is the summary of an email thread so far, followed by new messages. Rewrite the summary in 2-3 concise sentences so it covers the new messages too. Focus on where the conversation stands and any open action items.
+
+Subject: {subject}
+
+Summary so far:
+{previous_summary}
+
+New messages (oldest first):
+{self._format_thread_messages(new_messages)}
+
+Updated summary:"""
+
+        response = self._complete(
+            "thread_update",
+            client=self.summary_client,
+            messages=[
+                {"role": "system", "content": "You are a helpful email summarizer. Be concise and clear."},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.3,
+            max_tokens=150,
+            timeout=settings.llm_summary_timeout_seconds
+        )
+        return response.choices[0].message.content.strip()
+
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=1, min=2, max=10),
+        retry=retry_if_not_exception_type(LLMBudgetExceeded),
+        before_sleep=lambda retry_state: record_retry("llm", "digest_merge", retry_state.attempt_number)
+    )
+    def merge_digest(self, parts: List[str], period: str, final: bool) -> str:
+        """
+        Merge thread summaries (or partial digests) into one digest.
+
+        Args:
+            parts: Thread summary lines or partial digests, most important first
+            period: What the digest covers, e.g. "the last 7 days"
+            final: Whether this is the digest shown to the user (longer, with
+                a list of action items) or an intermediate merge
+
+        Returns:
+            Merged digest text
+
+        Raises:
+            LLMBudgetExceeded: If the current user is over their LLM budget
+        """
+        if final:
+            instruction = (
+                "Write a digest of these emails for the user. Start with a 2-3 sentence overview, "
+                "then group the important items by topic as short bullet points, and end with a list of "
+                "action items with any deadlines. Skip newsletters and notifications unless they need action."
             )
-            result = response.choices[0].message.content.strip()
-            log_ai_success("email_summary", "system")
-            return result
-        except Exception as e:
-            log_ai_error("email_summary", "system", str(e))
-            raise
-    
+        else:
+            instruction = (
+                "Merge these email summaries into one dense summary that keeps every action item, "
+                "deadline, amount and person mentioned. Drop greetings, newsletters and duplicates."
+            )
+        joined = "\n\n".join(parts)
+        prompt = f"""{instruction}
+
+Period: {period}
+
+Summaries (most important first):
+{joined}
+
+Digest:"""
+
+        response = self._complete(
+            "digest_merge",
+            messages=[
+                {"role": "system", "content": "You are a helpful email summarizer. Be concise and clear."},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.3,
+            max_tokens=600 if final else 350,
+            timeout=settings.llm_summary_timeout_seconds
+        )
+        return response.choices[0].message.content.strip()
+
     @retry(
         stop=stop_after_attempt(3),
         wait=wait_exponential(multiplier=1, min=2, max=10),
-        retry=retry_if_exception_type(Exception),
-        before_sleep=lambda retry_state: log_ai_retry("email_reply", retry_state.attempt_number)
+        retry=retry_if_not_exception_type(LLMBudgetExceeded),
+        before_sleep=lambda retry_state: record_retry("llm", "email_reply", retry_state.attempt_number)
     )
     def generate_email_reply(self, email_body: str, subject: str, sender: str) -> str:
         """
@@ -145,8 +394,12 @@ Summary:"""
             
         Returns:
             AI-generated reply
+            
+        Raises:
+            LLMBudgetExceeded: If the current user is over their LLM budget
         """
-        log_ai_call("email_reply", "system")
+        # Keep a little quoted history so the 1500-char window is mostly the new message
+        email_body = normalize_body(email_body, max_quoted_chars=500).text
         prompt = f"""Generate a professional and context-aware reply to this email.
 The reply should be polite, clear, and address the main points.
 
@@ -160,40 +413,24 @@ Original Email:
 
 Generate a professional reply (body text only, no subject line):"""
         
-        try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are a professional email assistant. Write clear, polite, and helpful email replies."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.5,
-                max_tokens=250
-            )
-            result = response.choices[0].message.content.strip()
-            log_ai_success("email_reply", "system")
-            return result
-        except Exception as e:
-            log_ai_error("email_reply", "system", str(e))
-            raise
+        response = self._complete(
+            "email_reply",
+            messages=[
+                {"role": "system", "content": "You are a professional email assistant. Write clear, polite, and helpful email replies."},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.5,
+            max_tokens=250
+        )
+        return response.choices[0].message.content.strip()
     
-    def generate_chat_response(
-        self, 
-        user_message: str, 
+    def _build_chat_messages(
+        self,
+        user_message: str,
         conversation_history: List[ChatMessage] = None,
         context_data: dict = None
-    ) -> str:
-        """
-        Generate a conversational response to user message.
-        
-        Args:
-            user_message: User's message
-            conversation_history: Previous messages
-            context_data: Additional context (emails, etc.)
-            
-        Returns:
-            AI-generated response
-        """
+    ) -> List[dict]:
+        """Assemble the prompt messages for a conversational response."""
         system_prompt = """You are a helpful AI email assistant. You help users manage their Gmail inbox.
 
 Your capabilities:
@@ -218,19 +455,82 @@ Be friendly, concise, and helpful. When users ask about your capabilities, expla
             messages.append({"role": "system", "content": context_msg})
         
         messages.append({"role": "user", "content": user_message})
+        return messages
+    
+    def generate_chat_response(
+        self, 
+        user_message: str, 
+        conversation_history: List[ChatMessage] = None,
+        context_data: dict = None
+    ) -> str:
+        """
+        Generate a conversational response to user message.
+        
+        Args:
+            user_message: User's message
+            conversation_history: Previous messages
+            context_data: Additional context (emails, etc.)
+            
+        Returns:
+            AI-generated response
+        """
+        messages = self._build_chat_messages(user_message, conversation_history, context_data)
         
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
+            response = self._complete(
+                "chat",
+                degrade_when_denied=True,
                 messages=messages,
                 temperature=0.7,
                 max_tokens=500
             )
             
             return response.choices[0].message.content.strip()
-        except Exception as e:
-            print(f"Chat response error: {e}")
-            return "I apologize, but I'm having trouble processing your request right now. Please try again."
+        except Exception:
+            # Logged and counted by track()
+            return CHAT_FALLBACK_RESPONSE
+    
+    def stream_chat_response(
+        self,
+        user_message: str,
+        conversation_history: List[ChatMessage] = None,
+        context_data: dict = None
+    ) -> Iterator[str]:
+        """
+        Stream a conversational response as content deltas.
+        
+        Args:
+            user_message: User's message
+            conversation_history: Previous messages
+            context_data: Additional context (emails, etc.)
+            
+        Yields:
+            Chunks of the AI-generated response
+        """
+        messages = self._build_chat_messages(user_message, conversation_history, context_data)
+        
+        try:
+            user, model = self._admit("chat_stream", degrade_when_denied=True)
+            with llm_budget.slot(user), track("llm", "chat_stream"):
+                stream = self.client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    temperature=0.7,
+                    max_tokens=500,
+                    stream=True
+                )
+                for chunk in stream:
+                    # Groq reports usage on the final chunk
+                    usage = getattr(getattr(chunk, "x_groq", None), "usage", None)
+                    if usage is not None:
+                        record_llm_usage("chat_stream", model, usage)
+                        llm_budget.record(user, usage)
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if delta:
+                        yield delta
+        except Exception:
+            # Logged and counted by track()
+            yield CHAT_FALLBACK_RESPONSE
 
 
 # Singleton instance
@@ -1,17 +1,15 @@
-from google_auth_oauthlib.flow import Flow
-from google.oauth2.credentials import Credentials
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
 from app.config import get_settings
 from models.user import UserProfile, GoogleTokens
 from typing import Tuple, Optional
 import os
 from utils.logger import log_auth_attempt, log_auth_success, log_auth_failure
+from utils.serialization import dumps, loads
+from services.state_backend import state_backend
+from services import google_api
 
 settings = get_settings()
 
-# In-memory storage for user sessions (in production, use Redis or database)
-user_sessions = {}
+SESSION_KEY = "session:{}"
 
 
 class AuthService:
@@ -26,6 +24,21 @@ class AuthService:
             }
         }
     
+    def _flow(self):
+        """OAuth flow for the configured client (google_auth_oauthlib is imported on first use)."""
+        from google_auth_oauthlib.flow import Flow
+        
+        return Flow.from_client_config(
+            self.client_config,
+            scopes=settings.gmail_scopes,
+            redirect_uri=settings.google_redirect_uri
+        )
+    
+    def warm_up(self) -> None:
+        """Import the OAuth libraries ahead of the first login."""
+        import google_auth_oauthlib.flow  # noqa: F401
+        import google.auth.transport.requests  # noqa: F401
+    
     def get_authorization_url(self, state: str) -> str:
         """
         Generate Google OAuth authorization URL.
@@ -36,11 +49,7 @@ class AuthService:
         Returns:
             Authorization URL string
         """
-        flow = Flow.from_client_config(
-            self.client_config,
-            scopes=settings.gmail_scopes,
-            redirect_uri=settings.google_redirect_uri
-        )
+        flow = self._flow()
         
         authorization_url, _ = flow.authorization_url(
             access_type='offline',
@@ -61,11 +70,7 @@ class AuthService:
         Returns:
             Tuple of (GoogleTokens, UserProfile)
         """
-        flow = Flow.from_client_config(
-            self.client_config,
-            scopes=settings.gmail_scopes,
-            redirect_uri=settings.google_redirect_uri
-        )
+        flow = self._flow()
         
         log_auth_attempt("unknown")
         
@@ -74,7 +79,7 @@ class AuthService:
         credentials = flow.credentials
         
         # Get user info
-        user_info_service = build('oauth2', 'v2', credentials=credentials)
+        user_info_service = google_api.build_service('oauth2', 'v2', credentials)
         user_info = user_info_service.userinfo().get().execute()
         
         # Create token model
@@ -95,14 +100,25 @@ class AuthService:
         )
         
         # Store tokens in session (in-memory)
-        user_sessions[user_profile.email] = {
-            'google_tokens': google_tokens,
-            'profile': user_profile
-        }
+        self.store_user_session(user_profile, google_tokens)
         
         log_auth_success(user_profile.email)
         return google_tokens, user_profile
     
+    def store_user_session(self, profile: UserProfile, google_tokens: GoogleTokens) -> None:
+        """
+        Store a user's profile and Google tokens.
+        
+        Args:
+            profile: Authenticated user's profile
+            google_tokens: Google OAuth tokens for the user
+        """
+        state_backend.set(
+            SESSION_KEY.format(profile.email),
+            dumps({'google_tokens': google_tokens.model_dump(), 'profile': profile.model_dump()}),
+            ttl=settings.access_token_expire_minutes * 60
+        )
+    
     def get_user_session(self, email: str) -> Optional[dict]:
         """
         Retrieve user session data.
@@ -113,7 +129,15 @@ class AuthService:
         Returns:
             Session data or None
         """
-        return user_sessions.get(email)
+        data = state_backend.get(SESSION_KEY.format(email))
+        if data is None:
+            return None
+        session = loads(data)
+        # Stored data was validated on write; skip re-validation on this hot path
+        return {
+            'google_tokens': GoogleTokens.model_construct(**session['google_tokens']),
+            'profile': UserProfile.model_construct(**session['profile'])
+        }
     
     def refresh_access_token(self, email: str) -> Optional[str]:
         """
@@ -125,16 +149,17 @@ class AuthService:
         Returns:
             New access token or None
         """
-        session = user_sessions.get(email)
+        session = self.get_user_session(email)
         if not session or not session['google_tokens'].refresh_token:
             return None
         
-        credentials = Credentials(
-            token=session['google_tokens'].access_token,
-            refresh_token=session['google_tokens'].refresh_token,
-            token_uri="https://oauth2.googleapis.com/token",
-            client_id=settings.google_client_id,
-            client_secret=settings.google_client_secret
+        from google.auth.transport.requests import Request
+        
+        credentials = google_api.user_credentials(
+            session['google_tokens'].access_token,
+            session['google_tokens'].refresh_token,
+            settings.google_client_id,
+            settings.google_client_secret
         )
         
         # Refresh the token
@@ -142,6 +167,7 @@ class AuthService:
         
         # Update session
         session['google_tokens'].access_token = credentials.token
+        self.store_user_session(session['profile'], session['google_tokens'])
         
         return credentials.token
     
@@ -155,8 +181,7 @@ class AuthService:
         Returns:
             True if successful
         """
-        if email in user_sessions:
-            del user_sessions[email]
+        if state_backend.pop(SESSION_KEY.format(email)) is not None:
             log_auth_success(f"Logout: {email}")
             return True
         return False
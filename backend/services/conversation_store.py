@@ -0,0 +1,425 @@
+from app.config import get_settings
+from services.state_backend import StateBackend, state_backend
+from utils.serialization import dumps, loads
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+import sys
+import threading
+import time
+
+settings = get_settings()
+
+# Rough per-object overhead (bytes) of a stored record on CPython, used for the
+# memory cap; only string payloads are measured exactly.
+_MESSAGE_OVERHEAD = 72
+_EMAIL_REF_OVERHEAD = 64
+_CONVERSATION_OVERHEAD = 640
+
+_ROLES = {role: sys.intern(role) for role in ("user", "assistant", "system")}
+
+
+def _initial_version() -> int:
+    """
+    Starting version for a new conversation.
+
+    Seeded from the clock (microseconds) so versions, and therefore message
+    cursors and ETags, never repeat after a conversation is cleared.
+    """
+    return time.time_ns() // 1000
+
+
+class StoredMessage:
+    """Compact chat message record; serialized in the ``ChatMessage`` shape only at the API boundary."""
+
+    __slots__ = ("role", "content", "timestamp", "seq")
+
+    def __init__(self, role: str, content: str, timestamp: float, seq: int = 0):
+        self.role = _ROLES[role]
+        self.content = content
+        self.timestamp = timestamp
+        self.seq = seq
+
+    def to_dict(self) -> dict:
+        """Same fields as ``ChatMessage``, without building a model per message."""
+        return {
+            "role": self.role,
+            "content": self.content,
+            "timestamp": datetime.utcfromtimestamp(self.timestamp),
+            "seq": self.seq
+        }
+
+
+class EmailRef:
+    """The few fields of an email summary the chat flow actually needs."""
+
+    __slots__ = ("id", "sender", "subject")
+
+    def __init__(self, id: str, sender: str, subject: str):
+        self.id = id
+        self.sender = sender
+        self.subject = subject
+
+    def to_dict(self) -> dict:
+        return {"id": self.id, "sender": self.sender, "subject": self.subject}
+
+
+class _Conversation:
+    __slots__ = ("messages", "recent_emails", "pending_choice", "generated_replies", "last_access", "size", "version")
+
+    def __init__(self, max_messages: int):
+        self.messages: deque = deque(maxlen=max_messages)
+        self.version = _initial_version()
+        self.recent_emails: Optional[List[EmailRef]] = None
+        self.pending_choice: Optional[List[str]] = None
+        self.generated_replies: Optional[Dict[str, str]] = None
+        self.last_access = time.monotonic()
+        self.size = _CONVERSATION_OVERHEAD
+
+
+def _message_size(content: str) -> int:
+    return _MESSAGE_OVERHEAD + sys.getsizeof(content)
+
+
+def _emails_size(emails: Optional[List[EmailRef]]) -> int:
+    if not emails:
+        return 0
+    return sum(_EMAIL_REF_OVERHEAD + sys.getsizeof(e.sender) + sys.getsizeof(e.subject) for e in emails)
+
+
+def _choice_size(email_ids: Optional[List[str]]) -> int:
+    return sum(sys.getsizeof(i) for i in email_ids) if email_ids else 0
+
+
+def _replies_size(replies: Optional[Dict[str, str]]) -> int:
+    if not replies:
+        return 0
+    return sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in replies.items())
+
+
+class ConversationStore:
+    """
+    Bounded in-process store for per-user chat state.
+
+    Each user gets a ring buffer of the last ``max_messages`` messages.
+    Conversations idle for longer than ``idle_ttl`` seconds are swept, and when
+    the estimated footprint exceeds ``max_bytes`` the least recently used
+    conversations are evicted first.
+    """
+
+    def __init__(self, max_messages: int, idle_ttl: float, max_bytes: int, sweep_interval: float = 60.0):
+        self.max_messages = max_messages
+        self.idle_ttl = idle_ttl
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        self._conversations: "OrderedDict[str, _Conversation]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._total_bytes = 0
+        self._last_sweep = time.monotonic()
+        self._evicted_idle = 0
+        self._evicted_memory = 0
+
+    # Internal helpers (caller holds the lock)
+
+    def _get(self, user_email: str, create: bool) -> Optional[_Conversation]:
+        conversation = self._conversations.get(user_email)
+        now = time.monotonic()
+        if conversation is not None and now - conversation.last_access > self.idle_ttl:
+            self._remove(user_email)
+            self._evicted_idle += 1
+            conversation = None
+        if conversation is None:
+            if not create:
+                return None
+            conversation = _Conversation(self.max_messages)
+            self._conversations[user_email] = conversation
+            self._total_bytes += conversation.size
+        else:
+            self._conversations.move_to_end(user_email)
+        conversation.last_access = now
+        return conversation
+
+    def _remove(self, user_email: str) -> None:
+        conversation = self._conversations.pop(user_email, None)
+        if conversation is not None:
+            self._total_bytes -= conversation.size
+
+    def _resize(self, conversation: _Conversation, delta: int) -> None:
+        conversation.size += delta
+        self._total_bytes += delta
+
+    def _enforce_limits(self, keep: str) -> None:
+        now = time.monotonic()
+        if now - self._last_sweep >= self.sweep_interval:
+            self._last_sweep = now
+            expired = [u for u, c in self._conversations.items() if now - c.last_access > self.idle_ttl]
+            for user_email in expired:
+                self._remove(user_email)
+            self._evicted_idle += len(expired)
+
+        while self._total_bytes > self.max_bytes and len(self._conversations) > 1:
+            oldest = next(iter(self._conversations))
+            if oldest == keep:
+                self._conversations.move_to_end(keep)
+                oldest = next(iter(self._conversations))
+            self._remove(oldest)
+            self._evicted_memory += 1
+
+    # Messages
+
+    def append_message(self, user_email: str, role: str, content: str) -> StoredMessage:
+        """Append a message to the user's ring buffer, evicting the oldest if full."""
+        message = StoredMessage(role, content, time.time())
+        with self._lock:
+            conversation = self._get(user_email, create=True)
+            delta = _message_size(content)
+            if len(conversation.messages) == conversation.messages.maxlen:
+                delta -= _message_size(conversation.messages[0].content)
+            conversation.version += 1
+            message.seq = conversation.version
+            conversation.messages.append(message)
+            self._resize(conversation, delta)
+            self._enforce_limits(keep=user_email)
+        return message
+
+    def history(self, user_email: str, last: Optional[int] = None) -> List[StoredMessage]:
+        """
+        Raw message records, oldest first.
+
+        Records expose ``role`` and ``content`` like ``ChatMessage``, so they can
+        be handed to the AI service without conversion.
+        """
+        with self._lock:
+            conversation = self._get(user_email, create=False)
+            if conversation is None:
+                return []
+            messages = list(conversation.messages)
+        return messages[-last:] if last else messages
+
+    def version(self, user_email: str) -> int:
+        """Current history version (0 if the user has no conversation)."""
+        with self._lock:
+            conversation = self._get(user_email, create=False)
+            return conversation.version if conversation is not None else 0
+
+    def clear_history(self, user_email: str) -> None:
+        """Reset a user's conversation (messages, email context and drafts)."""
+        with self._lock:
+            self._remove(user_email)
+
+    def drop(self, user_email: str) -> None:
+        """Forget everything stored for a user (called on logout)."""
+        with self._lock:
+            self._remove(user_email)
+
+    # Email context
+
+    def set_recent_emails(self, user_email: str, emails: Iterable[dict]) -> None:
+        """Keep compact references to the emails the user was last shown (ends any pending choice)."""
+        refs = [EmailRef(e.get("id"), e.get("sender") or "", e.get("subject") or "") for e in emails]
+        with self._lock:
+            conversation = self._get(user_email, create=True)
+            delta = _emails_size(refs) - _emails_size(conversation.recent_emails)
+            self._resize(conversation, delta - _choice_size(conversation.pending_choice))
+            conversation.recent_emails = refs
+            conversation.pending_choice = None
+            self._enforce_limits(keep=user_email)
+
+    def recent_emails(self, user_email: str) -> Optional[List[dict]]:
+        with self._lock:
+            conversation = self._get(user_email, create=False)
+            if conversation is None or conversation.recent_emails is None:
+                return None
+            return [e.to_dict() for e in conversation.recent_emails]
+
+    def set_pending_choice(self, user_email: str, email_ids: List[str]) -> None:
+        """Remember the candidates listed for "which one?", numbered from 1."""
+        with self._lock:
+            conversation = self._get(user_email, create=True)
+            self._resize(conversation, _choice_size(email_ids) - _choice_size(conversation.pending_choice))
+            conversation.pending_choice = list(email_ids)
+            self._enforce_limits(keep=user_email)
+
+    def pop_pending_choice(self, user_email: str) -> Optional[List[str]]:
+        """Take the candidates of an open "which one?" question, if any."""
+        with self._lock:
+            conversation = self._get(user_email, create=False)
+            if conversation is None or conversation.pending_choice is None:
+                return None
+            email_ids, conversation.pending_choice = conversation.pending_choice, None
+            self._resize(conversation, -_choice_size(email_ids))
+            return email_ids
+
+    def forget_email(self, user_email: str, email_id: str) -> None:
+        """Drop a deleted email from the user's context and drafts."""
+        with self._lock:
+            conversation = self._get(user_email, create=False)
+            if conversation is None:
+                return
+            if conversation.recent_emails:
+                kept = [e for e in conversation.recent_emails if e.id != email_id]
+                self._resize(conversation, _emails_size(kept) - _emails_size(conversation.recent_emails))
+                conversation.recent_emails = kept
+            if conversation.generated_replies and email_id in conversation.generated_replies:
+                draft = conversation.generated_replies.pop(email_id)
+                self._resize(conversation, -(sys.getsizeof(email_id) + sys.getsizeof(draft)))
+
+    # Generated replies
+
+    def set_generated_reply(self, user_email: str, email_id: str, reply_content: str) -> None:
+        with self._lock:
+            conversation = self._get(user_email, create=True)
+            if conversation.generated_replies is None:
+                conversation.generated_replies = {}
+            before = _replies_size(conversation.generated_replies)
+            conversation.generated_replies[email_id] = reply_content
+            self._resize(conversation, _replies_size(conversation.generated_replies) - before)
+            self._enforce_limits(keep=user_email)
+
+    def get_generated_reply(self, user_email: str, email_id: str) -> Optional[str]:
+        with self._lock:
+            conversation = self._get(user_email, create=False)
+            if conversation is None or not conversation.generated_replies:
+                return None
+            return conversation.generated_replies.get(email_id)
+
+    def discard_generated_reply(self, user_email: str, email_id: str) -> None:
+        """Drop a draft once it has been sent."""
+        with self._lock:
+            conversation = self._get(user_email, create=False)
+            if conversation is None or not conversation.generated_replies:
+                return
+            draft = conversation.generated_replies.pop(email_id, None)
+            if draft is not None:
+                self._resize(conversation, -(sys.getsizeof(email_id) + sys.getsizeof(draft)))
+
+    def has_generated_replies(self, user_email: str) -> bool:
+        with self._lock:
+            conversation = self._get(user_email, create=False)
+            return bool(conversation and conversation.generated_replies)
+
+    def stats(self) -> dict:
+        """Memory-usage metrics for the store."""
+        with self._lock:
+            return {
+                "conversations": len(self._conversations),
+                "messages": sum(len(c.messages) for c in self._conversations.values()),
+                "estimated_bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "evicted_idle": self._evicted_idle,
+                "evicted_memory": self._evicted_memory,
+            }
+
+
+class SharedConversationStore:
+    """
+    Conversation store kept in a shared :class:`StateBackend` (e.g. Redis).
+
+    Same interface as :class:`ConversationStore`. Messages are packed as
+    ``[role, content, timestamp, seq]`` arrays in a capped list and reply
+    drafts are fields of a hash keyed by email ID; every write refreshes the
+    key's idle TTL, and the global memory cap is delegated to the server's
+    ``maxmemory`` / ``volatile-lru`` policy.
+    """
+
+    def __init__(self, backend: StateBackend, max_messages: int, idle_ttl: float):
+        self.backend = backend
+        self.max_messages = max_messages
+        self.idle_ttl = idle_ttl
+
+    @staticmethod
+    def _keys(user_email: str):
+        prefix = f"chat:{user_email}:"
+        return prefix + "messages", prefix + "emails", prefix + "drafts", prefix + "version", prefix + "choice"
+
+    def append_message(self, user_email: str, role: str, content: str) -> StoredMessage:
+        messages_key, _, _, version_key, _ = self._keys(user_email)
+        seq = self.backend.counter_next(version_key, start=_initial_version(), ttl=self.idle_ttl)
+        message = StoredMessage(role, content, time.time(), seq)
+        self.backend.list_append(
+            messages_key,
+            dumps([message.role, message.content, message.timestamp, message.seq]),
+            maxlen=self.max_messages,
+            ttl=self.idle_ttl
+        )
+        return message
+
+    def history(self, user_email: str, last: Optional[int] = None) -> List[StoredMessage]:
+        messages_key = self._keys(user_email)[0]
+        return [StoredMessage(*loads(item)) for item in self.backend.list_range(messages_key, last)]
+
+    def version(self, user_email: str) -> int:
+        data = self.backend.get(self._keys(user_email)[3])
+        return int(data) if data is not None else 0
+
+    def clear_history(self, user_email: str) -> None:
+        self.backend.delete(*self._keys(user_email))
+
+    def drop(self, user_email: str) -> None:
+        self.backend.delete(*self._keys(user_email))
+
+    def set_recent_emails(self, user_email: str, emails: Iterable[dict]) -> None:
+        refs = [[e.get("id"), e.get("sender") or "", e.get("subject") or ""] for e in emails]
+        keys = self._keys(user_email)
+        self.backend.set(keys[1], dumps(refs), ttl=self.idle_ttl)
+        self.backend.delete(keys[4])
+
+    def recent_emails(self, user_email: str) -> Optional[List[dict]]:
+        data = self.backend.get(self._keys(user_email)[1])
+        if data is None:
+            return None
+        return [EmailRef(*ref).to_dict() for ref in loads(data)]
+
+    def set_pending_choice(self, user_email: str, email_ids: List[str]) -> None:
+        self.backend.set(self._keys(user_email)[4], dumps(list(email_ids)), ttl=self.idle_ttl)
+
+    def pop_pending_choice(self, user_email: str) -> Optional[List[str]]:
+        data = self.backend.pop(self._keys(user_email)[4])
+        return loads(data) if data is not None else None
+
+    def forget_email(self, user_email: str, email_id: str) -> None:
+        emails_key = self._keys(user_email)[1]
+        data = self.backend.get(emails_key)
+        if data is not None:
+            refs = [ref for ref in loads(data) if ref[0] != email_id]
+            self.backend.set(emails_key, dumps(refs), ttl=self.idle_ttl)
+        self.discard_generated_reply(user_email, email_id)
+
+    def set_generated_reply(self, user_email: str, email_id: str, reply_content: str) -> None:
+        self.backend.hash_set(self._keys(user_email)[2], email_id, reply_content.encode(), ttl=self.idle_ttl)
+
+    def get_generated_reply(self, user_email: str, email_id: str) -> Optional[str]:
+        data = self.backend.hash_get(self._keys(user_email)[2], email_id)
+        return data.decode() if data is not None else None
+
+    def discard_generated_reply(self, user_email: str, email_id: str) -> None:
+        self.backend.hash_delete(self._keys(user_email)[2], email_id)
+
+    def has_generated_replies(self, user_email: str) -> bool:
+        return self.backend.hash_len(self._keys(user_email)[2]) > 0
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self.backend).__name__,
+            "max_messages": self.max_messages,
+            "idle_ttl_seconds": self.idle_ttl,
+        }
+
+
+def create_conversation_store(backend: StateBackend):
+    """Use the compact in-process store unless state is shared between workers."""
+    if backend.shared:
+        return SharedConversationStore(
+            backend,
+            max_messages=settings.conversation_max_messages,
+            idle_ttl=settings.conversation_idle_ttl_seconds
+        )
+    return ConversationStore(
+        max_messages=settings.conversation_max_messages,
+        idle_ttl=settings.conversation_idle_ttl_seconds,
+        max_bytes=settings.conversation_max_bytes
+    )
+
+
+# Singleton instance
+conversation_store = create_conversation_store(state_backend)
@@ -0,0 +1,403 @@
+"""
+Digests of many emails ("summarize everything from this week").
+
+A digest is a map-reduce over the inbox threads matching a Gmail search:
+
+- list: matching messages are listed page by page and grouped by thread
+- map: each thread is summarized on the shared worker pool, at most
+  ``digest_map_concurrency`` at a time, through the thread summarizer, so
+  current thread summaries are reused, long threads are updated
+  incrementally and short ones are summarized locally
+- reduce: thread summaries, most important first, are merged in groups that
+  fit ``digest_reduce_input_tokens``; the partial digests are merged again
+  until one group is left, which becomes the digest
+
+The listing, every thread summary and every partial digest are checkpointed
+in the state backend as soon as they exist, keyed by the digest and the step's
+inputs. The listing and the finished digest are also keyed by a snapshot of
+the mailbox (its ``historyId`` and the day, as ``newer_than`` is relative), so
+they are only reused while nothing has changed; thread summaries are keyed by
+each thread's newest message and stay valid. A digest that is interrupted
+(client gone, worker restarted, LLM budget hit) resumes from its checkpoints
+when it is requested again, and a finished digest of an unchanged mailbox is
+served as is. Concurrent requests for the same digest share one run. Progress
+is reported to async callbacks as work completes.
+"""
+from app.config import get_settings
+from email.utils import parseaddr
+from models.email import Digest, DigestItem
+from services.ai_service import ai_service
+from services.gmail_service import gmail_service
+from services.llm_budget import LLMBudgetExceeded
+from services.state_backend import StateBackend, run_state_call, state_backend
+from services.thread_summarizer import thread_summarizer
+from services.triage import triage
+from services.vector_index import vector_index
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from utils.logger import ai_logger
+from utils.metrics import record_cache
+from utils.resources import resources
+from utils.serialization import dumps, loads
+from utils.tracing import tracer
+from datetime import datetime
+import asyncio
+import hashlib
+import time
+
+settings = get_settings()
+
+ProgressCallback = Callable[[dict], Awaitable[None]]
+
+# Progress events closer together than this are dropped (stage ends are always sent)
+_PROGRESS_INTERVAL = 0.2
+# Length caps of a merge that fell back to concatenation (~ the LLM's max_tokens)
+_PARTIAL_MAX_CHARS = 1400
+_FINAL_MAX_CHARS = 2400
+
+
+def _estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token)."""
+    return len(text) // 4 + 1
+
+
+def _truncate(text: str, max_chars: int) -> str:
+    return text if len(text) <= max_chars else text[:max_chars].rsplit("\n", 1)[0].rstrip() + "\n…"
+
+
+class _DigestRun:
+    """An in-flight digest and the progress callbacks of everyone waiting on it."""
+
+    __slots__ = ("task", "listeners", "last", "last_sent")
+
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        self.listeners: List[ProgressCallback] = []
+        self.last: Optional[dict] = None
+        self.last_sent = 0.0
+
+
+class DigestService:
+    def __init__(
+        self,
+        backend: StateBackend,
+        max_messages: int,
+        map_concurrency: int,
+        reduce_input_tokens: int,
+        checkpoint_ttl: float
+    ):
+        self.backend = backend
+        self.max_messages = max_messages
+        self.map_concurrency = max(1, map_concurrency)
+        self.reduce_input_tokens = reduce_input_tokens
+        self.checkpoint_ttl = checkpoint_ttl
+        self._running: Dict[Tuple[str, str, bool], _DigestRun] = {}
+
+    @staticmethod
+    def digest_id(search: str, max_messages: int) -> str:
+        """Stable ID of a digest request, so a repeated request finds its checkpoints."""
+        return hashlib.sha1(f"{search}\0{max_messages}".encode()).hexdigest()[:16]
+
+    @staticmethod
+    def _key(user_email: str, digest_id: str, *parts: str) -> str:
+        return ":".join(("digest", user_email, digest_id) + parts)
+
+    async def _load(self, key: str) -> Optional[Any]:
+        data = await run_state_call(self.backend.get, key, backend=self.backend)
+        return loads(data) if data is not None else None
+
+    async def _save(self, key: str, value: Any) -> None:
+        await run_state_call(self.backend.set, key, dumps(value), ttl=self.checkpoint_ttl, backend=self.backend)
+
+    @staticmethod
+    async def _submit(fn: Callable[..., Any], *args) -> Any:
+        """Run a blocking step on the shared worker pool (in the caller's context)."""
+        return await asyncio.wrap_future(resources.submit(fn, *args))
+
+    async def run(
+        self,
+        user_email: str,
+        credentials,
+        days: int,
+        query: Optional[str] = None,
+        max_messages: Optional[int] = None,
+        refresh: bool = False,
+        on_progress: Optional[ProgressCallback] = None
+    ) -> Digest:
+        """
+        Build (or resume, or return) the digest of a user's recent inbox.
+
+        Args:
+            user_email: Current user's email address
+            credentials: Google tokens
+            days: How far back to look
+            query: Extra Gmail search terms
+            max_messages: Most messages to list (capped at ``digest_max_messages``)
+            refresh: Discard a finished digest and the checkpointed listing
+            on_progress: Awaited with every ``progress`` event
+
+        Returns:
+            The digest. Cancelling the caller does not stop the run; it keeps
+            checkpointing so the next request picks up its results.
+        """
+        max_messages = min(max_messages or self.max_messages, self.max_messages)
+        search = " ".join(filter(None, (f"newer_than:{days}d", query)))
+        digest_id = self.digest_id(search, max_messages)
+        # A refresh never joins a run that may return the stale digest
+        key = (user_email, digest_id, refresh)
+
+        current = self._running.get(key)
+        if current is None:
+            current = _DigestRun()
+            self._running[key] = current
+            current.task = resources.track_task(asyncio.ensure_future(
+                self._run(current, user_email, credentials, digest_id, search, days, max_messages, refresh)
+            ))
+            current.task.add_done_callback(lambda _: self._running.pop(key, None))
+        if on_progress is not None:
+            current.listeners.append(on_progress)
+            if current.last is not None:
+                # Joined a run in progress: start from where it is
+                await on_progress(current.last)
+        try:
+            return await asyncio.shield(current.task)
+        finally:
+            if on_progress is not None and on_progress in current.listeners:
+                current.listeners.remove(on_progress)
+
+    async def _progress(self, run: _DigestRun, digest_id: str, stage: str, done: int, total: int) -> None:
+        event = {"type": "progress", "digest_id": digest_id, "stage": stage, "done": done, "total": total}
+        run.last = event
+        now = time.monotonic()
+        if done < total and now - run.last_sent < _PROGRESS_INTERVAL:
+            return
+        run.last_sent = now
+        for listener in list(run.listeners):
+            try:
+                await listener(event)
+            except Exception:
+                run.listeners.remove(listener)
+
+    async def _run(
+        self,
+        run: _DigestRun,
+        user_email: str,
+        credentials,
+        digest_id: str,
+        search: str,
+        days: int,
+        max_messages: int,
+        refresh: bool
+    ) -> Digest:
+        with tracer.start_as_current_span("digest.run") as span:
+            span.set_attribute("digest.id", digest_id)
+            history_id = await self._submit(gmail_service.mailbox_history_id, credentials)
+            snapshot = f"{datetime.utcnow():%Y%m%d}.{history_id or ''}"
+            plan_key = self._key(user_email, digest_id, "plan", snapshot)
+            result_key = self._key(user_email, digest_id, "result", snapshot)
+            if refresh:
+                await run_state_call(self.backend.delete, plan_key, result_key, backend=self.backend)
+            else:
+                finished = await self._load(result_key)
+                record_cache("digest", finished is not None)
+                if finished is not None:
+                    await self._progress(run, digest_id, "done", 1, 1)
+                    return Digest(**finished)
+
+            refs = await self._load(plan_key)
+            if refs is None:
+                await self._progress(run, digest_id, "list", 0, 1)
+                refs = await self._submit(gmail_service.list_threads, credentials, search, max_messages)
+                if refs:
+                    # An empty listing may be a failed one; never checkpoint it
+                    await self._save(plan_key, refs)
+                await self._progress(run, digest_id, "list", 1, 1)
+            span.set_attribute("digest.threads", len(refs))
+
+            items, resumed, degraded = await self._map(run, user_email, credentials, digest_id, refs)
+            items.sort(key=lambda item: -item.priority_score)
+            period = f"the last {days} days"
+            if items:
+                text, source = await self._reduce(run, user_email, digest_id, [self._line(i) for i in items], period)
+            else:
+                text, source = f"No emails in your inbox from {period}.", "llm"
+
+            digest = Digest(
+                digest_id=digest_id,
+                query=search,
+                digest=text,
+                digest_source=source,
+                threads=len(items),
+                messages=sum(i.messages for i in items),
+                resumed=resumed,
+                items=items,
+                created_at=datetime.utcnow()
+            )
+            # A digest with degraded steps is rebuilt (from its checkpoints) next time
+            if items and source == "llm" and not degraded:
+                await self._save(result_key, digest.model_dump(mode="json"))
+            await self._progress(run, digest_id, "done", 1, 1)
+            return digest
+
+    async def _map(
+        self, run: _DigestRun, user_email: str, credentials, digest_id: str, refs: List[List[str]]
+    ) -> Tuple[List[DigestItem], int, bool]:
+        """Summarize every thread; returns (items, count resumed from checkpoints, any degraded)."""
+        semaphore = asyncio.Semaphore(self.map_concurrency)
+        total = len(refs)
+        counts = {"done": 0, "resumed": 0, "degraded": 0}
+
+        async def map_one(thread_id: str, email_id: str) -> Optional[DigestItem]:
+            key = self._key(user_email, digest_id, "map", thread_id, email_id)
+            saved = await self._load(key)
+            record_cache("digest_checkpoint", saved is not None)
+            if saved is not None:
+                item = DigestItem(**saved)
+                counts["resumed"] += 1
+            else:
+                async with semaphore:
+                    item, degraded = await self._submit(
+                        self._summarize_thread, user_email, credentials, thread_id, email_id
+                    )
+                if degraded:
+                    counts["degraded"] += 1
+                elif item is not None:
+                    await self._save(key, item.model_dump())
+            counts["done"] += 1
+            await self._progress(run, digest_id, "map", counts["done"], total)
+            return item
+
+        items = await asyncio.gather(*(map_one(thread_id, email_id) for thread_id, email_id in refs))
+        return [i for i in items if i is not None], counts["resumed"], counts["degraded"] > 0
+
+    def _summarize_thread(self, user_email: str, credentials, thread_id: str, email_id: str) -> Tuple[Optional[DigestItem], bool]:
+        """
+        Summarize one thread (blocking; runs on the worker pool).
+
+        Returns:
+            (item, degraded): the item is None if the thread could not be
+            fetched; degraded is True when the LLM failed and the summary is
+            the local fallback
+        """
+        with tracer.start_as_current_span("digest.map_thread") as span:
+            span.set_attribute("gmail.thread_id", thread_id)
+            cached = thread_summarizer.cached(user_email, thread_id, email_id)
+            if cached is not None:
+                return DigestItem(
+                    thread_id=thread_id, email_id=email_id, sender=cached.sender, subject=cached.subject,
+                    summary=cached.summary, summary_source=cached.source, priority_score=cached.score,
+                    messages=len(cached.message_ids)
+                ), False
+
+            messages = gmail_service.get_thread(credentials, thread_id)
+            if not messages:
+                return None, False
+            shown = next((m for m in messages if m.id == email_id), messages[-1])
+            score = triage.score(user_email, shown.sender, shown.subject, shown.body, shown.labels, shown.headers, len(messages))
+            degraded = False
+            try:
+                entry = thread_summarizer.summarize(user_email, thread_id, messages, score)
+                summary, source = entry.summary, entry.source
+            except Exception as e:
+                if not isinstance(e, LLMBudgetExceeded):
+                    ai_logger.warning("LLM summary of thread %s failed, using extractive: %s", thread_id, e)
+                summary, source, degraded = thread_summarizer.fallback(messages), "fallback", True
+            vector_index.upsert_thread(user_email, thread_id, messages, shown, summary)
+            return DigestItem(
+                thread_id=thread_id, email_id=shown.id, sender=shown.sender, subject=shown.subject,
+                summary=summary, summary_source=source, priority_score=score, messages=len(messages)
+            ), degraded
+
+    @staticmethod
+    def _line(item: DigestItem) -> str:
+        name, address = parseaddr(item.sender)
+        count = f" ({item.messages} messages)" if item.messages > 1 else ""
+        return f"- {name or address or item.sender} | {item.subject}{count}: {item.summary}"
+
+    def _pack(self, parts: List[str]) -> List[List[str]]:
+        """
+        Group parts into merge inputs of at most ``reduce_input_tokens`` each.
+
+        Every group but a lone last one has at least two parts, so each
+        reduce level at least halves the number of parts.
+        """
+        max_chars = self.reduce_input_tokens * 4
+        groups: List[List[str]] = []
+        current: List[str] = []
+        used = 0
+        for part in parts:
+            part = _truncate(part, max_chars // 2)
+            tokens = _estimate_tokens(part)
+            if len(current) >= 2 and used + tokens > self.reduce_input_tokens:
+                groups.append(current)
+                current, used = [], 0
+            current.append(part)
+            used += tokens
+        if current:
+            groups.append(current)
+        return groups
+
+    async def _reduce(self, run: _DigestRun, user_email: str, digest_id: str, parts: List[str], period: str) -> Tuple[str, str]:
+        """Merge parts level by level until one group is left; returns (digest, source)."""
+        semaphore = asyncio.Semaphore(self.map_concurrency)
+        source = "llm"
+        level = 0
+        while True:
+            level += 1
+            groups = self._pack(parts)
+            final = len(groups) == 1
+            stage = "reduce" if not final else "final"
+            counts = {"done": 0}
+
+            async def merge_one(group: List[str]) -> Tuple[str, bool]:
+                digest_key = hashlib.sha1(dumps([final, period, group])).hexdigest()[:16]
+                key = self._key(user_email, digest_id, "reduce", digest_key)
+                saved = await self._load(key)
+                record_cache("digest_checkpoint", saved is not None)
+                if saved is not None:
+                    text, degraded = saved, False
+                else:
+                    async with semaphore:
+                        text, degraded = await self._submit(self._merge, group, period, final)
+                    if not degraded:
+                        await self._save(key, text)
+                counts["done"] += 1
+                await self._progress(run, digest_id, stage, counts["done"], len(groups))
+                return text, degraded
+
+            with tracer.start_as_current_span("digest.reduce") as span:
+                span.set_attribute("digest.level", level)
+                span.set_attribute("digest.groups", len(groups))
+                merged = await asyncio.gather(*(merge_one(group) for group in groups))
+            if any(degraded for _, degraded in merged):
+                source = "extractive"
+            if final:
+                return merged[0][0], source
+            parts = [text for text, _ in merged]
+
+    def _merge(self, parts: List[str], period: str, final: bool) -> Tuple[str, bool]:
+        """
+        One reduce step (blocking; runs on the worker pool).
+
+        Returns:
+            (text, degraded): over budget or on LLM failure the parts are
+            concatenated (most important first) and truncated instead
+        """
+        try:
+            return ai_service.merge_digest(parts, period, final), False
+        except Exception as e:
+            if not isinstance(e, LLMBudgetExceeded):
+                ai_logger.warning("Digest merge failed, concatenating %d parts: %s", len(parts), e)
+            return _truncate("\n".join(parts), _FINAL_MAX_CHARS if final else _PARTIAL_MAX_CHARS), True
+
+    def stats(self) -> dict:
+        return {"running": len(self._running)}
+
+
+# Singleton instance
+digest_service = DigestService(
+    state_backend,
+    max_messages=settings.digest_max_messages,
+    map_concurrency=settings.digest_map_concurrency,
+    reduce_input_tokens=settings.digest_reduce_input_tokens,
+    checkpoint_ttl=settings.digest_checkpoint_ttl_seconds
+)
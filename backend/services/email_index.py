@@ -0,0 +1,182 @@
+from email.utils import parseaddr
+from difflib import get_close_matches
+from typing import Dict, Iterable, List, Optional, Set
+import re
+import threading
+
+_TERM_RE = re.compile(r"[a-z0-9]+")
+
+
+def _terms(text: str) -> List[str]:
+    """Lowercase alphanumeric terms of a header value."""
+    return _TERM_RE.findall(text.lower()) if text else []
+
+
+class _IndexedEmail:
+    __slots__ = ("id", "thread_id", "sender_name", "sender_address", "subject")
+
+    def __init__(self, id: str, thread_id: Optional[str], sender_name: str, sender_address: str, subject: str):
+        self.id = id
+        self.thread_id = thread_id
+        self.sender_name = sender_name
+        self.sender_address = sender_address
+        self.subject = subject
+
+
+class UserEmailIndex:
+    """
+    Inverted index over one user's cached email metadata.
+
+    Postings map sender and subject terms to message IDs; ``order`` keeps the
+    IDs in the recency order the user last saw, so "email number 2" resolves
+    by position.
+    """
+
+    def __init__(self):
+        self.entries: Dict[str, _IndexedEmail] = {}
+        self.order: List[str] = []
+        self.sender_terms: Dict[str, Set[str]] = {}
+        self.subject_terms: Dict[str, Set[str]] = {}
+
+    def replace(self, emails: Iterable[dict]) -> None:
+        """Rebuild the index from a freshly listed page of emails (newest first)."""
+        self.entries.clear()
+        self.order = []
+        self.sender_terms.clear()
+        self.subject_terms.clear()
+        for email in emails:
+            self.add(email)
+
+    def add(self, email: dict) -> None:
+        """Index a single email summary dict, appending it to the recency order."""
+        email_id = email.get("id")
+        if not email_id or email_id in self.entries:
+            return
+
+        raw_sender = email.get("sender_email") or email.get("sender") or ""
+        name, address = parseaddr(raw_sender)
+        name = name or email.get("sender") or ""
+        entry = _IndexedEmail(
+            id=email_id,
+            thread_id=email.get("thread_id"),
+            sender_name=name,
+            sender_address=address.lower(),
+            subject=email.get("subject") or "",
+        )
+        self.entries[email_id] = entry
+        self.order.append(email_id)
+
+        for term in set(_terms(name) + _terms(address)):
+            self.sender_terms.setdefault(term, set()).add(email_id)
+        for term in set(_terms(entry.subject)):
+            self.subject_terms.setdefault(term, set()).add(email_id)
+
+    def remove(self, email_id: str) -> None:
+        """Drop an email (e.g. after it was trashed) from all postings."""
+        if self.entries.pop(email_id, None) is None:
+            return
+        self.order.remove(email_id)
+        for postings in (self.sender_terms, self.subject_terms):
+            for term in [t for t, ids in postings.items() if email_id in ids]:
+                postings[term].discard(email_id)
+                if not postings[term]:
+                    del postings[term]
+
+    def _match_terms(self, query: str, postings: Dict[str, Set[str]], fuzzy: bool) -> Optional[Set[str]]:
+        """
+        Intersect postings for every query term.
+
+        Sender terms also match by prefix ("jo" -> "john") and by close spelling
+        ("jon" -> "john"), since users rarely type names exactly.
+        """
+        result: Optional[Set[str]] = None
+        for term in _terms(query):
+            matched = set(postings.get(term, ()))
+            if fuzzy and not matched:
+                for candidate in postings:
+                    if candidate.startswith(term):
+                        matched |= postings[candidate]
+                if not matched:
+                    for candidate in get_close_matches(term, postings.keys(), n=3, cutoff=0.75):
+                        matched |= postings[candidate]
+            result = matched if result is None else result & matched
+            if not result:
+                return set()
+        return result
+
+    def resolve(
+        self,
+        sender: Optional[str] = None,
+        subject_keyword: Optional[str] = None,
+        reference_number: Optional[int] = None
+    ) -> List[str]:
+        """
+        Resolve chat selectors to message IDs, most recent first.
+
+        Args:
+            sender: Sender name or address fragment
+            subject_keyword: Word(s) from the subject line
+            reference_number: 1-based position in the last listed emails
+
+        Returns:
+            Matching message IDs (empty if nothing matches)
+        """
+        if reference_number is not None:
+            if not 1 <= reference_number <= len(self.order):
+                return []
+            candidates = [self.order[reference_number - 1]]
+        else:
+            candidates = self.order
+
+        if sender:
+            matched = self._match_terms(sender, self.sender_terms, fuzzy=True)
+            candidates = [c for c in candidates if c in matched]
+        if subject_keyword:
+            matched = self._match_terms(subject_keyword, self.subject_terms, fuzzy=False)
+            candidates = [c for c in candidates if c in matched]
+        return list(candidates)
+
+
+class EmailIndex:
+    """Per-user registry of :class:`UserEmailIndex` instances."""
+
+    def __init__(self):
+        self._indexes: Dict[str, UserEmailIndex] = {}
+        self._lock = threading.Lock()
+
+    def update(self, user_email: str, emails: Iterable[dict]) -> None:
+        """Replace a user's index with the emails they were just shown."""
+        index = UserEmailIndex()
+        index.replace(emails)
+        with self._lock:
+            self._indexes[user_email] = index
+
+    def resolve(
+        self,
+        user_email: str,
+        sender: Optional[str] = None,
+        subject_keyword: Optional[str] = None,
+        reference_number: Optional[int] = None
+    ) -> List[str]:
+        """Resolve selectors against a user's index; empty on a miss."""
+        index = self._indexes.get(user_email)
+        if index is None:
+            return []
+        with self._lock:
+            return index.resolve(sender, subject_keyword, reference_number)
+
+    def remove(self, user_email: str, email_id: str) -> None:
+        """Remove a single message from a user's index."""
+        index = self._indexes.get(user_email)
+        if index is not None:
+            with self._lock:
+                index.remove(email_id)
+
+    def drop(self, user_email: str) -> None:
+        """Forget everything indexed for a user."""
+        with self._lock:
+            self._indexes.pop(user_email, None)
+
+
+# Singleton instance
+email_index = EmailIndex()
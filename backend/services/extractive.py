@@ -0,0 +1,81 @@
+"""
+Local extractive summarizer.
+
+Picks the most informative sentences of a cleaned message body with no
+network call: each sentence is scored by the document frequency of its
+content words, with a bonus for early sentences and sentences carrying
+requests or dates. Used for short emails, where an LLM round trip adds
+nothing, and as the degraded-mode summary when the LLM fails, times out or
+the user is over budget.
+"""
+from collections import Counter
+from services.normalizer import strip_signature
+from typing import List
+import re
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"'(])|\n{2,}")
+_WORD_RE = re.compile(r"[a-z0-9][a-z0-9'$%.,-]*[a-z0-9%]|[a-z0-9]")
+_CUE_RE = re.compile(
+    r"\b(please|could you|can you|would you|let me know|confirm|deadline|due|by (monday|tuesday|wednesday|thursday|friday|eod)"
+    r"|tomorrow|today|\d{1,2}(:\d{2})?\s?(am|pm)|\$\d)",
+    re.IGNORECASE
+)
+
+STOPWORDS = frozenset("""
+a about above after again against all am an and any are as at be because been before being below between both but by
+can could did do does doing down during each few for from further had has have having he her here hers him his how i if
+in into is it its itself just me more most my no nor not now of off on once only or other our ours out over own same she
+should so some such than that the their theirs them then there these they this those through to too under until up very
+was we were what when where which while who whom why will with would you your yours hi hello dear thanks thank regards
+""".split())
+
+
+def split_sentences(text: str) -> List[str]:
+    """Split text into sentences, collapsing whitespace inside each."""
+    return [" ".join(part.split()) for part in _SENTENCE_RE.split(text) if part and part.strip()]
+
+
+def summarize(text: str, max_sentences: int = 2, max_chars: int = 300) -> str:
+    """
+    Extractive summary of an already-normalized body.
+
+    Args:
+        text: Message text
+        max_sentences: Most sentences to keep
+        max_chars: Length cap of the result
+
+    Returns:
+        The chosen sentences in their original order ("" for an empty body)
+    """
+    text = strip_signature(text)
+    sentences = split_sentences(text)
+    if not sentences:
+        return ""
+    if len(sentences) <= max_sentences:
+        return _truncate(" ".join(sentences), max_chars)
+
+    tokens = [[w for w in _WORD_RE.findall(s.lower()) if w not in STOPWORDS] for s in sentences]
+    frequencies = Counter(w for words in tokens for w in set(words))
+    top = max(frequencies.values(), default=1)
+
+    scores = []
+    for index, (sentence, words) in enumerate(zip(sentences, tokens)):
+        if len(words) < 3:
+            # Greetings, sign-offs and fragments
+            scores.append(-1.0)
+            continue
+        score = sum(frequencies[w] / top for w in words) / len(words) ** 0.5
+        score += 0.5 / (index + 1)  # the point of an email is usually up front
+        if _CUE_RE.search(sentence):
+            score += 0.5
+        scores.append(score)
+
+    chosen = sorted(sorted(range(len(sentences)), key=lambda i: -scores[i])[:max_sentences])
+    return _truncate(" ".join(sentences[i] for i in chosen), max_chars)
+
+
+def _truncate(text: str, max_chars: int) -> str:
+    if len(text) <= max_chars:
+        return text
+    cut = text.rfind(" ", 0, max_chars)
+    return text[:cut if cut > 0 else max_chars].rstrip(",;: ") + "…"
@@ -0,0 +1,272 @@
+"""
+Per-user Gmail quota governor.
+
+Gmail meters every user in quota units, with a per-method cost (a
+``messages.get`` costs 5 units, ``threads.get`` 10, ``messages.send`` 100),
+and answers 429 ``userRateLimitExceeded`` once a user goes over the limit.
+Every Gmail call goes through :meth:`GmailQuota.call`, which gives each user:
+
+- pacing: a token bucket of units refilled at ``units_per_second``. A call
+  waits (in FIFO order) until its cost is available, so a burst queues
+  instead of turning into 429s.
+- adaptive concurrency (AIMD): the limit on a user's in-flight calls grows
+  by one per round of calls while latency stays within ``latency_tolerance``
+  times the user's baseline, shrinks by 10% when it does not, and halves on
+  a 429.
+- backoff: after a 429 nothing is sent for that user until ``Retry-After``
+  (or an exponential pause) has passed.
+
+Accounting is per process; with several workers each enforces its own share.
+"""
+from app.config import get_settings
+from collections import deque
+from contextlib import contextmanager
+from googleapiclient.errors import HttpError
+from typing import Deque, Dict, Iterator, List, Optional
+import random
+import threading
+import time
+
+settings = get_settings()
+
+# Quota units per call (https://developers.google.com/gmail/api/reference/quota)
+METHOD_COSTS = {
+    "profile.get": 1,
+    "messages.list": 5,
+    "messages.search": 5,
+    "messages.get": 5,
+    "messages.get_metadata": 5,
+    "messages.trash": 5,
+    "threads.get": 10,
+    "messages.send": 100,
+}
+DEFAULT_COST = 5
+
+_RATE_LIMIT_REASONS = (b"rateLimitExceeded", b"userRateLimitExceeded")
+# Latency samples are smoothed with this weight; the baseline drifts up this much per slower sample
+_LATENCY_ALPHA = 0.2
+_BASELINE_DRIFT = 1.01
+
+
+class GmailRateLimited(Exception):
+    """Raised when Gmail kept rate-limiting a user's call after every retry."""
+
+    def __init__(self, user: str, retry_after: int):
+        super().__init__(f"Gmail rate limit exceeded for {user}")
+        self.user = user
+        self.retry_after = retry_after
+
+
+def is_rate_limited(error: Exception) -> bool:
+    """True for Gmail's quota errors: 429, or 403 with a rate-limit reason."""
+    if not isinstance(error, HttpError):
+        return False
+    status = int(error.resp.status)
+    return status == 429 or (status == 403 and any(reason in (error.content or b"") for reason in _RATE_LIMIT_REASONS))
+
+
+def retry_after(error: HttpError) -> Optional[float]:
+    """Seconds from the error's ``Retry-After`` header, if it has one in seconds."""
+    value = error.resp.get("retry-after")
+    return float(value) if value and value.isdigit() else None
+
+
+class _UserQuota:
+    __slots__ = ("tokens", "updated", "limit", "in_flight", "queue", "paused_until", "strikes",
+                 "latency", "baseline", "last_decrease", "calls", "units", "throttled", "waited", "condition")
+
+    def __init__(self, burst: float, initial_limit: int, lock: threading.Lock):
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.limit = float(initial_limit)
+        self.in_flight = 0
+        self.queue: Deque[object] = deque()  # waiting calls, oldest first
+        self.paused_until = 0.0
+        self.strikes = 0                     # consecutive 429s
+        self.latency: Optional[float] = None   # smoothed
+        self.baseline: Optional[float] = None  # best recent latency
+        self.last_decrease = 0.0
+        self.calls = 0
+        self.units = 0
+        self.throttled = 0
+        self.waited = 0.0
+        self.condition = threading.Condition(lock)
+
+
+class GmailQuota:
+    """Paces each user's Gmail calls by quota units and adapts their concurrency."""
+
+    def __init__(
+        self,
+        units_per_second: float,
+        burst_units: float,
+        initial_concurrency: int,
+        min_concurrency: int,
+        max_concurrency: int,
+        latency_tolerance: float,
+        max_pause: float
+    ):
+        self.rate = units_per_second
+        self.burst = burst_units
+        self.initial_concurrency = initial_concurrency
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.latency_tolerance = latency_tolerance
+        self.max_pause = max_pause
+        self._users: Dict[str, _UserQuota] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def _user(self, user: str) -> _UserQuota:
+        quota = self._users.get(user)
+        if quota is None:
+            quota = self._users[user] = _UserQuota(self.burst, self.initial_concurrency, self._lock)
+        return quota
+
+    def _refill(self, quota: _UserQuota, now: float) -> None:
+        quota.tokens = min(self.burst, quota.tokens + (now - quota.updated) * self.rate)
+        quota.updated = now
+
+    def _acquire(self, quota: _UserQuota, cost: int) -> None:
+        """Wait (lock held) until this call is first in line and fits the pause, concurrency and unit budget."""
+        ticket = object()
+        quota.queue.append(ticket)
+        started = time.monotonic()
+        # A call dearer than the whole bucket waits for a full bucket and leaves it in debt
+        needed = min(cost, self.burst)
+        try:
+            while True:
+                now = time.monotonic()
+                self._refill(quota, now)
+                timeout: Optional[float] = None  # until another call finishes or leaves the queue
+                if quota.queue[0] is ticket:
+                    if quota.paused_until > now:
+                        timeout = quota.paused_until - now
+                    elif quota.in_flight < int(quota.limit):
+                        if quota.tokens >= needed:
+                            break
+                        timeout = (needed - quota.tokens) / self.rate
+                quota.condition.wait(timeout)
+        finally:
+            quota.queue.remove(ticket)
+            quota.condition.notify_all()
+        quota.tokens -= cost
+        quota.in_flight += 1
+        quota.calls += 1
+        quota.units += cost
+        quota.waited += time.monotonic() - started
+
+    def _on_success(self, quota: _UserQuota, latency: float, now: float) -> None:
+        quota.strikes = 0
+        quota.latency = latency if quota.latency is None else \
+            quota.latency + _LATENCY_ALPHA * (latency - quota.latency)
+        quota.baseline = latency if quota.baseline is None else min(latency, quota.baseline * _BASELINE_DRIFT)
+        if quota.latency > self.latency_tolerance * quota.baseline:
+            # Latency is climbing: back off, at most once per (smoothed) round trip
+            if now - quota.last_decrease > quota.latency:
+                quota.limit = max(self.min_concurrency, quota.limit * 0.9)
+                quota.last_decrease = now
+        else:
+            # Additive increase: about +1 per limit's worth of calls
+            quota.limit = min(self.max_concurrency, quota.limit + 1.0 / quota.limit)
+
+    def _on_rate_limited(self, quota: _UserQuota, pause: Optional[float], now: float) -> None:
+        quota.throttled += 1
+        quota.strikes += 1
+        quota.limit = max(self.min_concurrency, quota.limit / 2)
+        quota.tokens = min(quota.tokens, 0.0)
+        if pause is None:
+            pause = random.uniform(0.5, 1.0) * 2 ** (quota.strikes - 1)
+        quota.paused_until = max(quota.paused_until, now + min(pause, self.max_pause))
+
+    @contextmanager
+    def call(self, user: Optional[str], operation: str) -> Iterator[None]:
+        """
+        Run one Gmail call for ``user`` under their quota, waiting for room first.
+
+        Rate-limit errors raised inside are recorded (halving the user's
+        concurrency and pausing their calls) and re-raised.
+
+        Args:
+            user: User email (None for system work, which is never limited)
+            operation: Gmail method name, e.g. ``messages.get`` (sets the unit cost)
+        """
+        if user is None or not self.enabled:
+            yield
+            return
+        cost = METHOD_COSTS.get(operation, DEFAULT_COST)
+        with self._lock:
+            quota = self._user(user)
+            self._acquire(quota, cost)
+        started = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            with self._lock:
+                quota.in_flight -= 1
+                if is_rate_limited(e):
+                    self._on_rate_limited(quota, retry_after(e), time.monotonic())
+                quota.condition.notify_all()
+            raise
+        else:
+            now = time.monotonic()
+            with self._lock:
+                quota.in_flight -= 1
+                self._on_success(quota, now - started, now)
+                quota.condition.notify_all()
+
+    def retry_after(self, user: Optional[str]) -> int:
+        """Whole seconds until the user's calls are no longer paused (at least 1)."""
+        with self._lock:
+            quota = self._users.get(user) if user is not None else None
+            paused = quota.paused_until - time.monotonic() if quota is not None else 0.0
+        return max(1, int(paused + 0.999))
+
+    def usage(self, limit: int = 10) -> List[dict]:
+        """Users ordered by quota units spent, with their current limits."""
+        now = time.monotonic()
+        rows = []
+        with self._lock:
+            for user, quota in self._users.items():
+                rows.append({
+                    "user": user,
+                    "concurrency_limit": round(quota.limit, 2),
+                    "in_flight": quota.in_flight,
+                    "queued": len(quota.queue),
+                    "paused_seconds": round(max(quota.paused_until - now, 0.0), 2),
+                    "latency_ms": round((quota.latency or 0.0) * 1000, 1),
+                    "baseline_ms": round((quota.baseline or 0.0) * 1000, 1),
+                    "calls": quota.calls,
+                    "units": quota.units,
+                    "rate_limited": quota.throttled,
+                    "waited_seconds": round(quota.waited, 3),
+                })
+        rows.sort(key=lambda r: r["units"], reverse=True)
+        return rows[:limit]
+
+    def stats(self) -> dict:
+        with self._lock:
+            quotas = list(self._users.values())
+            return {
+                "users": len(quotas),
+                "in_flight": sum(q.in_flight for q in quotas),
+                "queued": sum(len(q.queue) for q in quotas),
+                "units": sum(q.units for q in quotas),
+                "rate_limited": sum(q.throttled for q in quotas),
+                "waited_seconds": round(sum(q.waited for q in quotas), 3),
+            }
+
+
+# Singleton instance
+gmail_quota = GmailQuota(
+    units_per_second=settings.gmail_quota_units_per_second,
+    burst_units=settings.gmail_quota_burst_units,
+    initial_concurrency=settings.gmail_initial_concurrency,
+    min_concurrency=settings.gmail_min_concurrency,
+    max_concurrency=settings.gmail_max_concurrency,
+    latency_tolerance=settings.gmail_latency_tolerance,
+    max_pause=settings.gmail_max_pause_seconds
+)
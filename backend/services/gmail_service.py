@@ -1,196 +1,433 @@
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 from app.config import get_settings
 from models.email import EmailMessage, EmailSummary
-from services.ai_service import ai_service
-from typing import List, Optional
+from services import google_api
+from services.gmail_quota import GmailRateLimited, gmail_quota, is_rate_limited
+from services.llm_budget import LLMBudgetExceeded
+from services.reply_headers import ReplyHeaders, reply_header_cache
+from services.thread_summarizer import ThreadMessage, thread_summarizer
+from services.triage import rank, triage
+from services.vector_index import vector_index
+from typing import Dict, List, Optional, Tuple
 import base64
 from email.mime.text import MIMEText
 from datetime import datetime
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
-from bs4 import BeautifulSoup
-from utils.logger import log_gmail_call, log_gmail_success, log_gmail_error
+from utils.metrics import record_retry, track
+from utils.request_context import current_user_email
+from utils.resources import resources
+from utils.tracing import tracer
+from utils.logger import gmail_logger
 
 settings = get_settings()
 
+
+class _InboxThread:
+    """One thread of an inbox page between triage and summarization."""
+
+    __slots__ = ("thread_id", "email_id", "score", "cached", "messages", "shown")
+
+    def __init__(self, thread_id: str, email_id: str, score: float, cached=None, messages=None, shown=None):
+        self.thread_id = thread_id
+        self.email_id = email_id
+        self.score = score
+        self.cached = cached      # ThreadSummary when the summary is current
+        self.messages = messages  # parsed thread, oldest first, otherwise
+        self.shown = shown        # the message the inbox entry represents
+
+
 class GmailService:
     def get_service(self, token_data):
         """Build Gmail API service from token data."""
-        creds = Credentials(
-            token=token_data.access_token,
-            refresh_token=token_data.refresh_token,
-            token_uri="https://oauth2.googleapis.com/token",
-            client_id=settings.google_client_id,
-            client_secret=settings.google_client_secret
+        creds = google_api.user_credentials(
+            token_data.access_token,
+            token_data.refresh_token,
+            settings.google_client_id,
+            settings.google_client_secret
         )
-        return build('gmail', 'v1', credentials=creds)
+        return google_api.build_service('gmail', 'v1', creds, settings.gmail_api_endpoint)
+
+    def warm_up(self) -> None:
+        """Load the Google client libraries, discovery document and HTML parser."""
+        google_api.warm_up()
+        import bs4  # noqa: F401
+
+    def _execute(self, operation: str, request):
+        """
+        Execute a Gmail API request under the user's quota governor and instrumentation.
+
+        The call waits for quota units and a concurrency slot first. Rate-limit
+        errors (429, or 403 ``userRateLimitExceeded``) are retried up to
+        ``gmail_rate_limit_retries`` times, each after the governor's pause.
+        """
+        user = current_user_email.get()
+        for attempt in range(1, settings.gmail_rate_limit_retries + 2):
+            try:
+                with gmail_quota.call(user, operation), track("gmail", operation):
+                    return request.execute()
+            except HttpError as e:
+                if not is_rate_limited(e) or attempt > settings.gmail_rate_limit_retries:
+                    raise
+                record_retry("gmail", operation, attempt)
+
+    def mailbox_history_id(self, token_data) -> Optional[str]:
+        """
+        Current ``historyId`` of the mailbox, from one ``users.getProfile`` call.
+
+        It changes whenever anything in the mailbox changes, so it can validate
+        a previously served inbox page without fetching any messages.
+
+        Returns:
+            The history ID, or None if the profile could not be read
+        """
+        try:
+            service = self.get_service(token_data)
+            profile = self._execute("profile.get", service.users().getProfile(userId='me'))
+            return profile.get('historyId')
+        except HttpError:
+            # Already logged and counted by track()
+            return None
 
     def fetch_recent_emails(self, token_data, limit: int = 5) -> List[EmailSummary]:
         """
         Fetch recent emails and generate AI summaries in parallel.
+
+        Raises:
+            GmailRateLimited: If Gmail still rate-limits the listing after retries
+        """
+        with tracer.start_as_current_span("gmail.fetch_recent_emails") as span:
+            span.set_attribute("gmail.limit", limit)
+            return self._fetch_recent_emails(token_data, limit)
+
+    def _parse_message(self, msg_detail: dict) -> ThreadMessage:
+        """Extract headers and the plain-text body (HTML converted to text) of a full message."""
+        with tracer.start_as_current_span("gmail.parse_mime") as parse_span:
+            headers = msg_detail['payload']['headers']
+            subject = next((h['value'] for h in headers if h['name'] == 'Subject'), '(No Subject)')
+            sender = next((h['value'] for h in headers if h['name'] == 'From'), '(Unknown)')
+            body = ""
+            html_body = ""
+        
+            # Extract both plain text and HTML
+            if 'parts' in msg_detail['payload']:
+                for part in msg_detail['payload']['parts']:
+                    if part['mimeType'] == 'text/plain':
+                        data = part['body'].get('data')
+                        if data:
+                            body = base64.urlsafe_b64decode(data).decode('utf-8', errors='ignore')
+                            break
+                    elif part['mimeType'] == 'text/html' and not body:
+                        data = part['body'].get('data')
+                        if data:
+                            html_body = base64.urlsafe_b64decode(data).decode('utf-8', errors='ignore')
+            elif 'body' in msg_detail['payload']:
+                data = msg_detail['payload']['body'].get('data')
+                if data:
+                    decoded = base64.urlsafe_b64decode(data).decode('utf-8', errors='ignore')
+                    if msg_detail['payload'].get('mimeType') == 'text/html':
+                        html_body = decoded
+                    else:
+                        body = decoded
+        
+            # If no plain text, extract text from HTML
+            if not body and html_body:
+                from bs4 import BeautifulSoup
+                soup = BeautifulSoup(html_body, 'html.parser')
+                # Remove script and style elements
+                for script in soup(["script", "style"]):
+                    script.decompose()
+                body = soup.get_text(separator=' ', strip=True)
+            parse_span.set_attribute("gmail.html_only", bool(html_body))
+
+        header_map = {h['name'].lower(): h['value'] for h in headers}
+        if msg_detail.get('threadId'):
+            # Replying to this message later needs no metadata fetch
+            reply_header_cache.put(
+                current_user_email.get() or "", msg_detail['id'],
+                ReplyHeaders.from_headers(msg_detail['threadId'], header_map)
+            )
+        return ThreadMessage(
+            msg_detail['id'], sender, subject, body,
+            snippet=msg_detail.get('snippet') or "",
+            labels=msg_detail.get('labelIds', []),
+            headers=header_map
+        )
+
+    def _get_thread(self, token_data, thread_id: str) -> List[ThreadMessage]:
+        """Fetch and parse every message of a thread, oldest first (raises HttpError)."""
+        # A new service instance per call: the client's HTTP transport isn't thread-safe
+        service = self.get_service(token_data)
+        thread = self._execute("threads.get", service.users().threads().get(userId='me', id=thread_id, format='full'))
+        return [self._parse_message(m) for m in thread.get('messages', [])]
+
+    def get_thread(self, token_data, thread_id: str) -> List[ThreadMessage]:
+        """
+        Fetch and parse a whole thread.
+
+        Returns:
+            The thread's messages, oldest first (empty if it could not be fetched)
+        """
+        try:
+            return self._get_thread(token_data, thread_id)
+        except HttpError:
+            # Already logged and counted by track()
+            return []
+
+    def list_threads(self, token_data, query: Optional[str] = None, limit: int = 500) -> List[Tuple[str, str]]:
+        """
+        List the inbox threads with messages matching a Gmail ``q=`` search.
+
+        Pages through ``messages.list`` until ``limit`` messages were seen.
+
+        Returns:
+            (thread ID, ID of its newest matching message) pairs, newest
+            first; a listing that fails part way returns the pages already read
         """
+        threads: Dict[str, str] = {}
+        seen = 0
+        page_token = None
+        try:
+            service = self.get_service(token_data)
+            while seen < limit:
+                params = {'userId': 'me', 'maxResults': min(limit - seen, 500), 'labelIds': ['INBOX']}
+                if query:
+                    params['q'] = query
+                if page_token:
+                    params['pageToken'] = page_token
+                results = self._execute("messages.list", service.users().messages().list(**params))
+                messages = results.get('messages', [])
+                seen += len(messages)
+                for msg in messages:
+                    threads.setdefault(msg.get('threadId') or msg['id'], msg['id'])
+                page_token = results.get('nextPageToken')
+                if not messages or not page_token:
+                    break
+        except HttpError:
+            # Already logged and counted by track()
+            pass
+        return list(threads.items())
+
+    def _fetch_recent_emails(self, token_data, limit: int) -> List[EmailSummary]:
         try:
-            log_gmail_call("fetch_recent_emails", "me")
             service = self.get_service(token_data)
             
             # List messages
-            results = service.users().messages().list(userId='me', maxResults=limit, labelIds=['INBOX']).execute()
+            results = self._execute("messages.list", service.users().messages().list(userId='me', maxResults=limit, labelIds=['INBOX']))
             messages = results.get('messages', [])
             
-            def process_single_email(msg):
-                """Process a single email and return EmailSummary"""
+            # One entry per thread, shown as its newest listed message (the
+            # listing is newest first)
+            threads = {}
+            for msg in messages:
+                threads.setdefault(msg.get('threadId') or msg['id'], msg['id'])
+            
+            user = current_user_email.get() or ""
+
+            def load_thread(item):
+                """Fetch and triage one thread (nothing to fetch if its summary is current)"""
+                thread_id, email_id = item
+                with tracer.start_as_current_span("gmail.process_thread") as span:
+                    span.set_attribute("gmail.thread_id", thread_id)
+                    span.set_attribute("gmail.message_id", email_id)
+                    return _load_thread(thread_id, email_id, span)
+
+            def _load_thread(thread_id, email_id, span):
                 try:
-                    # Create a new service instance for this thread to avoid SSL issues
-                    thread_service = self.get_service(token_data)
-                    msg_detail = thread_service.users().messages().get(userId='me', id=msg['id'], format='full').execute()
+                    cached = thread_summarizer.cached(user, thread_id, email_id)
+                    if cached is not None:
+                        return _InboxThread(thread_id, email_id, cached.score, cached=cached)
                     
-                    headers = msg_detail['payload']['headers']
-                    subject = next((h['value'] for h in headers if h['name'] == 'Subject'), '(No Subject)')
-                    sender = next((h['value'] for h in headers if h['name'] == 'From'), '(Unknown)')
-                    date_str = next((h['value'] for h in headers if h['name'] == 'Date'), '')
-                    body = ""
-                    html_body = ""
-                    
-                    # Extract both plain text and HTML
-                    if 'parts' in msg_detail['payload']:
-                        for part in msg_detail['payload']['parts']:
-                            if part['mimeType'] == 'text/plain':
-                                data = part['body'].get('data')
-                                if data:
-                                    body = base64.urlsafe_b64decode(data).decode('utf-8', errors='ignore')
-                                    break
-                            elif part['mimeType'] == 'text/html' and not body:
-                                data = part['body'].get('data')
-                                if data:
-                                    html_body = base64.urlsafe_b64decode(data).decode('utf-8', errors='ignore')
-                    elif 'body' in msg_detail['payload']:
-                        data = msg_detail['payload']['body'].get('data')
-                        if data:
-                            decoded = base64.urlsafe_b64decode(data).decode('utf-8', errors='ignore')
-                            if msg_detail['payload'].get('mimeType') == 'text/html':
-                                html_body = decoded
-                            else:
-                                body = decoded
-                    
-                    # If no plain text, extract text from HTML
-                    if not body and html_body:
-                        soup = BeautifulSoup(html_body, 'html.parser')
-                        # Remove script and style elements
-                        for script in soup(["script", "style"]):
-                            script.decompose()
-                        body = soup.get_text(separator=' ', strip=True)
-                
-                    # AI summarization (this is the slow part)
-                    summary = ai_service.summarize_email(body, subject)
+                    parsed = self._get_thread(token_data, thread_id)
+                    span.set_attribute("gmail.thread_messages", len(parsed))
+                    shown = next((m for m in parsed if m.id == email_id), parsed[-1])
+                    score = triage.score(user, shown.sender, shown.subject, shown.body, shown.labels, shown.headers, len(parsed))
+                    return _InboxThread(thread_id, shown.id, score, messages=parsed, shown=shown)
+                except Exception as e:
+                    gmail_logger.error("Error processing thread %s: %s", thread_id, e)
+                    return None
+
+            def summarize_thread(item):
+                """Summarize one ranked thread and return EmailSummary"""
+                inbox_thread, priority_rank = item
+                with tracer.start_as_current_span("gmail.summarize_thread") as span:
+                    span.set_attribute("gmail.thread_id", inbox_thread.thread_id)
+                    span.set_attribute("triage.rank", priority_rank)
+                    return _summarize_thread(inbox_thread, priority_rank)
+
+            def _summarize_thread(inbox_thread, priority_rank):
+                try:
+                    if inbox_thread.cached is not None:
+                        sender, subject = inbox_thread.cached.sender, inbox_thread.cached.subject
+                        summary, source = inbox_thread.cached.summary, inbox_thread.cached.source
+                        if not vector_index.has_thread(user, inbox_thread.thread_id):
+                            # Summary cached before this process started: index what we have
+                            vector_index.upsert(user, inbox_thread.email_id, inbox_thread.thread_id, sender, subject, summary)
+                    else:
+                        shown = inbox_thread.shown
+                        sender, subject = shown.sender, shown.subject
+                        if priority_rank <= top_k:
+                            # AI summarization (this is the slow part); only messages
+                            # not covered by the thread's previous summary are sent
+                            try:
+                                entry = thread_summarizer.summarize(
+                                    user, inbox_thread.thread_id, inbox_thread.messages, inbox_thread.score
+                                )
+                                summary, source = entry.summary, entry.source
+                            except Exception as e:
+                                # Over budget, LLM down or timed out: degrade to a
+                                # local summary (not cached, so the LLM is retried next time)
+                                if not isinstance(e, LLMBudgetExceeded):
+                                    gmail_logger.warning("LLM summary of thread %s failed, using extractive: %s", inbox_thread.thread_id, e)
+                                summary, source = thread_summarizer.fallback(inbox_thread.messages), "fallback"
+                        else:
+                            summary, source = thread_summarizer.fallback(inbox_thread.messages), "preview"
+                        vector_index.upsert_thread(user, inbox_thread.thread_id, inbox_thread.messages, shown, summary)
                     
                     parsed_date = datetime.now()  # Fallback
                     
                     return EmailSummary(
-                        id=msg['id'],
+                        id=inbox_thread.email_id,
                         sender=sender,
                         sender_email=sender,
                         subject=subject,
                         summary=summary,
-                        date=parsed_date
+                        date=parsed_date,
+                        priority_score=inbox_thread.score,
+                        priority_rank=priority_rank,
+                        summary_source=source
                     )
                 except Exception as e:
-                    print(f"Error processing email {msg.get('id')}: {e}")
+                    gmail_logger.error("Error summarizing thread %s: %s", inbox_thread.thread_id, e)
                     return None
             
-            # Process emails in parallel using ThreadPoolExecutor
-            with ThreadPoolExecutor(max_workers=5) as executor:
-                email_summaries = list(executor.map(process_single_email, messages))
+            # Fetch threads in parallel on the app's shared worker pool (each
+            # job runs in a copy of the caller's context so request-scoped values
+            # such as the current user and the active trace span reach it)
+            loaded = [t for t in resources.map(load_thread, list(threads.items())) if t is not None]
             
-            # Filter out None values (failed emails)
+            # Rank locally; only the top-K threads are worth an LLM summary
+            ranks = rank([t.score for t in loaded])
+            top_k = settings.triage_llm_top_k or len(loaded)
+            email_summaries = resources.map(summarize_thread, list(zip(loaded, ranks)))
+            
+            # Filter out None values (failed threads)
             email_summaries = [e for e in email_summaries if e is not None]
             
-            log_gmail_success("fetch_recent_emails", "me")
             return email_summaries
 
         except HttpError as error:
-            log_gmail_error("fetch_recent_emails", "me", str(error))
-            print(f"An error occurred: {error}")
+            # Already logged and counted by track()
+            if is_rate_limited(error):
+                # Still limited after the governor's retries: say so instead of
+                # showing an empty inbox
+                user = current_user_email.get() or ""
+                raise GmailRateLimited(user, gmail_quota.retry_after(user)) from error
             return []
 
-    def send_reply(self, token_data: dict, email_id: str, reply_content: str) -> bool:
-        """Send a reply to a specific email."""
-        try:
-            log_gmail_call("send_reply", "me")
-            service = self.get_service(token_data)
-            
-            # Get original email to find threadId and headers
-            original_msg = service.users().messages().get(userId='me', id=email_id, format='metadata').execute()
-            thread_id = original_msg['threadId']
-            headers = original_msg['payload']['headers']
-            
-            # Extract recipients and subject
-            to = next((h['value'] for h in headers if h['name'] == 'Reply-To'), None)
-            if not to:
-                to = next((h['value'] for h in headers if h['name'] == 'From'), '')
-            
-            subject = next((h['value'] for h in headers if h['name'] == 'Subject'), '')
-            if not subject.lower().startswith('re:'):
-                subject = f"Re: {subject}"
-                
-            # Create message
-            message = MIMEText(reply_content)
-            message['to'] = to
-            message['subject'] = subject
-            
-            # Encode message
-            raw_message = base64.urlsafe_b64encode(message.as_bytes()).decode()
-            body = {
-                'raw': raw_message,
-                'threadId': thread_id
-            }
-            
-            service.users().messages().send(userId='me', body=body).execute()
-            log_gmail_success("send_reply", "me")
-            return True
-            
-        except HttpError as error:
-            log_gmail_error("send_reply", "me", str(error))
-            print(f"An error occurred: {error}")
-            return False
+    def _reply_headers(self, service, email_id: str) -> ReplyHeaders:
+        """Reply headers of a message: from the cache, else one metadata fetch (raises HttpError)."""
+        user = current_user_email.get() or ""
+        cached = reply_header_cache.get(user, email_id)
+        if cached is not None:
+            return cached
+        original_msg = self._execute("messages.get_metadata", service.users().messages().get(
+            userId='me', id=email_id, format='metadata',
+            metadataHeaders=['From', 'Reply-To', 'Subject', 'Message-ID', 'References']
+        ))
+        headers = {h['name'].lower(): h['value'] for h in original_msg['payload']['headers']}
+        entry = ReplyHeaders.from_headers(original_msg['threadId'], headers)
+        reply_header_cache.put(user, email_id, entry)
+        return entry
+
+    def deliver_reply(self, token_data, email_id: str, reply_content: str) -> str:
+        """
+        Send a reply to a message in its thread.
+
+        Args:
+            token_data: Google tokens
+            email_id: Message being replied to
+            reply_content: Plain-text reply body
+
+        Returns:
+            Gmail ID of the sent message
+
+        Raises:
+            HttpError: If the original can't be read or the send fails
+        """
+        service = self.get_service(token_data)
+        target = self._reply_headers(service, email_id)
+
+        # Create message, threaded under the original
+        message = MIMEText(reply_content)
+        message['to'] = target.reply_to
+        message['subject'] = target.subject
+        if target.message_id:
+            message['In-Reply-To'] = target.message_id
+            message['References'] = f"{target.references} {target.message_id}".strip()
+
+        # Encode message
+        raw_message = base64.urlsafe_b64encode(message.as_bytes()).decode()
+        body = {
+            'raw': raw_message,
+            'threadId': target.thread_id
+        }
+
+        sent = self._execute("messages.send", service.users().messages().send(userId='me', body=body))
+        # Replying to a sender makes their future mail rank higher
+        triage.record_reply(current_user_email.get() or "", target.sender)
+        return sent.get('id', '')
 
     def delete_email(self, token_data, email_id: str) -> bool:
         """Delete (trash) a specific email."""
         try:
-            log_gmail_call("delete_email", "me")
             service = self.get_service(token_data)
-            service.users().messages().trash(userId='me', id=email_id).execute()
-            log_gmail_success("delete_email", "me")
+            self._execute("messages.trash", service.users().messages().trash(userId='me', id=email_id))
             return True
-        except HttpError as error:
-            log_gmail_error("delete_email", "me", str(error))
-            print(f"An error occurred: {error}")
+        except HttpError:
+            # Already logged and counted by track()
             return False
 
+    def search_message_ids(self, token_data, query: Optional[str] = None, limit: int = 5) -> List[str]:
+        """
+        Look up inbox message IDs with a Gmail ``q=`` search.
+
+        Used only when the local email index cannot resolve a selector.
+        """
+        try:
+            service = self.get_service(token_data)
+            params = {'userId': 'me', 'maxResults': limit, 'labelIds': ['INBOX']}
+            if query:
+                params['q'] = query
+            results = self._execute("messages.search", service.users().messages().list(**params))
+            return [m['id'] for m in results.get('messages', [])]
+        except HttpError:
+            # Already logged and counted by track()
+            return []
+
     def get_email_content(self, token_data: dict, email_id: str) -> dict:
         """Helper to get email content for reply generation."""
         try:
             service = self.get_service(token_data)
-            msg = service.users().messages().get(userId='me', id=email_id, format='full').execute()
-            
-            headers = msg['payload']['headers']
-            subject = next((h['value'] for h in headers if h['name'] == 'Subject'), '')
-            sender = next((h['value'] for h in headers if h['name'] == 'From'), '')
+            msg = self._execute("messages.get", service.users().messages().get(userId='me', id=email_id, format='full'))
             
-            # Parse body (simplified)
-            body = ""
-            if 'parts' in msg['payload']:
-                for part in msg['payload']['parts']:
-                    if part['mimeType'] == 'text/plain':
-                        data = part['body'].get('data')
-                        if data:
-                            body += base64.urlsafe_b64decode(data).decode()
-                            break
-            elif 'body' in msg['payload']:
-                data = msg['payload']['body'].get('data')
-                if data:
-                    body = base64.urlsafe_b64decode(data).decode()
+            with tracer.start_as_current_span("gmail.parse_mime"):
+                headers = msg['payload']['headers']
+                subject = next((h['value'] for h in headers if h['name'] == 'Subject'), '')
+                sender = next((h['value'] for h in headers if h['name'] == 'From'), '')
+                
+                # Parse body (simplified)
+                body = ""
+                if 'parts' in msg['payload']:
+                    for part in msg['payload']['parts']:
+                        if part['mimeType'] == 'text/plain':
+                            data = part['body'].get('data')
+                            if data:
+                                body += base64.urlsafe_b64decode(data).decode()
+                                break
+                elif 'body' in msg['payload']:
+                    data = msg['payload']['body'].get('data')
+                    if data:
+                        body = base64.urlsafe_b64decode(data).decode()
             
             return {
                 "id": email_id,
@@ -199,7 +436,7 @@ class GmailService:
                 "body": body
             }
         except Exception as e:
-            print(f"Error fetching email content: {e}")
+            gmail_logger.error("Error fetching email content for %s: %s", email_id, e)
             return None
 
 gmail_service = GmailService()
@@ -0,0 +1,68 @@
+"""
+Google API client construction with deferred imports.
+
+``googleapiclient`` and ``google.auth`` take ~200 ms to import, so they are
+loaded on first use (or by ``warm_up`` in the background at startup) instead
+of when ``main`` is imported. Discovery documents come from the copies
+packaged with ``googleapiclient`` and are parsed once per process, rather
+than re-read and re-parsed by every ``build()`` call.
+"""
+from functools import lru_cache
+from typing import Optional
+import json
+
+
+@lru_cache(maxsize=None)
+def discovery_document(service_name: str, version: str) -> dict:
+    """Parsed discovery document from the static copy shipped with googleapiclient."""
+    from googleapiclient.discovery_cache import get_static_doc
+
+    document = get_static_doc(service_name, version)
+    if document is None:
+        raise LookupError(f"No packaged discovery document for {service_name} {version}")
+    return json.loads(document)
+
+
+def build_service(service_name: str, version: str, credentials, api_endpoint: Optional[str] = None):
+    """
+    Build an API client from the cached discovery document.
+
+    Args:
+        service_name: API name, e.g. ``gmail``
+        version: API version, e.g. ``v1``
+        credentials: google.auth credentials
+        api_endpoint: Optional base URL override
+
+    Returns:
+        googleapiclient Resource
+    """
+    from googleapiclient.discovery import build_from_document
+
+    client_options = {'api_endpoint': api_endpoint} if api_endpoint else None
+    return build_from_document(
+        discovery_document(service_name, version),
+        credentials=credentials,
+        client_options=client_options
+    )
+
+
+def user_credentials(access_token: str, refresh_token: Optional[str], client_id: str, client_secret: str):
+    """OAuth user credentials for the Google APIs."""
+    from google.oauth2.credentials import Credentials
+
+    return Credentials(
+        token=access_token,
+        refresh_token=refresh_token,
+        token_uri="https://oauth2.googleapis.com/token",
+        client_id=client_id,
+        client_secret=client_secret
+    )
+
+
+def warm_up() -> None:
+    """Import the client libraries and parse the discovery documents ahead of the first request."""
+    import googleapiclient.discovery  # noqa: F401
+    import google.oauth2.credentials  # noqa: F401
+
+    discovery_document("gmail", "v1")
+    discovery_document("oauth2", "v2")
@@ -0,0 +1,209 @@
+from app.config import get_settings
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+import threading
+import time
+
+settings = get_settings()
+
+# Admission decisions
+ADMIT_FULL = "full"          # primary model
+ADMIT_DEGRADED = "degraded"  # fallback (cheaper) model
+ADMIT_DENIED = "denied"      # over budget: serve cached/local results or refuse
+
+
+class LLMBudgetExceeded(Exception):
+    """Raised when a user is over their LLM budget and the work can't be degraded."""
+
+    def __init__(self, user: str, retry_after: int):
+        super().__init__(f"LLM budget exceeded for {user}")
+        self.user = user
+        self.retry_after = retry_after
+
+
+class _UserUsage:
+    __slots__ = ("events", "window_prompt", "window_completion", "total_prompt",
+                 "total_completion", "total_requests", "degraded", "denied", "semaphore")
+
+    def __init__(self, max_concurrency: int):
+        # (timestamp, prompt_tokens, completion_tokens) inside the window
+        self.events: Deque[Tuple[float, int, int]] = deque()
+        self.window_prompt = 0
+        self.window_completion = 0
+        self.total_prompt = 0
+        self.total_completion = 0
+        self.total_requests = 0
+        self.degraded = 0
+        self.denied = 0
+        self.semaphore = threading.BoundedSemaphore(max_concurrency)
+
+
+class LLMBudget:
+    """
+    Per-user LLM token/request accounting over a sliding window.
+
+    Usage comes from the Groq ``usage`` fields of each completion. Admission
+    control compares the window totals with the user's budget:
+
+    - below ``degrade_ratio`` of the budget: primary model
+    - between that and the budget: fallback model
+    - over budget: denied (callers serve cached or local results, or refuse)
+
+    Each user also gets a concurrency limit, so a burst from one user queues
+    behind itself instead of occupying the shared Groq quota. Accounting is
+    per process; with several workers each enforces its own share.
+    """
+
+    def __init__(
+        self,
+        window_seconds: int,
+        token_budget: int,
+        request_budget: int,
+        degrade_ratio: float,
+        max_concurrency: int,
+        queue_timeout: float
+    ):
+        self.window = window_seconds
+        self.token_budget = token_budget
+        self.request_budget = request_budget
+        self.degrade_ratio = degrade_ratio
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self._users: Dict[str, _UserUsage] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.token_budget > 0 or self.request_budget > 0
+
+    def _user(self, user: str) -> _UserUsage:
+        usage = self._users.get(user)
+        if usage is None:
+            usage = self._users[user] = _UserUsage(self.max_concurrency)
+        return usage
+
+    def _expire(self, usage: _UserUsage, now: float) -> None:
+        cutoff = now - self.window
+        events = usage.events
+        while events and events[0][0] < cutoff:
+            _, prompt, completion = events.popleft()
+            usage.window_prompt -= prompt
+            usage.window_completion -= completion
+
+    def _load(self, usage: _UserUsage) -> float:
+        """Fraction of the tighter of the token and request budgets used."""
+        load = 0.0
+        if self.token_budget > 0:
+            load = (usage.window_prompt + usage.window_completion) / self.token_budget
+        if self.request_budget > 0:
+            load = max(load, len(usage.events) / self.request_budget)
+        return load
+
+    def admit(self, user: Optional[str]) -> str:
+        """
+        Decide how an LLM call for ``user`` may run.
+
+        Args:
+            user: User email (None for system work, which is never limited)
+
+        Returns:
+            ADMIT_FULL, ADMIT_DEGRADED or ADMIT_DENIED
+        """
+        if user is None or not self.enabled:
+            return ADMIT_FULL
+        with self._lock:
+            usage = self._user(user)
+            self._expire(usage, time.time())
+            load = self._load(usage)
+            if load >= 1.0:
+                usage.denied += 1
+                return ADMIT_DENIED
+            if load >= self.degrade_ratio:
+                usage.degraded += 1
+                return ADMIT_DEGRADED
+            return ADMIT_FULL
+
+    def retry_after(self, user: str) -> int:
+        """Seconds until the oldest event in the user's window expires."""
+        with self._lock:
+            usage = self._users.get(user)
+            if usage is None or not usage.events:
+                return 0
+            return max(1, int(usage.events[0][0] + self.window - time.time()) + 1)
+
+    def record(self, user: Optional[str], usage) -> None:
+        """
+        Account one completion from its Groq ``usage`` object.
+
+        Args:
+            user: User email (ignored if None)
+            usage: ``usage`` with ``prompt_tokens``/``completion_tokens`` (may be None)
+        """
+        if user is None:
+            return
+        prompt = (getattr(usage, "prompt_tokens", 0) or 0) if usage is not None else 0
+        completion = (getattr(usage, "completion_tokens", 0) or 0) if usage is not None else 0
+        now = time.time()
+        with self._lock:
+            entry = self._user(user)
+            self._expire(entry, now)
+            entry.events.append((now, prompt, completion))
+            entry.window_prompt += prompt
+            entry.window_completion += completion
+            entry.total_prompt += prompt
+            entry.total_completion += completion
+            entry.total_requests += 1
+
+    @contextmanager
+    def slot(self, user: Optional[str]) -> Iterator[None]:
+        """
+        Hold one of the user's concurrent LLM slots, waiting for a free one.
+
+        Raises:
+            LLMBudgetExceeded: If no slot frees up within the queue timeout
+        """
+        if user is None:
+            yield
+            return
+        with self._lock:
+            semaphore = self._user(user).semaphore
+        if not semaphore.acquire(timeout=self.queue_timeout):
+            raise LLMBudgetExceeded(user, retry_after=1)
+        try:
+            yield
+        finally:
+            semaphore.release()
+
+    def top_consumers(self, limit: int = 10) -> List[dict]:
+        """Users ordered by tokens used in the current window."""
+        now = time.time()
+        rows = []
+        with self._lock:
+            for user, usage in self._users.items():
+                self._expire(usage, now)
+                rows.append({
+                    "user": user,
+                    "window_prompt_tokens": usage.window_prompt,
+                    "window_completion_tokens": usage.window_completion,
+                    "window_requests": len(usage.events),
+                    "budget_used": round(self._load(usage), 3),
+                    "total_prompt_tokens": usage.total_prompt,
+                    "total_completion_tokens": usage.total_completion,
+                    "total_requests": usage.total_requests,
+                    "degraded_calls": usage.degraded,
+                    "denied_calls": usage.denied,
+                })
+        rows.sort(key=lambda r: r["window_prompt_tokens"] + r["window_completion_tokens"], reverse=True)
+        return rows[:limit]
+
+
+# Singleton instance
+llm_budget = LLMBudget(
+    window_seconds=settings.llm_budget_window_seconds,
+    token_budget=settings.llm_user_token_budget,
+    request_budget=settings.llm_user_request_budget,
+    degrade_ratio=settings.llm_degrade_ratio,
+    max_concurrency=settings.llm_user_max_concurrency,
+    queue_timeout=settings.llm_queue_timeout_seconds
+)
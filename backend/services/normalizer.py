@@ -0,0 +1,201 @@
+"""
+Email body normalization before LLM calls.
+
+Removes what the model doesn't need to read: quoted reply history (Gmail,
+Apple Mail and Outlook formats), signatures, legal disclaimers and
+newsletter footers, tracking-link debris from HTML-to-text conversion and
+runs of whitespace. Everything is line/regex based and runs in microseconds
+per body. Each stage's removed bytes are counted in ``email_body_bytes_total``.
+"""
+from typing import Dict, List, Tuple
+import re
+from utils.metrics import record_body_normalization
+
+# Start of quoted history, one pattern per client family
+_QUOTE_HEADERS = [
+    # Gmail / Apple Mail / Thunderbird: "On <date>, <name> wrote:" (may wrap once)
+    re.compile(r"^On\s[^\n]{0,200}(\n[^\n]{0,200})?\s(wrote|writes):\s*$", re.IGNORECASE | re.MULTILINE),
+    # Outlook (plain): "-----Original Message-----"
+    re.compile(r"^-{3,}\s*Original Message\s*-{3,}\s*$", re.IGNORECASE | re.MULTILINE),
+    # Outlook (desktop/web): optional rule, then From:/Sent: header block
+    re.compile(r"^(_{10,}\s*\n)?From:[^\n]*\n(Sent|Date):[^\n]*\n(To|Cc):", re.IGNORECASE | re.MULTILINE),
+]
+_QUOTED_LINE_RE = re.compile(r"^[ \t]*>[^\n]*\n?", re.MULTILINE)
+
+# "-- " signature delimiter, or mobile client taglines
+_SIGNATURE_DELIMITER_RE = re.compile(r"^(-- ?|__+)\s*$", re.MULTILINE)
+_MOBILE_TAGLINE_RE = re.compile(
+    r"^(Sent from my \w+[^\n]*|Sent from (Mail|Outlook) for [^\n]*|Get Outlook for [^\n]*|Sent from Yahoo Mail[^\n]*)\s*$",
+    re.IGNORECASE | re.MULTILINE
+)
+# A sign-off followed by a short block (name, title, phone...) ends the message
+_SIGN_OFF_RE = re.compile(
+    r"^(best|kind|warm|many thanks|thanks|thank you|cheers|regards|best regards|kind regards|sincerely|br)[,.!]?\s*$",
+    re.IGNORECASE | re.MULTILINE
+)
+_MAX_SIGNATURE_LINES = 8
+_MAX_SIGNATURE_LINE_CHARS = 80
+# Words on a name/title line; contact lines (phone, email, web, "|" separated) may be longer
+_MAX_SIGNATURE_LINE_WORDS = 4
+_CONTACT_LINE_RE = re.compile(r"@|\||https?://|www\.|\+?\d[\d ().-]{6,}\d")
+
+# Paragraphs that are legal disclaimers or mailing-list footers
+_BOILERPLATE_RE = re.compile(
+    r"(confidential|privileged)[^\n]{0,300}(intended (solely )?(for the )?(use of the )?(named )?(recipient|addressee)|"
+    r"disclos|notify the sender|delete (it|this))"
+    r"|this (e-?mail|message) and any attachments (are|is|may be) (confidential|privileged)"
+    r"|you are receiving this (e-?mail|message) because"
+    r"|^\s*unsubscribe\b|(click|tap) here to unsubscribe|to unsubscribe\b|unsubscribe (here|link)"
+    r"|update your (email )?preferences|view (this email )?in (your )?browser"
+    r"|please consider the environment before printing",
+    re.IGNORECASE | re.MULTILINE
+)
+
+# HTML-to-text debris
+_IMAGE_PLACEHOLDER_RE = re.compile(r"\[(image|cid|inline image)[^\]]*\]", re.IGNORECASE)
+_URL_RE = re.compile(r"<?\(?(https?://([^/\s>)]+)[^\s>)]*)\)?>?")
+_LONG_URL = 40
+_ZERO_WIDTH_RE = re.compile("[\u200b\u200c\u200d\u2060\ufeff\u034f]")
+_SPACES_RE = re.compile("[ \t\u00a0]+")
+_BLANK_LINES_RE = re.compile(r"\n\s*\n(\s*\n)+")
+
+
+class NormalizedBody:
+    """Normalized text plus the bytes each stage removed."""
+
+    __slots__ = ("text", "original_bytes", "removed")
+
+    def __init__(self, text: str, original_bytes: int, removed: Dict[str, int]):
+        self.text = text
+        self.original_bytes = original_bytes
+        self.removed = removed
+
+    @property
+    def removed_bytes(self) -> int:
+        return sum(self.removed.values())
+
+
+def _size(text: str) -> int:
+    return len(text.encode("utf-8"))
+
+
+def split_quoted(text: str) -> Tuple[str, str]:
+    """
+    Split a reply into its own text and the quoted history.
+
+    Returns:
+        (own text, quoted text); a message that is nothing but quotes (e.g. a
+        bare forward) is returned whole as its own text
+    """
+    start = min((m.start() for m in (p.search(text) for p in _QUOTE_HEADERS) if m), default=-1)
+    own, quoted = (text[:start], text[start:]) if start >= 0 else (text, "")
+    if ">" in own:
+        quoted = "\n".join(m.group(0).rstrip("\n") for m in _QUOTED_LINE_RE.finditer(own)) + quoted
+        own = _QUOTED_LINE_RE.sub("", own)
+    if not own.strip():
+        return text, ""
+    return own, quoted
+
+
+def strip_quoted(text: str) -> str:
+    """Remove quoted reply history."""
+    return split_quoted(text)[0]
+
+
+def _is_signature_line(line: str) -> bool:
+    """A name, title or contact line; anything that reads as a sentence is message text."""
+    line = line.strip()
+    if not line:
+        return True
+    if "?" in line or len(line) > _MAX_SIGNATURE_LINE_CHARS:
+        return False
+    if _CONTACT_LINE_RE.search(line):
+        return True
+    return len(line.split()) <= _MAX_SIGNATURE_LINE_WORDS and not line.endswith((".", "!", ":", ";"))
+
+
+def strip_signature(text: str) -> str:
+    """Cut the signature: a ``--`` delimiter, mobile tagline, or sign-off and short trailing block."""
+    cut = len(text)
+    for pattern in (_SIGNATURE_DELIMITER_RE, _MOBILE_TAGLINE_RE):
+        match = pattern.search(text)
+        if match and match.start() > 0:
+            cut = min(cut, match.start())
+    for match in _SIGN_OFF_RE.finditer(text, 0, cut):
+        trailing = text[match.end():cut].strip().splitlines()
+        # Only a short closing block of name/title/contact lines is a signature;
+        # a "Thanks" followed by more of the message is not
+        if match.start() > 0 and len(trailing) <= _MAX_SIGNATURE_LINES \
+                and all(_is_signature_line(line) for line in trailing):
+            cut = match.start()
+            break
+    return text[:cut].rstrip()
+
+
+def strip_boilerplate(text: str) -> str:
+    """Drop disclaimer and footer paragraphs."""
+    if not _BOILERPLATE_RE.search(text):
+        return text
+    paragraphs = re.split(r"\n\s*\n", text)
+    kept: List[str] = [p for p in paragraphs if not _BOILERPLATE_RE.search(p)]
+    # Never drop everything: a message can mention "unsubscribe" in its only paragraph
+    return "\n\n".join(kept) if kept else text
+
+
+def _shorten_url(match: "re.Match") -> str:
+    url, host = match.group(1), match.group(2)
+    return url if len(url) <= _LONG_URL else f"[link: {host}]"
+
+
+def collapse_urls(text: str) -> str:
+    """Replace long (tracking) URLs with their host and drop image placeholders."""
+    text = _IMAGE_PLACEHOLDER_RE.sub("", text)
+    return _URL_RE.sub(_shorten_url, text) if "http" in text else text
+
+
+def collapse_whitespace(text: str) -> str:
+    """Collapse runs of spaces and blank lines; drop zero-width characters."""
+    text = _ZERO_WIDTH_RE.sub("", text.replace("\r\n", "\n").replace("\r", "\n"))
+    lines = [_SPACES_RE.sub(" ", line).strip() for line in text.split("\n")]
+    return _BLANK_LINES_RE.sub("\n\n", "\n".join(lines)).strip()
+
+
+def normalize_body(text: str, max_quoted_chars: int = 0, record: bool = True) -> NormalizedBody:
+    """
+    Run every normalization stage over a message body.
+
+    Args:
+        text: Plain-text body (HTML already converted to text)
+        max_quoted_chars: Quoted history to keep as context (0 drops it)
+        record: Count the removed bytes in the metrics registry
+
+    Returns:
+        NormalizedBody with the cleaned text and bytes removed per stage
+    """
+    original_bytes = _size(text)
+    removed = {}
+
+    def stage(name: str, step, value: str) -> str:
+        before = _size(value)
+        value = step(value)
+        removed[name] = removed.get(name, 0) + max(before - _size(value), 0)
+        return value
+
+    # Whitespace first so the line-anchored patterns see clean lines
+    text = stage("whitespace", collapse_whitespace, text)
+    text, quoted = split_quoted(text)
+    # Disclaimers go before the signature check so they don't look like message text after a sign-off
+    text = stage("boilerplate", strip_boilerplate, text)
+    text = stage("signature", strip_signature, text)
+    text = stage("urls", collapse_urls, text)
+    text = stage("whitespace", collapse_whitespace, text)
+    if quoted and max_quoted_chars > 0:
+        context = " ".join(collapse_urls(quoted).replace(">", " ").split())[:max_quoted_chars]
+        text = f"{text}\n\n[Quoted] {context}"
+        removed["quotes"] = max(_size(quoted) - _size(context), 0)
+    else:
+        removed["quotes"] = _size(quoted)
+    result = NormalizedBody(text, original_bytes, removed)
+    if record:
+        record_body_normalization(original_bytes, removed)
+    return result
@@ -0,0 +1,408 @@
+"""
+Durable outbox for email replies.
+
+A send is written to a local SQLite file and acknowledged at once; background
+workers deliver it, retrying transient failures (rate limits, 5xx, network
+errors) with exponential backoff and jitter, and its status can be polled.
+
+- Every send has an idempotency key: the client's ``Idempotency-Key`` header,
+  or a hash of the message and the reply. Enqueuing a key again returns the
+  existing entry, so client retries never queue a second send; a derived key
+  whose send failed for good is queued again, so the user can resend.
+- A worker claims an entry with a lease (``outbox_lease_seconds``). If the
+  process dies mid-send the entry is claimed again when the lease expires,
+  so delivery is at-least-once.
+- Google tokens are not stored; they are read from the user's session when
+  the send is delivered. Reply headers come from the reply-header cache, so a
+  reply to a message from the inbox is a single Gmail call.
+"""
+from app.config import get_settings
+from contextlib import closing
+from datetime import datetime, timezone
+from googleapiclient.errors import HttpError
+from models.email import OutboxEntry
+from services.auth_service import auth_service
+from services.gmail_service import gmail_service
+from services.gmail_quota import is_rate_limited, retry_after
+from services.realtime import connection_manager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from utils.logger import gmail_logger
+from utils.metrics import record_retry
+from utils.request_context import current_user_email
+from utils.resources import resources
+import asyncio
+import hashlib
+import random
+import sqlite3
+import threading
+import time
+import uuid
+
+settings = get_settings()
+
+QUEUED, SENDING, SENT, FAILED = "queued", "sending", "sent", "failed"
+
+# HTTP statuses worth retrying; 403 only for Gmail's rate-limit reasons
+_RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+_PRUNE_INTERVAL = 3600.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id TEXT PRIMARY KEY,
+    user_email TEXT NOT NULL,
+    idempotency_key TEXT NOT NULL,
+    email_id TEXT NOT NULL,
+    content TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    sent_message_id TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    next_attempt_at REAL NOT NULL,
+    lease_until REAL,
+    UNIQUE (user_email, idempotency_key)
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at);
+"""
+
+
+class IdempotencyConflict(Exception):
+    """An idempotency key was reused for a different reply."""
+
+    def __init__(self, key: str):
+        self.key = key
+        super().__init__(f"Idempotency key {key!r} was already used for a different reply")
+
+
+class _ClaimedSend:
+    """A send a worker holds the lease on."""
+
+    __slots__ = ("id", "user_email", "email_id", "content", "attempts")
+
+    def __init__(self, id: str, user_email: str, email_id: str, content: str, attempts: int):
+        self.id = id
+        self.user_email = user_email
+        self.email_id = email_id
+        self.content = content
+        self.attempts = attempts  # Including the current one
+
+
+def _timestamp(value: Optional[float]) -> Optional[datetime]:
+    return datetime.fromtimestamp(value, timezone.utc) if value is not None else None
+
+
+class Outbox:
+    def __init__(
+        self,
+        path: str,
+        workers: int,
+        max_attempts: int,
+        backoff: float,
+        backoff_max: float,
+        lease: float,
+        poll_interval: float,
+        retention: float
+    ):
+        self.path = path
+        self.workers = max(1, workers)
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._schema_ready = False
+        self._schema_lock = threading.Lock()
+        self._tasks: List[asyncio.Task] = []
+        self._wake: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stopping = False
+        self._last_prune = 0.0
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection (one per operation; SQLite connections aren't shared across threads)."""
+        conn = sqlite3.connect(self.path, timeout=10.0, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        if not self._schema_ready:
+            with self._schema_lock:
+                if not self._schema_ready:
+                    # WAL lets status reads run while a worker holds the write lock
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.executescript(_SCHEMA)
+                    self._schema_ready = True
+        return conn
+
+    @staticmethod
+    def derive_key(email_id: str, content: str) -> str:
+        """Key for a send without an ``Idempotency-Key``: the same reply to the same message."""
+        return "auto:" + hashlib.sha256(f"{email_id}\0{content}".encode()).hexdigest()[:32]
+
+    @staticmethod
+    def _entry(row: sqlite3.Row) -> OutboxEntry:
+        return OutboxEntry(
+            id=row["id"],
+            email_id=row["email_id"],
+            status=row["status"],
+            attempts=row["attempts"],
+            last_error=row["last_error"],
+            sent_message_id=row["sent_message_id"],
+            created_at=_timestamp(row["created_at"]),
+            updated_at=_timestamp(row["updated_at"]),
+            next_attempt_at=_timestamp(row["next_attempt_at"]) if row["status"] == QUEUED else None
+        )
+
+    def enqueue(self, user_email: str, email_id: str, content: str, idempotency_key: Optional[str] = None) -> Tuple[OutboxEntry, bool]:
+        """
+        Queue a reply for delivery (blocking).
+
+        Args:
+            user_email: Sending user
+            email_id: Message being replied to
+            content: Reply body
+            idempotency_key: Client-chosen key; derived from the reply if omitted
+
+        Returns:
+            (entry, created): created is False when the key was already queued.
+            A failed send under a derived key is queued again (created is True).
+
+        Raises:
+            IdempotencyConflict: If the key belongs to a different reply
+        """
+        key = idempotency_key or self.derive_key(email_id, content)
+        now = time.time()
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO outbox (id, user_email, idempotency_key, email_id, content, status, "
+                "created_at, updated_at, next_attempt_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (uuid.uuid4().hex, user_email, key, email_id, content, QUEUED, now, now, now)
+            )
+            created = cursor.rowcount == 1
+            if not created and idempotency_key is None:
+                # A derived key only dedupes a pending send: resending a reply
+                # that failed for good queues it again
+                cursor = conn.execute(
+                    "UPDATE outbox SET status = ?, attempts = 0, last_error = NULL, lease_until = NULL, "
+                    "updated_at = ?, next_attempt_at = ? WHERE user_email = ? AND idempotency_key = ? "
+                    "AND status = ? AND email_id = ? AND content = ?",
+                    (QUEUED, now, now, user_email, key, FAILED, email_id, content)
+                )
+                created = cursor.rowcount == 1
+            row = conn.execute(
+                "SELECT * FROM outbox WHERE user_email = ? AND idempotency_key = ?", (user_email, key)
+            ).fetchone()
+        if row["email_id"] != email_id or row["content"] != content:
+            raise IdempotencyConflict(key)
+        if created:
+            self._notify()
+        return self._entry(row), created
+
+    def get(self, user_email: str, entry_id: str) -> Optional[OutboxEntry]:
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT * FROM outbox WHERE id = ? AND user_email = ?", (entry_id, user_email)
+            ).fetchone()
+        return self._entry(row) if row is not None else None
+
+    def recent(self, user_email: str, limit: int = 20) -> List[OutboxEntry]:
+        """A user's most recent sends, newest first."""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT * FROM outbox WHERE user_email = ? ORDER BY created_at DESC LIMIT ?", (user_email, limit)
+            ).fetchall()
+        return [self._entry(row) for row in rows]
+
+    def _claim(self) -> Optional[_ClaimedSend]:
+        """Lease the next due send: a queued one, or one whose previous lease expired."""
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT id, user_email, email_id, content, attempts FROM outbox "
+                    "WHERE (status = ? AND next_attempt_at <= ?) OR (status = ? AND lease_until <= ?) "
+                    "ORDER BY next_attempt_at LIMIT 1",
+                    (QUEUED, now, SENDING, now)
+                ).fetchone()
+                if row is not None:
+                    conn.execute(
+                        "UPDATE outbox SET status = ?, attempts = attempts + 1, lease_until = ?, updated_at = ? WHERE id = ?",
+                        (SENDING, now + self.lease, now, row["id"])
+                    )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        return _ClaimedSend(row["id"], row["user_email"], row["email_id"], row["content"], row["attempts"] + 1)
+
+    def _update(
+        self,
+        entry_id: str,
+        status: str,
+        error: Optional[str] = None,
+        sent_message_id: Optional[str] = None,
+        next_attempt_at: Optional[float] = None
+    ) -> None:
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE outbox SET status = ?, last_error = ?, sent_message_id = COALESCE(?, sent_message_id), "
+                "next_attempt_at = COALESCE(?, next_attempt_at), lease_until = NULL, updated_at = ? WHERE id = ?",
+                (status, error, sent_message_id, next_attempt_at, time.time(), entry_id)
+            )
+
+    def _retry_delay(self, error: Exception, attempt: int) -> Optional[float]:
+        """
+        Seconds to wait before retrying a failed send.
+
+        Returns:
+            None for permanent failures (e.g. 400, 404); otherwise exponential
+            backoff with jitter, or the server's ``Retry-After`` if longer
+        """
+        delay = min(self.backoff * 2 ** (attempt - 1), self.backoff_max)
+        delay = random.uniform(delay / 2, delay)
+        if isinstance(error, HttpError):
+            status = int(error.resp.status)
+            if status not in _RETRYABLE_STATUS and not is_rate_limited(error):
+                return None
+            server_delay = retry_after(error)
+            if server_delay is not None:
+                delay = max(delay, min(server_delay, self.backoff_max))
+        return delay
+
+    def _deliver(self, send: _ClaimedSend) -> Tuple[str, Optional[str]]:
+        """
+        Deliver one claimed send and record the outcome (blocking).
+
+        Returns:
+            (status, error) after this attempt
+        """
+        if send.attempts > self.max_attempts:
+            # Every attempt died without recording an outcome
+            error = "Delivery did not complete"
+            self._update(send.id, FAILED, error=error)
+            return FAILED, error
+
+        session = auth_service.get_user_session(send.user_email)
+        tokens = session.get('google_tokens') if session else None
+        if tokens is None:
+            error = "Session expired; log in again and resend the reply"
+            self._update(send.id, FAILED, error=error)
+            return FAILED, error
+
+        try:
+            sent_message_id = gmail_service.deliver_reply(tokens, send.email_id, send.content)
+        except Exception as e:
+            delay = self._retry_delay(e, send.attempts)
+            if delay is not None and send.attempts < self.max_attempts:
+                gmail_logger.warning("Reply %s failed (attempt %d), retrying in %.1fs: %s", send.id, send.attempts, delay, e)
+                record_retry("gmail", "outbox_send", send.attempts)
+                self._update(send.id, QUEUED, error=str(e), next_attempt_at=time.time() + delay)
+                return QUEUED, str(e)
+            gmail_logger.error("Reply %s failed after %d attempts: %s", send.id, send.attempts, e)
+            self._update(send.id, FAILED, error=str(e))
+            return FAILED, str(e)
+
+        self._update(send.id, SENT, sent_message_id=sent_message_id)
+        return SENT, None
+
+    def _prune(self) -> None:
+        """Drop finished sends older than the retention period."""
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "DELETE FROM outbox WHERE status IN (?, ?) AND updated_at < ?",
+                (SENT, FAILED, time.time() - self.retention)
+            )
+        self._last_prune = time.monotonic()
+
+    @staticmethod
+    async def _run(fn: Callable[..., Any], *args) -> Any:
+        """Run a blocking step on the shared worker pool (in the caller's context)."""
+        return await asyncio.wrap_future(resources.submit(fn, *args))
+
+    def _notify(self) -> None:
+        """Wake idle workers (callable from any thread)."""
+        if self._loop is not None and self._wake is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    async def start(self) -> None:
+        """Start the delivery workers (called from the lifespan)."""
+        if self._tasks:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._stopping = False
+        await self._run(self._prune)
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self, deadline: float) -> None:
+        """
+        Stop the workers, letting in-flight deliveries finish for up to ``deadline`` seconds.
+
+        A send cut off here keeps its lease and is retried after the next start.
+        """
+        self._stopping = True
+        if self._wake is not None:
+            self._wake.set()
+        tasks, self._tasks = self._tasks, []
+        if tasks:
+            _, still_running = await asyncio.wait(tasks, timeout=deadline)
+            for task in still_running:
+                task.cancel()
+
+    async def _work(self) -> None:
+        while not self._stopping:
+            self._wake.clear()
+            try:
+                send = await self._run(self._claim)
+            except Exception as e:
+                gmail_logger.error("Outbox claim failed: %s", e)
+                send = None
+            if send is None:
+                if time.monotonic() - self._last_prune > _PRUNE_INTERVAL:
+                    await self._run(self._prune)
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            # Label logs and metrics of this delivery with its user
+            current_user_email.set(send.user_email)
+            try:
+                status, error = await self._run(self._deliver, send)
+            except Exception as e:
+                # Couldn't record the outcome; the lease expiring retries it
+                gmail_logger.error("Outbox delivery of %s failed: %s", send.id, e)
+                continue
+            if status == SENT:
+                await connection_manager.push(send.user_email, {
+                    "type": "inbox_updated", "action": "sent", "email_id": send.email_id, "outbox_id": send.id
+                })
+            elif status == FAILED:
+                await connection_manager.push(send.user_email, {
+                    "type": "inbox_updated", "action": "send_failed", "email_id": send.email_id,
+                    "outbox_id": send.id, "detail": error
+                })
+
+    def stats(self) -> Dict[str, int]:
+        """Sends per status."""
+        counts = {QUEUED: 0, SENDING: 0, SENT: 0, FAILED: 0}
+        with closing(self._connect()) as conn:
+            for row in conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status"):
+                counts[row[0]] = row[1]
+        return counts
+
+
+# Singleton instance
+outbox = Outbox(
+    settings.outbox_path,
+    workers=settings.outbox_workers,
+    max_attempts=settings.outbox_max_attempts,
+    backoff=settings.outbox_backoff_seconds,
+    backoff_max=settings.outbox_backoff_max_seconds,
+    lease=settings.outbox_lease_seconds,
+    poll_interval=settings.outbox_poll_seconds,
+    retention=settings.outbox_retention_seconds
+)
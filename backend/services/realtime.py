@@ -0,0 +1,70 @@
+from fastapi import WebSocket
+from typing import Dict, Set
+from utils.serialization import dumps
+import asyncio
+
+
+class Connection:
+    """A WebSocket with a send lock, so concurrent chat turns can share it."""
+
+    def __init__(self, user_email: str, websocket: WebSocket):
+        self.user_email = user_email
+        self.websocket = websocket
+        self._send_lock = asyncio.Lock()
+
+    async def send(self, event: dict) -> bool:
+        """Send a JSON event (orjson, so datetimes are allowed); returns False if the socket is already gone."""
+        try:
+            data = dumps(event).decode()
+            async with self._send_lock:
+                await self.websocket.send_text(data)
+            return True
+        except Exception:
+            return False
+
+
+class ConnectionManager:
+    """Tracks open chat sockets per user for server push."""
+
+    def __init__(self):
+        self._connections: Dict[str, Set[Connection]] = {}
+
+    def connect(self, user_email: str, websocket: WebSocket) -> Connection:
+        connection = Connection(user_email, websocket)
+        self._connections.setdefault(user_email, set()).add(connection)
+        return connection
+
+    def disconnect(self, connection: Connection) -> None:
+        connections = self._connections.get(connection.user_email)
+        if connections is not None:
+            connections.discard(connection)
+            if not connections:
+                del self._connections[connection.user_email]
+
+    def is_connected(self, user_email: str) -> bool:
+        return bool(self._connections.get(user_email))
+
+    async def push(self, user_email: str, event: dict) -> int:
+        """
+        Push an event to every socket the user has open.
+
+        Returns:
+            Number of sockets the event was delivered to
+        """
+        connections = list(self._connections.get(user_email, ()))
+        if not connections:
+            return 0
+        results = await asyncio.gather(*(c.send(event) for c in connections))
+        return sum(results)
+
+    async def close_user(self, user_email: str, code: int = 1000) -> None:
+        """Close all of a user's sockets (e.g. on logout)."""
+        for connection in list(self._connections.pop(user_email, ())):
+            try:
+                await connection.websocket.close(code=code)
+            except Exception:
+                pass
+
+
+# Singleton instance
+connection_manager = ConnectionManager()
@@ -0,0 +1,80 @@
+from app.config import get_settings
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+import threading
+
+settings = get_settings()
+
+
+class ReplyHeaders:
+    """What a reply to a message needs: its thread, recipient, subject and threading headers."""
+
+    __slots__ = ("thread_id", "sender", "reply_to", "subject", "message_id", "references")
+
+    def __init__(self, thread_id: str, sender: str, reply_to: str, subject: str, message_id: str = "", references: str = ""):
+        self.thread_id = thread_id
+        self.sender = sender
+        self.reply_to = reply_to
+        self.subject = subject
+        self.message_id = message_id
+        self.references = references
+
+    @classmethod
+    def from_headers(cls, thread_id: str, headers: Dict[str, str]) -> "ReplyHeaders":
+        """
+        Build from a message's headers.
+
+        Args:
+            thread_id: Gmail thread ID of the message
+            headers: Message headers with lowercased names
+        """
+        sender = headers.get('from', '')
+        subject = headers.get('subject', '')
+        if not subject.lower().startswith('re:'):
+            subject = f"Re: {subject}"
+        return cls(
+            thread_id,
+            sender,
+            headers.get('reply-to') or sender,
+            subject,
+            headers.get('message-id', ''),
+            headers.get('references', '')
+        )
+
+
+class ReplyHeaderCache:
+    """
+    Bounded LRU of reply headers keyed by ``(user, message id)``.
+
+    Filled whenever a full message is parsed (inbox, digests), so replying to
+    a message the user has seen needs no ``messages.get`` before the send.
+    Headers of a delivered message never change, so entries never go stale.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], ReplyHeaders]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user: str, message_id: str) -> Optional[ReplyHeaders]:
+        key = (user, message_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, user: str, message_id: str, entry: ReplyHeaders) -> None:
+        key = (user, message_id)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "max_entries": self.max_entries}
+
+
+# Singleton instance
+reply_header_cache = ReplyHeaderCache(settings.reply_header_cache_size)
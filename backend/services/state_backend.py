@@ -0,0 +1,292 @@
+from abc import ABC, abstractmethod
+from app.config import get_settings
+from collections import deque
+from starlette.concurrency import run_in_threadpool
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import threading
+import time
+
+settings = get_settings()
+
+
+class StateBackend(ABC):
+    """
+    Key-value storage for state shared between API workers.
+
+    Values are opaque bytes; callers serialize with ``utils.serialization``.
+    Lists are capped ring buffers used for chat history; hashes hold small
+    per-user maps (e.g. reply drafts) so one field changes without rewriting
+    the rest.
+    """
+
+    shared = False  # True when state is visible to other processes
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, *keys: str) -> None:
+        ...
+
+    @abstractmethod
+    def pop(self, key: str) -> Optional[bytes]:
+        """Atomically read and delete a key (used for one-time tokens)."""
+
+    @abstractmethod
+    def list_append(self, key: str, value: bytes, maxlen: int, ttl: Optional[float] = None) -> None:
+        """Append to a list, keeping only the last ``maxlen`` items."""
+
+    @abstractmethod
+    def list_range(self, key: str, last: Optional[int] = None) -> List[bytes]:
+        """Return the list (or its last ``last`` items), oldest first."""
+
+    @abstractmethod
+    def hash_set(self, key: str, field: str, value: bytes, ttl: Optional[float] = None) -> None:
+        """Set one field of a hash (and refresh the hash's TTL)."""
+
+    @abstractmethod
+    def hash_get(self, key: str, field: str) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    def hash_delete(self, key: str, *fields: str) -> int:
+        """Delete fields of a hash; returns how many existed."""
+
+    @abstractmethod
+    def hash_len(self, key: str) -> int:
+        ...
+
+    @abstractmethod
+    def counter_next(self, key: str, start: int = 0, ttl: Optional[float] = None) -> int:
+        """Increment a counter (created at ``start`` if missing) and return the new value."""
+
+    @abstractmethod
+    def expire(self, key: str, ttl: float) -> None:
+        ...
+
+
+class InMemoryBackend(StateBackend):
+    """Process-local backend; only valid with a single uvicorn worker."""
+
+    def __init__(self, sweep_interval: float = 60.0):
+        self._values: Dict[str, Tuple[object, Optional[float]]] = {}
+        self._lock = threading.Lock()
+        self._sweep_interval = sweep_interval
+        self._last_sweep = time.monotonic()
+
+    def _live(self, key: str, now: float):
+        entry = self._values.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= now:
+            del self._values[key]
+            return None
+        return value
+
+    def _expiry(self, key: str, now: float, ttl: Optional[float]) -> Optional[float]:
+        # Like Redis, modifying a collection without a TTL keeps the key's current one
+        if ttl:
+            return now + ttl
+        entry = self._values.get(key)
+        return entry[1] if entry is not None else None
+
+    def _sweep(self, now: float) -> None:
+        if now - self._last_sweep < self._sweep_interval:
+            return
+        self._last_sweep = now
+        expired = [k for k, (_, exp) in self._values.items() if exp is not None and exp <= now]
+        for key in expired:
+            del self._values[key]
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            return self._live(key, time.monotonic())
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._values[key] = (value, now + ttl if ttl else None)
+            self._sweep(now)
+
+    def delete(self, *keys: str) -> None:
+        with self._lock:
+            for key in keys:
+                self._values.pop(key, None)
+
+    def pop(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            value = self._live(key, time.monotonic())
+            self._values.pop(key, None)
+            return value
+
+    def list_append(self, key: str, value: bytes, maxlen: int, ttl: Optional[float] = None) -> None:
+        now = time.monotonic()
+        with self._lock:
+            items = self._live(key, now)
+            if items is None or items.maxlen != maxlen:
+                items = deque(items or (), maxlen=maxlen)
+            items.append(value)
+            self._values[key] = (items, self._expiry(key, now, ttl))
+            self._sweep(now)
+
+    def list_range(self, key: str, last: Optional[int] = None) -> List[bytes]:
+        with self._lock:
+            items = self._live(key, time.monotonic())
+            if not items:
+                return []
+            items = list(items)
+        return items[-last:] if last else items
+
+    def hash_set(self, key: str, field: str, value: bytes, ttl: Optional[float] = None) -> None:
+        now = time.monotonic()
+        with self._lock:
+            fields = self._live(key, now) or {}
+            fields[field] = value
+            self._values[key] = (fields, self._expiry(key, now, ttl))
+            self._sweep(now)
+
+    def hash_get(self, key: str, field: str) -> Optional[bytes]:
+        with self._lock:
+            fields = self._live(key, time.monotonic())
+            return fields.get(field) if fields else None
+
+    def hash_delete(self, key: str, *fields: str) -> int:
+        with self._lock:
+            values = self._live(key, time.monotonic())
+            if not values:
+                return 0
+            removed = sum(values.pop(field, None) is not None for field in fields)
+            if not values:
+                del self._values[key]
+            return removed
+
+    def hash_len(self, key: str) -> int:
+        with self._lock:
+            fields = self._live(key, time.monotonic())
+            return len(fields) if fields else 0
+
+    def counter_next(self, key: str, start: int = 0, ttl: Optional[float] = None) -> int:
+        now = time.monotonic()
+        with self._lock:
+            current = self._live(key, now)
+            value = (int(current) if current is not None else start) + 1
+            self._values[key] = (str(value).encode(), self._expiry(key, now, ttl))
+            return value
+
+    def expire(self, key: str, ttl: float) -> None:
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is not None:
+                self._values[key] = (entry[0], time.monotonic() + ttl)
+
+
+class RedisBackend(StateBackend):
+    """
+    Backend speaking the Redis protocol, shared by all workers and nodes.
+
+    Pass ``client`` to use an existing client (e.g. ``fakeredis.FakeRedis()``).
+    """
+
+    shared = True
+
+    def __init__(self, url: Optional[str] = None, client=None):
+        if client is None:
+            import redis
+
+            client = redis.Redis.from_url(url, socket_timeout=2.0, health_check_interval=30)
+        self.client = client
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(key)
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        if ttl:
+            self.client.set(key, value, px=int(ttl * 1000))
+        else:
+            self.client.set(key, value)
+
+    def delete(self, *keys: str) -> None:
+        if keys:
+            self.client.delete(*keys)
+
+    def pop(self, key: str) -> Optional[bytes]:
+        return self.client.getdel(key)
+
+    def list_append(self, key: str, value: bytes, maxlen: int, ttl: Optional[float] = None) -> None:
+        pipe = self.client.pipeline(transaction=True)
+        pipe.rpush(key, value)
+        pipe.ltrim(key, -maxlen, -1)
+        if ttl:
+            pipe.pexpire(key, int(ttl * 1000))
+        pipe.execute()
+
+    def list_range(self, key: str, last: Optional[int] = None) -> List[bytes]:
+        return self.client.lrange(key, -last if last else 0, -1)
+
+    def hash_set(self, key: str, field: str, value: bytes, ttl: Optional[float] = None) -> None:
+        pipe = self.client.pipeline(transaction=True)
+        pipe.hset(key, field, value)
+        if ttl:
+            pipe.pexpire(key, int(ttl * 1000))
+        pipe.execute()
+
+    def hash_get(self, key: str, field: str) -> Optional[bytes]:
+        return self.client.hget(key, field)
+
+    def hash_delete(self, key: str, *fields: str) -> int:
+        return self.client.hdel(key, *fields) if fields else 0
+
+    def hash_len(self, key: str) -> int:
+        return self.client.hlen(key)
+
+    def counter_next(self, key: str, start: int = 0, ttl: Optional[float] = None) -> int:
+        pipe = self.client.pipeline(transaction=True)
+        pipe.set(key, start, nx=True)
+        pipe.incr(key)
+        if ttl:
+            pipe.pexpire(key, int(ttl * 1000))
+        return pipe.execute()[1]
+
+    def expire(self, key: str, ttl: float) -> None:
+        self.client.pexpire(key, int(ttl * 1000))
+
+
+def create_state_backend(url: Optional[str]) -> StateBackend:
+    """
+    Build the backend for ``STATE_BACKEND_URL``.
+
+    ``memory://`` (the default) keeps state in-process; ``redis://`` and
+    ``rediss://`` URLs share it between workers.
+    """
+    if not url or url.startswith("memory://"):
+        return InMemoryBackend()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(url)
+    raise ValueError(f"Unsupported state backend URL: {url}")
+
+
+# Singleton instance
+state_backend = create_state_backend(settings.state_backend_url)
+
+
+async def run_state_call(fn: Callable[..., Any], *args, backend: Optional[StateBackend] = None, **kwargs) -> Any:
+    """
+    Call code that touches the state backend from async code.
+
+    Redis calls block on the network (up to the socket timeout), so with a
+    shared backend ``fn`` runs in the threadpool; in-memory calls are cheap
+    and run inline.
+
+    Args:
+        fn: Sync callable reading or writing the backend
+        backend: Backend ``fn`` uses (defaults to the module singleton)
+    """
+    if (backend or state_backend).shared:
+        return await run_in_threadpool(fn, *args, **kwargs)
+    return fn(*args, **kwargs)
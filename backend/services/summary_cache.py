@@ -0,0 +1,92 @@
+from app.config import get_settings
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+import threading
+import time
+
+settings = get_settings()
+
+
+class ThreadSummary:
+    """A thread summary and the messages it covers (oldest first)."""
+
+    __slots__ = ("summary", "message_ids", "sender", "subject", "score", "source")
+
+    def __init__(
+        self,
+        summary: str,
+        message_ids: Tuple[str, ...],
+        sender: str,
+        subject: str,
+        score: float = 0.0,
+        source: str = "llm"
+    ):
+        self.summary = summary
+        self.message_ids = message_ids
+        self.source = source  # "llm" or "extractive" (short messages)
+        # Headers and triage score of the newest covered message, so a thread
+        # whose newest message is unchanged can be listed without fetching it
+        self.sender = sender
+        self.subject = subject
+        self.score = score
+
+    @property
+    def latest_id(self) -> str:
+        return self.message_ids[-1]
+
+
+class SummaryCache:
+    """
+    Bounded LRU of thread summaries keyed by ``(user, thread id)``.
+
+    Gmail messages never change once delivered, so a thread summary stays
+    valid until a message is added to the thread, and then only the new
+    messages need summarizing. Each user has a version that changes whenever
+    one of their summaries is added or dropped, for validators (ETags) derived
+    from what the cache would serve them.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], ThreadSummary]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        # Seeded from the clock so versions never repeat across restarts
+        self._base_version = time.time_ns() // 1000
+
+    def _bump(self, user: str) -> None:
+        self._versions[user] = self._versions.get(user, self._base_version) + 1
+
+    def get(self, user: str, thread_id: str) -> Optional[ThreadSummary]:
+        key = (user, thread_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, user: str, thread_id: str, entry: ThreadSummary) -> None:
+        key = (user, thread_id)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self._bump(user)
+            while len(self._entries) > self.max_entries:
+                (evicted_user, _), _ = self._entries.popitem(last=False)
+                self._bump(evicted_user)
+
+    def remove(self, user: str, thread_id: str) -> None:
+        with self._lock:
+            if self._entries.pop((user, thread_id), None) is not None:
+                self._bump(user)
+
+    def version(self, user: str) -> int:
+        with self._lock:
+            return self._versions.get(user, self._base_version)
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "max_entries": self.max_entries}
+
+
+# Singleton instance
+summary_cache = SummaryCache(settings.summary_cache_size)
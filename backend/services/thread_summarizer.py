@@ -0,0 +1,128 @@
+"""
+Thread-level summaries with incremental updates.
+
+The inbox is summarized one thread at a time instead of one message at a
+time. The first time a thread is seen its messages are summarized in one
+call; when new messages arrive only they are sent, together with the previous
+summary, so long reply chains are never re-read. Bodies are normalized first;
+quoted text is dropped from multi-message threads because the quoted messages
+are already part of them.
+Short single messages are summarized locally by the extractive summarizer.
+"""
+from app.config import get_settings
+from services import extractive
+from services.ai_service import ai_service
+from services.normalizer import normalize_body
+from services.summary_cache import SummaryCache, ThreadSummary, summary_cache
+from typing import Dict, List, Optional, Sequence
+from utils.logger import gmail_logger
+from utils.metrics import record_cache
+
+settings = get_settings()
+
+class ThreadMessage:
+    """A parsed message of a thread: the headers and text the summarizer and triage need."""
+
+    __slots__ = ("id", "sender", "subject", "body", "snippet", "labels", "headers")
+
+    def __init__(
+        self,
+        id: str,
+        sender: str,
+        subject: str,
+        body: str,
+        snippet: str = "",
+        labels: Sequence[str] = (),
+        headers: Optional[Dict[str, str]] = None
+    ):
+        self.id = id
+        self.sender = sender
+        self.subject = subject
+        self.body = body
+        self.snippet = snippet
+        self.labels = labels
+        self.headers = headers or {}  # lowercased names
+
+
+class ThreadSummarizer:
+    def __init__(self, cache: SummaryCache):
+        self.cache = cache
+
+    def cached(self, user: str, thread_id: str, latest_id: str) -> Optional[ThreadSummary]:
+        """
+        Summary for a thread whose newest message is ``latest_id``, if already known.
+
+        Lets the inbox list an unchanged thread without fetching it.
+        """
+        entry = self.cache.get(user, thread_id)
+        if entry is not None and entry.latest_id == latest_id:
+            record_cache("summary", True)
+            return entry
+        return None
+
+    def summarize(self, user: str, thread_id: str, messages: List[ThreadMessage], score: float = 0.0) -> ThreadSummary:
+        """
+        Summarize a thread, reusing and extending the previous summary.
+
+        Args:
+            user: Current user's email address (cache scope)
+            thread_id: Gmail thread ID
+            messages: All messages of the thread, oldest first
+            score: Triage score, kept with the summary for later rankings
+
+        Returns:
+            ThreadSummary covering every message in ``messages``
+
+        Raises:
+            LLMBudgetExceeded: If the user is over their LLM budget
+            Exception: Whatever the LLM call raised after its retries
+        """
+        message_ids = tuple(m.id for m in messages)
+        latest = messages[-1]
+        previous = self.cache.get(user, thread_id)
+        record_cache("summary", previous is not None and previous.message_ids == message_ids)
+        if previous is not None and previous.message_ids == message_ids:
+            previous.score = score
+            return previous
+
+        covered = set(previous.message_ids) if previous is not None else set()
+        if previous is not None and covered.issubset(message_ids):
+            new_messages = [m for m in messages if m.id not in covered]
+            gmail_logger.debug("Updating thread %s summary with %d new messages", thread_id, len(new_messages))
+            summary = ai_service.update_thread_summary(
+                previous.summary,
+                [(m.sender, normalize_body(m.body).text) for m in new_messages],
+                latest.subject
+            )
+        elif len(messages) == 1 and len(normalize_body(latest.body, record=False).text) < settings.extractive_max_chars:
+            # Short enough that an LLM round trip adds nothing
+            entry = ThreadSummary(self.fallback(messages), message_ids, latest.sender, latest.subject, score, "extractive")
+            self.cache.put(user, thread_id, entry)
+            return entry
+        elif len(messages) == 1:
+            # A lone message keeps some quoted context (normalized by summarize_email)
+            summary = ai_service.summarize_email(latest.body, latest.subject)
+        else:
+            summary = ai_service.summarize_thread(
+                [(m.sender, normalize_body(m.body).text) for m in messages],
+                messages[0].subject
+            )
+
+        entry = ThreadSummary(summary, message_ids, latest.sender, latest.subject, score)
+        self.cache.put(user, thread_id, entry)
+        return entry
+
+    def fallback(self, messages: List[ThreadMessage]) -> str:
+        """
+        Local extractive summary of the newest message (no LLM).
+
+        :meth:`summarize` caches it for short single messages (source
+        ``"extractive"``); callers using it after a failed LLM call don't cache
+        it and mark it ``"fallback"``, so the LLM is tried again next time.
+        """
+        latest = messages[-1]
+        return extractive.summarize(normalize_body(latest.body, record=False).text) or latest.snippet
+
+
+# Singleton instance
+thread_summarizer = ThreadSummarizer(summary_cache)
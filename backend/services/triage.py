@@ -0,0 +1,160 @@
+"""
+Local priority triage of inbox threads.
+
+Scores each thread without any network call, from Gmail labels, list/bulk
+headers, the user's reply history with the sender and a few text features, so
+that only the most important threads of an inbox page are summarized by the
+LLM and the rest get a cheap local preview.
+"""
+from collections import OrderedDict
+from email.utils import parseaddr
+from typing import Dict, List, Sequence
+import re
+import threading
+
+# Label weights (Gmail system labels and categories)
+LABEL_WEIGHTS = {
+    "IMPORTANT": 2.0,
+    "STARRED": 2.0,
+    "UNREAD": 0.5,
+    "CATEGORY_PERSONAL": 0.5,
+    "CATEGORY_UPDATES": -1.0,
+    "CATEGORY_FORUMS": -1.0,
+    "CATEGORY_SOCIAL": -1.5,
+    "CATEGORY_PROMOTIONS": -3.0,
+}
+
+BULK_HEADER_WEIGHT = -2.0     # List-Unsubscribe / List-Id / Precedence: bulk
+AUTOMATED_SENDER_WEIGHT = -1.5  # no-reply@, notifications@, Auto-Submitted
+REPLIED_SENDER_WEIGHT = 1.5   # per earlier reply to this sender, capped
+REPLIED_SENDER_CAP = 3.0
+SAME_DOMAIN_WEIGHT = 1.0      # sender shares the user's domain (a colleague)
+CONVERSATION_WEIGHT = 0.5     # per extra message in the thread, capped
+CONVERSATION_CAP = 1.5
+QUESTION_WEIGHT = 0.5
+URGENT_WEIGHT = 1.0
+PROMOTIONAL_WEIGHT = -1.0
+
+_AUTOMATED_SENDER_RE = re.compile(r"^(no-?reply|do-?not-?reply|notifications?|mailer-daemon|bounce)", re.IGNORECASE)
+_URGENT_RE = re.compile(
+    r"\b(urgent|asap|deadline|due (today|tomorrow|by)|by (eod|end of day|monday|tuesday|wednesday|thursday|friday)"
+    r"|please (confirm|review|approve|respond)|action required|overdue)\b",
+    re.IGNORECASE
+)
+_PROMOTIONAL_RE = re.compile(
+    r"(\d+% off|\bsale\b|\bdeal(s)?\b|limited time|free shipping|\bcoupon\b|\bnewsletter\b|unsubscribe)",
+    re.IGNORECASE
+)
+_BULK_PRECEDENCE = {"bulk", "list", "junk"}
+# Free mailbox providers: sharing one says nothing about being colleagues
+CONSUMER_DOMAINS = frozenset({
+    "gmail.com", "googlemail.com", "outlook.com", "hotmail.com", "live.com", "msn.com",
+    "yahoo.com", "ymail.com", "icloud.com", "me.com", "mac.com", "aol.com",
+    "proton.me", "protonmail.com", "gmx.com", "gmx.net", "mail.com", "zoho.com",
+    "yandex.com", "fastmail.com", "hey.com", "qq.com", "163.com",
+})
+
+
+def sender_address(sender: str) -> str:
+    """Lowercased address part of a ``From`` header."""
+    return parseaddr(sender)[1].lower()
+
+
+class Triage:
+    """
+    Thread scorer with a bounded per-user history of replied-to senders.
+
+    Reply history is process-local, like the summary cache: it only sharpens
+    the ranking and is rebuilt as the user replies.
+    """
+
+    def __init__(self, max_senders_per_user: int = 500):
+        self.max_senders_per_user = max_senders_per_user
+        self._replied: Dict[str, "OrderedDict[str, int]"] = {}
+        self._lock = threading.Lock()
+
+    def record_reply(self, user: str, sender: str) -> None:
+        """Remember that ``user`` replied to ``sender`` (raises its future scores)."""
+        address = sender_address(sender)
+        if not user or not address:
+            return
+        with self._lock:
+            senders = self._replied.setdefault(user, OrderedDict())
+            senders[address] = senders.get(address, 0) + 1
+            senders.move_to_end(address)
+            while len(senders) > self.max_senders_per_user:
+                senders.popitem(last=False)
+
+    def replies_to(self, user: str, sender: str) -> int:
+        with self._lock:
+            return self._replied.get(user, {}).get(sender_address(sender), 0)
+
+    def score(
+        self,
+        user: str,
+        sender: str,
+        subject: str,
+        body: str,
+        labels: Sequence[str],
+        headers: Dict[str, str],
+        thread_length: int = 1
+    ) -> float:
+        """
+        Priority score of a thread; higher is more important.
+
+        Args:
+            user: Current user's email address
+            sender: ``From`` header of the newest message
+            subject: Subject of the newest message
+            body: Text of the newest message (quoted text may be included)
+            labels: Gmail label IDs of the newest message
+            headers: Lowercased header names to values for the newest message
+            thread_length: Number of messages in the thread
+
+        Returns:
+            Score (0 is neutral)
+        """
+        score = sum(LABEL_WEIGHTS.get(label, 0.0) for label in labels)
+
+        if "list-unsubscribe" in headers or "list-id" in headers \
+                or headers.get("precedence", "").strip().lower() in _BULK_PRECEDENCE:
+            score += BULK_HEADER_WEIGHT
+        address = sender_address(sender)
+        if _AUTOMATED_SENDER_RE.match(address) or headers.get("auto-submitted", "no").lower() != "no":
+            score += AUTOMATED_SENDER_WEIGHT
+
+        score += min(REPLIED_SENDER_WEIGHT * self.replies_to(user, sender), REPLIED_SENDER_CAP)
+        user_domain = user.rpartition("@")[2].lower()
+        if user_domain and user_domain not in CONSUMER_DOMAINS and address.endswith("@" + user_domain):
+            score += SAME_DOMAIN_WEIGHT
+        score += min(CONVERSATION_WEIGHT * (thread_length - 1), CONVERSATION_CAP)
+
+        text = f"{subject}\n{body[:2000]}"
+        if "?" in text:
+            score += QUESTION_WEIGHT
+        if _URGENT_RE.search(text):
+            score += URGENT_WEIGHT
+        if _PROMOTIONAL_RE.search(text):
+            score += PROMOTIONAL_WEIGHT
+        return round(score, 2)
+
+
+def rank(scores: List[float]) -> List[int]:
+    """
+    1-based priority rank of each score (ties keep the given, i.e. recency, order).
+
+    Args:
+        scores: Scores in inbox order
+
+    Returns:
+        Ranks in the same order as ``scores``
+    """
+    order = sorted(range(len(scores)), key=lambda i: -scores[i])
+    ranks = [0] * len(scores)
+    for position, index in enumerate(order, start=1):
+        ranks[index] = position
+    return ranks
+
+
+# Singleton instance
+triage = Triage()
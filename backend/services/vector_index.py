@@ -0,0 +1,483 @@
+"""
+Local search over the threads the service has summarized.
+
+Every thread that passes through summarization (inbox pages, digests) is
+indexed as a TF-IDF vector of the terms of its subject, sender, summary and
+normalized bodies. Terms are hashed (CRC32) into ``vector_index_dims`` signed
+buckets, so each thread is one L2-normalized row of a per-user float32 NumPy
+matrix and a query is scored against every row with one matrix-vector
+product. Hashing folds unrelated terms into the same bucket, so the best
+``RERANK_FACTOR * k`` rows are then re-scored with the exact (unhashed)
+cosine from each thread's stored term counts.
+
+IDF is kept per term (a document count per term hash). Upserts only build
+their own row; once the index has grown or shrunk by a quarter since rows
+were last weighted, every row is re-weighted with the current IDF in one
+vectorized pass.
+
+Indexes idle for longer than ``vector_index_idle_ttl_seconds`` are dropped,
+and when their estimated footprint exceeds ``vector_index_max_bytes`` the
+least recently used users are evicted first. An evicted user's index is
+rebuilt as their threads are summarized again.
+
+NumPy is imported on first use, so importing this module (and the app) does
+not pay for it.
+"""
+from app.config import get_settings
+from collections import Counter, OrderedDict
+from email.utils import parseaddr, parsedate_to_datetime
+from services.extractive import STOPWORDS
+from services.normalizer import normalize_body
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
+import re
+import threading
+import time
+import zlib
+
+if TYPE_CHECKING:
+    import numpy as np
+
+settings = get_settings()
+
+_WORD_RE = re.compile(r"[a-z0-9][a-z0-9'-]*[a-z0-9]|[a-z0-9]")
+# Rows are re-weighted once the index grew (or shrank) this much since the last pass
+_REFRESH_GROWTH = 1.25
+# Hashed candidates re-scored exactly, per requested hit
+RERANK_FACTOR = 40
+_MIN_CANDIDATES = 50
+# Exact scores at or below this are not worth showing
+_MIN_SCORE = 0.02
+# Body text indexed per thread
+_MAX_BODY_CHARS = 4000
+# Estimated bytes per indexed thread besides its row and term arrays (strings,
+# slots, dict entries), and per distinct term in the document-frequency table
+_DOC_OVERHEAD_BYTES = 400
+_DF_ENTRY_BYTES = 100
+
+
+def _stem(term: str) -> str:
+    """Fold simple plurals ("invoices" -> "invoice") so queries match either form."""
+    if len(term) > 4 and term.endswith("ies"):
+        return term[:-3] + "y"
+    if len(term) > 3 and term.endswith("s") and not term.endswith("ss"):
+        return term[:-1]
+    return term
+
+
+def terms(text: str) -> List[str]:
+    """Index terms of a text: lowercase words, stopwords dropped, plurals folded."""
+    return [_stem(t) for t in _WORD_RE.findall(text.lower()) if t not in STOPWORDS and len(t) > 1]
+
+
+def term_counts(words: Sequence[str]) -> Tuple["np.ndarray", "np.ndarray"]:
+    """
+    Hash terms and weight their counts.
+
+    Returns:
+        (term hashes, sublinear term frequencies ``1 + ln count``), one entry per distinct term
+    """
+    import numpy as np
+
+    counts = Counter(zlib.crc32(w.encode()) for w in words)
+    hashes = np.fromiter(counts.keys(), dtype=np.uint32, count=len(counts))
+    tf = 1.0 + np.log(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))
+    return hashes, tf.astype(np.float32)
+
+
+class SearchHit:
+    """An indexed thread and its similarity to the query."""
+
+    __slots__ = ("email_id", "thread_id", "sender", "subject", "summary", "timestamp", "score")
+
+    def __init__(self, email_id: str, thread_id: str, sender: str, subject: str, summary: str, timestamp: float, score: float):
+        self.email_id = email_id
+        self.thread_id = thread_id
+        self.sender = sender
+        self.subject = subject
+        self.summary = summary
+        self.timestamp = timestamp
+        self.score = score
+
+
+class _Document:
+    __slots__ = ("email_id", "thread_id", "sender", "subject", "summary", "hashes", "tf", "norm")
+
+    def __init__(self, email_id: str, thread_id: str, sender: str, subject: str, summary: str, hashes: "np.ndarray", tf: "np.ndarray"):
+        self.email_id = email_id
+        self.thread_id = thread_id
+        self.sender = sender
+        self.subject = subject
+        self.summary = summary
+        self.hashes = hashes
+        self.tf = tf
+        self.norm = 1.0  # Exact TF-IDF norm as of the last weighting
+
+
+def _doc_bytes(doc: _Document) -> int:
+    return doc.hashes.nbytes + doc.tf.nbytes + len(doc.summary) + len(doc.subject) + _DOC_OVERHEAD_BYTES
+
+
+class UserVectorIndex:
+    """
+    One user's indexed threads: row ``i`` of ``matrix`` is ``docs[i]``.
+
+    Rows are kept dense (removal moves the last row into the gap) and the
+    matrix doubles its capacity as it fills.
+    """
+
+    def __init__(self, dims: int, max_docs: int, initial_capacity: int = 64):
+        import numpy as np
+
+        self.dims = dims
+        self.max_docs = max_docs
+        self.matrix = np.zeros((initial_capacity, dims), dtype=np.float32)
+        self.timestamps = np.zeros(initial_capacity, dtype=np.float64)
+        self.docs: List[_Document] = []
+        self.rows: Dict[str, int] = {}          # thread ID -> row
+        self.threads_by_email: Dict[str, str] = {}  # indexed message ID -> thread ID
+        self.df: Dict[int, int] = {}            # term hash -> threads containing it
+        self.weighted_size = 0                  # index size at the last full weighting
+        self.doc_bytes = 0                      # term arrays and per-thread overhead
+        self.last_access = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    @property
+    def nbytes(self) -> int:
+        """Estimated memory held by this index."""
+        return self.matrix.nbytes + self.timestamps.nbytes + self.doc_bytes + len(self.df) * _DF_ENTRY_BYTES
+
+    def _idf(self, hashes: "np.ndarray") -> "np.ndarray":
+        import numpy as np
+
+        n = len(self.docs)
+        df = np.fromiter((self.df.get(int(h), 0) for h in hashes), dtype=np.float32, count=len(hashes))
+        return np.log((1.0 + n) / (1.0 + df)) + 1.0
+
+    def _count(self, hashes: "np.ndarray", delta: int) -> None:
+        df = self.df
+        for h in hashes.tolist():
+            count = df.get(h, 0) + delta
+            if count > 0:
+                df[h] = count
+            else:
+                df.pop(h, None)
+
+    def _hashed_row(self, hashes: "np.ndarray", weights: "np.ndarray") -> "np.ndarray":
+        """Fold term weights into signed buckets and L2-normalize."""
+        import numpy as np
+
+        row = np.zeros(self.dims, dtype=np.float32)
+        signs = np.where(hashes & 0x80000000, 1.0, -1.0).astype(np.float32)
+        np.add.at(row, hashes % self.dims, weights * signs)
+        norm = np.linalg.norm(row)
+        return row / norm if norm > 0 else row
+
+    def _weigh(self, row: int) -> None:
+        import numpy as np
+
+        doc = self.docs[row]
+        weights = doc.tf * self._idf(doc.hashes)
+        doc.norm = float(np.linalg.norm(weights)) or 1.0
+        self.matrix[row] = self._hashed_row(doc.hashes, weights)
+
+    def _grow(self) -> None:
+        import numpy as np
+
+        capacity = self.matrix.shape[0] * 2
+        matrix = np.zeros((capacity, self.dims), dtype=np.float32)
+        matrix[:len(self.docs)] = self.matrix[:len(self.docs)]
+        timestamps = np.zeros(capacity, dtype=np.float64)
+        timestamps[:len(self.docs)] = self.timestamps[:len(self.docs)]
+        self.matrix, self.timestamps = matrix, timestamps
+
+    def _maybe_refresh(self) -> None:
+        """Re-weight every row with the current IDF if the index size drifted."""
+        import numpy as np
+
+        size = len(self.docs)
+        if self.weighted_size and self.weighted_size / _REFRESH_GROWTH <= size <= self.weighted_size * _REFRESH_GROWTH:
+            return
+        self.weighted_size = size
+        if not size:
+            return
+        lengths = [len(d.hashes) for d in self.docs]
+        rows = np.repeat(np.arange(size), lengths)
+        hashes = np.concatenate([d.hashes for d in self.docs])
+        tf = np.concatenate([d.tf for d in self.docs])
+        # IDF of every term via a sorted lookup table instead of per-term dict reads
+        keys = np.fromiter(self.df.keys(), dtype=np.uint32, count=len(self.df))
+        counts = np.fromiter(self.df.values(), dtype=np.float32, count=len(self.df))
+        order = np.argsort(keys)
+        keys, counts = keys[order], counts[order]
+        df = counts[np.minimum(np.searchsorted(keys, hashes), len(keys) - 1)]
+        weights = tf * (np.log((1.0 + size) / (1.0 + df)) + 1.0)
+        norms = np.sqrt(np.bincount(rows, weights=weights * weights, minlength=size))
+        for doc, norm in zip(self.docs, norms.tolist()):
+            doc.norm = norm or 1.0
+        signs = np.where(hashes & 0x80000000, 1.0, -1.0).astype(np.float32)
+        matrix = self.matrix[:size]
+        matrix[:] = 0.0
+        np.add.at(matrix, (rows, hashes % self.dims), weights * signs)
+        row_norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, row_norms, out=matrix, where=row_norms > 0)
+
+    def upsert(self, doc: _Document, timestamp: float) -> None:
+        """Add a thread, or replace its previous version."""
+        import numpy as np
+
+        row = self.rows.get(doc.thread_id)
+        if row is not None:
+            previous = self.docs[row]
+            self._count(previous.hashes, -1)
+            self.threads_by_email.pop(previous.email_id, None)
+            self.doc_bytes -= _doc_bytes(previous)
+            self.docs[row] = doc
+        else:
+            if len(self.docs) >= self.max_docs:
+                self._remove_row(int(np.argmin(self.timestamps[:len(self.docs)])))
+            if len(self.docs) == self.matrix.shape[0]:
+                self._grow()
+            row = len(self.docs)
+            self.docs.append(doc)
+            self.rows[doc.thread_id] = row
+        self.threads_by_email[doc.email_id] = doc.thread_id
+        self.doc_bytes += _doc_bytes(doc)
+        self._count(doc.hashes, 1)
+        self.timestamps[row] = timestamp
+        self._weigh(row)
+        self._maybe_refresh()
+
+    def _remove_row(self, row: int) -> None:
+        doc = self.docs[row]
+        self._count(doc.hashes, -1)
+        self.doc_bytes -= _doc_bytes(doc)
+        del self.rows[doc.thread_id]
+        self.threads_by_email.pop(doc.email_id, None)
+        last = len(self.docs) - 1
+        if row != last:
+            moved = self.docs[last]
+            self.docs[row] = moved
+            self.rows[moved.thread_id] = row
+            self.matrix[row] = self.matrix[last]
+            self.timestamps[row] = self.timestamps[last]
+        self.docs.pop()
+
+    def remove_email(self, email_id: str) -> None:
+        """Drop the thread an email was indexed under."""
+        thread_id = self.threads_by_email.get(email_id)
+        if thread_id is not None:
+            self._remove_row(self.rows[thread_id])
+
+    def search(self, query: str, k: int, since: Optional[float] = None) -> List[SearchHit]:
+        """
+        Top-k threads by cosine similarity, optionally only those dated after ``since``.
+
+        The hashed matrix picks ``RERANK_FACTOR * k`` candidates; those are
+        ranked by their exact TF-IDF cosine.
+        """
+        import numpy as np
+
+        size = len(self.docs)
+        hashes, tf = term_counts(terms(query))
+        if not size or not len(hashes):
+            return []
+        idf = self._idf(hashes)
+        weights = tf * idf
+        scores = self.matrix[:size] @ self._hashed_row(hashes, weights)
+        if since is not None:
+            scores[self.timestamps[:size] < since] = -np.inf
+        candidates = min(size, max(k * RERANK_FACTOR, _MIN_CANDIDATES))
+        top = np.argpartition(-scores, candidates - 1)[:candidates]
+        top = top[scores[top] > -np.inf]
+        if not len(top):
+            return []
+        # Exact cosine of the candidates, vectorized over their concatenated
+        # terms: sum over shared terms of (tf_doc * idf) * (tf_query * idf)
+        docs = [self.docs[row] for row in top.tolist()]
+        owners = np.repeat(np.arange(len(docs)), [len(d.hashes) for d in docs])
+        doc_hashes = np.concatenate([d.hashes for d in docs])
+        doc_tf = np.concatenate([d.tf for d in docs])
+        order = np.argsort(hashes)
+        sorted_hashes, query_weights = hashes[order], (weights * idf)[order]
+        positions = np.minimum(np.searchsorted(sorted_hashes, doc_hashes), len(sorted_hashes) - 1)
+        shared = sorted_hashes[positions] == doc_hashes
+        dots = np.bincount(owners[shared], weights=doc_tf[shared] * query_weights[positions[shared]], minlength=len(docs))
+        exact = dots / (np.array([d.norm for d in docs]) * float(np.linalg.norm(weights)))
+        best = np.argsort(-exact, kind="stable")[:k]
+        return [
+            SearchHit(docs[i].email_id, docs[i].thread_id, docs[i].sender, docs[i].subject, docs[i].summary,
+                      float(self.timestamps[top[i]]), float(exact[i]))
+            for i in best.tolist() if exact[i] > _MIN_SCORE
+        ]
+
+
+def message_timestamp(headers: Dict[str, str]) -> float:
+    """Unix time of a message from its ``Date`` header (now if missing or malformed)."""
+    try:
+        return parsedate_to_datetime(headers['date']).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return time.time()
+
+
+class VectorIndex:
+    """Per-user registry of :class:`UserVectorIndex` instances, bounded by idle time and memory."""
+
+    def __init__(self, dims: int, max_docs: int, idle_ttl: float, max_bytes: int, sweep_interval: float = 60.0):
+        self.dims = dims
+        self.max_docs = max_docs
+        self.idle_ttl = idle_ttl
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        self._indexes: "OrderedDict[str, UserVectorIndex]" = OrderedDict()
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+        self._evicted_idle = 0
+        self._evicted_memory = 0
+
+    # Internal helpers (caller holds the registry lock)
+
+    def _remove(self, user_email: str) -> None:
+        self._indexes.pop(user_email, None)
+        self._locks.pop(user_email, None)
+
+    def _enforce_limits(self, keep: str) -> None:
+        now = time.monotonic()
+        if now - self._last_sweep >= self.sweep_interval:
+            self._last_sweep = now
+            expired = [u for u, i in self._indexes.items() if now - i.last_access > self.idle_ttl]
+            for user_email in expired:
+                self._remove(user_email)
+            self._evicted_idle += len(expired)
+
+        # Sizes are read without the users' locks; an estimate is enough here
+        total = sum(i.nbytes for i in self._indexes.values())
+        while total > self.max_bytes and len(self._indexes) > 1:
+            oldest = next(iter(self._indexes))
+            if oldest == keep:
+                self._indexes.move_to_end(keep)
+                oldest = next(iter(self._indexes))
+            total -= self._indexes[oldest].nbytes
+            self._remove(oldest)
+            self._evicted_memory += 1
+
+    def _user(self, user_email: str, create: bool = False) -> Tuple[Optional[UserVectorIndex], Optional[threading.Lock]]:
+        with self._lock:
+            index = self._indexes.get(user_email)
+            now = time.monotonic()
+            if index is not None and now - index.last_access > self.idle_ttl:
+                self._remove(user_email)
+                self._evicted_idle += 1
+                index = None
+            if index is None:
+                if not create:
+                    return None, None
+                index = self._indexes[user_email] = UserVectorIndex(self.dims, self.max_docs)
+                self._locks[user_email] = threading.Lock()
+            else:
+                self._indexes.move_to_end(user_email)
+            index.last_access = now
+            return index, self._locks[user_email]
+
+    def upsert(
+        self,
+        user_email: str,
+        email_id: str,
+        thread_id: str,
+        sender: str,
+        subject: str,
+        summary: str,
+        body: str = "",
+        timestamp: Optional[float] = None
+    ) -> None:
+        """
+        Index (or re-index) a summarized thread.
+
+        Args:
+            user_email: Owner of the thread
+            email_id: Message search hits point at (the thread's newest)
+            thread_id: Gmail thread ID; a thread has one entry
+            sender: Sender of ``email_id``
+            subject: Thread subject
+            summary: The thread's summary
+            body: Normalized body text of its messages
+            timestamp: Unix time of ``email_id`` (for date filters)
+        """
+        name, address = parseaddr(sender)
+        # Subject and summary are repeated so they outweigh body text
+        text = " ".join((subject, subject, summary, summary, name, address.replace("@", " "), body[:_MAX_BODY_CHARS]))
+        hashes, tf = term_counts(terms(text))
+        doc = _Document(email_id, thread_id, sender, subject, summary, hashes, tf)
+        index, lock = self._user(user_email, create=True)
+        with lock:
+            index.upsert(doc, timestamp if timestamp is not None else time.time())
+        with self._lock:
+            self._enforce_limits(keep=user_email)
+
+    def upsert_thread(self, user_email: str, thread_id: str, messages: Sequence, shown, summary: str) -> None:
+        """
+        Index a parsed thread (``ThreadMessage`` objects, oldest first) under its shown message.
+        """
+        body = "\n".join(normalize_body(m.body, record=False).text for m in reversed(messages))
+        self.upsert(user_email, shown.id, thread_id, shown.sender, shown.subject, summary, body,
+                    message_timestamp(shown.headers))
+
+    def has_thread(self, user_email: str, thread_id: str) -> bool:
+        index, _ = self._user(user_email)
+        return index is not None and thread_id in index.rows
+
+    def search(self, user_email: str, query: str, k: int = 5, since: Optional[float] = None) -> List[SearchHit]:
+        """
+        Threads most similar to a free-text query, best first.
+
+        Args:
+            user_email: Whose index to search
+            query: Free text ("invoice from acme")
+            k: Most hits to return
+            since: Only threads whose message is newer than this Unix time
+
+        Returns:
+            Hits above the noise floor (empty if the user has nothing indexed)
+        """
+        index, lock = self._user(user_email)
+        if index is None:
+            return []
+        with lock:
+            return index.search(query, k, since)
+
+    def remove(self, user_email: str, email_id: str) -> None:
+        """Remove the thread indexed under a message (e.g. after it was trashed)."""
+        index, lock = self._user(user_email)
+        if index is not None:
+            with lock:
+                index.remove_email(email_id)
+
+    def drop(self, user_email: str) -> None:
+        """Forget everything indexed for a user."""
+        with self._lock:
+            self._remove(user_email)
+
+    def stats(self) -> dict:
+        with self._lock:
+            indexes = list(self._indexes.values())
+            evicted_idle, evicted_memory = self._evicted_idle, self._evicted_memory
+        return {
+            "users": len(indexes),
+            "threads": sum(len(i) for i in indexes),
+            "matrix_bytes": sum(i.matrix.nbytes for i in indexes),
+            "estimated_bytes": sum(i.nbytes for i in indexes),
+            "max_bytes": self.max_bytes,
+            "evicted_idle": evicted_idle,
+            "evicted_memory": evicted_memory,
+        }
+
+
+# Singleton instance
+vector_index = VectorIndex(
+    settings.vector_index_dims,
+    settings.vector_index_max_docs,
+    idle_ttl=settings.vector_index_idle_ttl_seconds,
+    max_bytes=settings.vector_index_max_bytes
+)
@@ -1,82 +1,155 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, Header, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from utils.jwt_handler import verify_token
-from models.user import TokenData, UserProfile
+from utils.jwt_handler import verify_token_cached
+from app.config import get_settings
+from models.user import GoogleTokens, UserProfile
 from services.auth_service import auth_service
+from services.state_backend import run_state_call
+from utils.request_context import current_user_email
 from typing import Optional
+import hmac
 
 security = HTTPBearer()
 
 
-async def get_current_user(
+class AuthContext:
+    """Everything auth resolves for one request: claims, profile and Google tokens."""
+
+    __slots__ = ("payload", "user", "google_tokens")
+
+    def __init__(self, payload: dict, user: UserProfile, google_tokens: Optional[GoogleTokens]):
+        self.payload = payload
+        self.user = user
+        self.google_tokens = google_tokens
+
+
+def resolve_session(token: str) -> Optional[dict]:
+    """
+    Verify a JWT and return the matching user session.
+
+    Used where HTTP dependencies don't apply (e.g. WebSocket handshakes).
+
+    Args:
+        token: JWT token string
+
+    Returns:
+        Session dict with ``profile`` and ``google_tokens``, or None if invalid
+    """
+    payload = verify_token_cached(token)
+    if payload is None or payload.get("sub") is None:
+        return None
+    return auth_service.get_user_session(payload["sub"])
+
+
+def token_expiry(token: str) -> Optional[float]:
+    """Unix time a valid JWT expires at (None if invalid or without ``exp``)."""
+    payload = verify_token_cached(token)
+    expires_at = payload.get("exp") if payload is not None else None
+    return float(expires_at) if expires_at is not None else None
+
+
+async def get_auth_context(
     credentials: HTTPAuthorizationCredentials = Depends(security)
-) -> UserProfile:
+) -> AuthContext:
     """
-    Dependency to get the current authenticated user from JWT token.
-    
+    Dependency resolving the bearer token, session and Google tokens once.
+
+    FastAPI caches dependency results per request, so ``get_current_user``
+    and ``get_google_credentials`` share this single resolution.
+
     Args:
         credentials: HTTP Bearer token from request header
-        
+
     Returns:
-        UserProfile object
-        
+        AuthContext for the request
+
     Raises:
         HTTPException: If token is invalid or user not found
     """
     token = credentials.credentials
-    
-    # Verify JWT token
-    payload = verify_token(token)
+
+    # Verify JWT token (cached until it expires)
+    payload = verify_token_cached(token)
     if payload is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid authentication credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    
+
     # Extract user data from token
     email: str = payload.get("sub")
-    google_id: str = payload.get("google_id")
-    
+
     if email is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid token payload",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    
-    # Get user session
-    session = auth_service.get_user_session(email)
+
+    # Get user session (single lookup per request)
+    session = await run_state_call(auth_service.get_user_session, email)
     if session is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Session expired. Please login again.",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    
-    return session['profile']
+
+    # Label logs and metrics emitted while serving this request
+    current_user_email.set(email)
+
+    return AuthContext(payload, session['profile'], session.get('google_tokens'))
+
+
+async def get_current_user(
+    context: AuthContext = Depends(get_auth_context)
+) -> UserProfile:
+    """
+    Dependency to get the current authenticated user from JWT token.
+
+    Args:
+        context: Request-scoped auth context
+
+    Returns:
+        UserProfile object
+    """
+    return context.user
 
 
 async def get_google_credentials(
-    current_user: UserProfile = Depends(get_current_user)
-) -> dict:
+    context: AuthContext = Depends(get_auth_context)
+) -> GoogleTokens:
     """
     Dependency to get Google OAuth credentials for the current user.
-    
+
     Args:
-        current_user: Current authenticated user
-        
+        context: Request-scoped auth context
+
     Returns:
-        Dictionary containing Google tokens
-        
+        GoogleTokens for the user
+
     Raises:
         HTTPException: If credentials not found
     """
-    session = auth_service.get_user_session(current_user.email)
-    if session is None or 'google_tokens' not in session:
+    if context.google_tokens is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Google credentials not found. Please re-authenticate.",
         )
-    
-    return session['google_tokens']
+
+    return context.google_tokens
+
+
+async def require_admin(x_admin_token: Optional[str] = Header(None)) -> None:
+    """
+    Dependency guarding admin endpoints with the ``X-Admin-Token`` header.
+
+    Raises:
+        HTTPException: 404 if no admin token is configured, 403 if it doesn't match
+    """
+    admin_token = get_settings().admin_token
+    if not admin_token:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if x_admin_token is None or not hmac.compare_digest(x_admin_token, admin_token):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid admin token")
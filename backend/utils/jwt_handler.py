@@ -1,7 +1,11 @@
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Dict, Optional, Set, Tuple
+from collections import OrderedDict
 from jose import JWTError, jwt
 from app.config import get_settings
+from utils.metrics import record_cache
+import threading
+import time
 
 settings = get_settings()
 
@@ -45,3 +49,89 @@ def verify_token(token: str) -> Optional[dict]:
         return payload
     except JWTError:
         return None
+
+
+class VerifiedTokenCache:
+    """
+    Bounded LRU of already verified tokens, each kept until its ``exp``.
+
+    Saves the JWT decode and HMAC check on repeat requests. Entries are
+    indexed by subject so logout can evict a user's tokens immediately.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[dict, float]]" = OrderedDict()
+        self._by_subject: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                self.misses += 1
+                record_cache("verified_tokens", False)
+                return None
+            payload, expires_at = entry
+            if expires_at <= time.time():
+                self._discard(token)
+                self.misses += 1
+                record_cache("verified_tokens", False)
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            record_cache("verified_tokens", True)
+            return payload
+
+    def put(self, token: str, payload: dict) -> None:
+        expires_at = payload.get("exp")
+        if expires_at is None:
+            return
+        with self._lock:
+            self._entries[token] = (payload, float(expires_at))
+            self._entries.move_to_end(token)
+            self._by_subject.setdefault(payload.get("sub"), set()).add(token)
+            while len(self._entries) > self.max_size:
+                self._discard(next(iter(self._entries)))
+
+    def _discard(self, token: str) -> None:
+        entry = self._entries.pop(token, None)
+        if entry is not None:
+            subject = entry[0].get("sub")
+            tokens = self._by_subject.get(subject)
+            if tokens is not None:
+                tokens.discard(token)
+                if not tokens:
+                    del self._by_subject[subject]
+
+    def invalidate_subject(self, subject: str) -> None:
+        """Drop every cached token for a user (called on logout)."""
+        with self._lock:
+            for token in list(self._by_subject.get(subject, ())):
+                self._discard(token)
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+verified_tokens = VerifiedTokenCache(settings.token_cache_size)
+
+
+def verify_token_cached(token: str) -> Optional[dict]:
+    """
+    Verify a JWT token, reusing a previous successful verification.
+    
+    Args:
+        token: JWT token string
+        
+    Returns:
+        Decoded token payload or None if invalid
+    """
+    payload = verified_tokens.get(token)
+    if payload is None:
+        payload = verify_token(token)
+        if payload is not None:
+            verified_tokens.put(token, payload)
+    return payload
@@ -1,15 +1,31 @@
+"""
+Logging pipeline.
+
+Application threads only enqueue records (``QueueHandler``); a background
+``QueueListener`` thread formats them and writes to stdout, so slow stdout
+never blocks the event loop or Gmail/LLM worker threads. Records are
+emitted as one JSON object per line carrying the request ID, user and
+trace ID of the request that produced them.
+
+Call sites should log with ``%``-style arguments (``logger.info("x %s", y)``)
+so messages are only built for records that are actually emitted. High-volume
+success logs (``gmail``, ``ai`` and the Groq client's ``httpx`` request lines)
+are sampled per request.
+"""
+from typing import Optional
+import atexit
+import json
 import logging
+import logging.handlers
+import queue
 import sys
-from datetime import datetime
+import zlib
+from datetime import datetime, timezone
+from opentelemetry import trace
+from utils.request_context import current_request_id, current_user_email
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+# Loggers whose INFO-and-below records are sampled
+SAMPLED_LOGGERS = ("gmail", "ai", "httpx")
 
 # Create loggers for different components
 auth_logger = logging.getLogger('auth')
@@ -17,32 +33,123 @@ gmail_logger = logging.getLogger('gmail')
 ai_logger = logging.getLogger('ai')
 api_logger = logging.getLogger('api')
 
-def log_auth_attempt(email: str):
-    auth_logger.info(f"Authentication attempt for user: {email}")
+_listener: Optional[logging.handlers.QueueListener] = None
 
-def log_auth_success(email: str):
-    auth_logger.info(f"Authentication successful for user: {email}")
 
-def log_auth_failure(email: str, error: str):
-    auth_logger.error(f"Authentication failed for user: {email} - Error: {error}")
+class JsonFormatter(logging.Formatter):
+    """Render a record as a single-line JSON object."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for field in ("request_id", "user", "trace_id", "span_id"):
+            value = getattr(record, field, None)
+            if value:
+                entry[field] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class _ContextQueueHandler(logging.handlers.QueueHandler):
+    """
+    Enqueue records with the caller's correlation IDs attached.
+
+    Unlike the stock handler, the message is not formatted here: ``msg`` and
+    ``args`` are merged by the listener thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.request_id = current_request_id.get()
+        record.user = current_user_email.get()
+        span_context = trace.get_current_span().get_span_context()
+        if span_context.is_valid:
+            record.trace_id = format(span_context.trace_id, "032x")
+            record.span_id = format(span_context.span_id, "016x")
+        if record.exc_info:
+            # Render now, while the frames' locals still match the failure
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class SuccessSampler(logging.Filter):
+    """
+    Keep a fraction of INFO/DEBUG records from high-volume loggers.
 
-def log_gmail_call(action: str, email: str):
-    gmail_logger.info(f"Gmail API call - Action: {action}, User: {email}")
+    The decision is derived from the request ID, so a request's lines are
+    kept or dropped together. Warnings and errors always pass.
+    """
 
-def log_gmail_success(action: str, email: str):
-    gmail_logger.info(f"Gmail API success - Action: {action}, User: {email}")
+    def __init__(self, rate: float, loggers=SAMPLED_LOGGERS):
+        super().__init__()
+        self.threshold = int(max(0.0, min(1.0, rate)) * 0xFFFFFFFF)
+        self.loggers = tuple(loggers)
 
-def log_gmail_error(action: str, email: str, error: str):
-    gmail_logger.error(f"Gmail API error - Action: {action}, User: {email}, Error: {error}")
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not record.name.startswith(self.loggers):
+            return True
+        request_id = current_request_id.get()
+        if request_id is None:
+            return True
+        return zlib.crc32(request_id.encode()) <= self.threshold
 
-def log_ai_call(operation: str, user: str):
-    ai_logger.info(f"AI API call - Operation: {operation}, User: {user}")
 
-def log_ai_success(operation: str, user: str):
-    ai_logger.info(f"AI API success - Operation: {operation}, User: {user}")
+def setup_logging(level: str = "INFO", json_format: bool = True, success_sample_rate: float = 1.0) -> None:
+    """
+    Route the root logger through a queue to a background stdout writer.
 
-def log_ai_error(operation: str, user: str, error: str):
-    ai_logger.error(f"AI API error - Operation: {operation}, User: {user}, Error: {error}")
+    Args:
+        level: Root log level name
+        json_format: Emit JSON lines (otherwise a plain text format)
+        success_sample_rate: Fraction of requests whose sampled INFO logs are kept
+    """
+    global _listener
+    if _listener is not None:
+        return
 
-def log_ai_retry(operation: str, attempt: int):
-    ai_logger.warning(f"AI API retry - Operation: {operation}, Attempt: {attempt}")
+    stream_handler = logging.StreamHandler(sys.stdout)
+    if json_format:
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+
+    queue_handler = _ContextQueueHandler(queue.SimpleQueue())
+    if success_sample_rate < 1.0:
+        queue_handler.addFilter(SuccessSampler(success_sample_rate))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level.upper())
+    # Logged on every Gmail client build; irrelevant without oauth2client
+    logging.getLogger("googleapiclient.discovery_cache").setLevel(logging.ERROR)
+
+    _listener = logging.handlers.QueueListener(queue_handler.queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """Drain queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def log_auth_attempt(email: str):
+    auth_logger.info("Authentication attempt for user: %s", email)
+
+def log_auth_success(email: str):
+    auth_logger.info("Authentication successful for user: %s", email)
+
+def log_auth_failure(email: str, error: str):
+    auth_logger.error("Authentication failed for user: %s - Error: %s", email, error)
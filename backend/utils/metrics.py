@@ -0,0 +1,275 @@
+"""
+Lightweight in-process metrics rendered in the Prometheus text format.
+
+Metric updates are a dict lookup plus a locked add, cheap enough to leave
+on in production. ``track()`` is the instrumentation hook for every Gmail
+and LLM call: it times the call, maintains the in-flight gauge, counts
+errors, writes the log line and opens a client span.
+"""
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+import logging
+import threading
+import time
+from opentelemetry.trace import SpanKind
+from utils.tracing import tracer
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_loggers = {
+    "gmail": logging.getLogger("gmail"),
+    "llm": logging.getLogger("ai"),
+}
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # Per label set: [bucket counts..., +Inf count, sum]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for key, series in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                le_label = 'le="' + le + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le_label)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {series[-1]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], None]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        """Register a callback that refreshes gauges right before rendering."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self._collectors:
+            collector()
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+HTTP_REQUEST_DURATION = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "route", "status")
+))
+OPERATION_DURATION = registry.register(Histogram(
+    "operation_duration_seconds", "Gmail and LLM call latency", ("service", "operation", "outcome")
+))
+OPERATIONS_IN_FLIGHT = registry.register(Gauge(
+    "operations_in_flight", "Gmail and LLM calls currently running", ("service",)
+))
+OPERATION_ERRORS = registry.register(Counter(
+    "operation_errors_total", "Failed Gmail and LLM calls", ("service", "operation")
+))
+OPERATION_RETRIES = registry.register(Counter(
+    "operation_retries_total", "Retried Gmail and LLM calls", ("service", "operation")
+))
+LLM_TOKENS = registry.register(Counter(
+    "llm_tokens_total", "LLM tokens by operation, model and kind (prompt/completion)", ("operation", "model", "kind")
+))
+LLM_ADMISSIONS = registry.register(Counter(
+    "llm_admissions_total", "LLM admission decisions (full/degraded/denied) by operation", ("operation", "decision")
+))
+CACHE_REQUESTS = registry.register(Counter(
+    "cache_requests_total", "Cache lookups by cache and result (hit/miss)", ("cache", "result")
+))
+BODY_BYTES = registry.register(Counter(
+    "email_body_bytes_total", "Email body bytes given to the normalizer (stage=input) and removed per stage", ("stage",)
+))
+STATE_GAUGE = registry.register(Gauge(
+    "app_state", "Sizes of in-process state (conversations, caches, coalescing)", ("component", "field")
+))
+
+
+@contextmanager
+def track(service: str, operation: str) -> Iterator[None]:
+    """
+    Instrument one external call.
+
+    Args:
+        service: ``gmail`` or ``llm``
+        operation: Operation name, e.g. ``fetch_recent_emails``
+    """
+    logger = _loggers.get(service) or logging.getLogger(service)
+    OPERATIONS_IN_FLIGHT.inc(service=service)
+    start = time.perf_counter()
+    try:
+        with tracer.start_as_current_span(f"{service}.{operation}", kind=SpanKind.CLIENT) as span:
+            span.set_attribute("service", service)
+            span.set_attribute("operation", operation)
+            yield
+    except Exception as e:
+        elapsed = time.perf_counter() - start
+        OPERATION_DURATION.observe(elapsed, service=service, operation=operation, outcome="error")
+        OPERATION_ERRORS.inc(service=service, operation=operation)
+        logger.error("%s %s failed after %.0f ms: %s", service, operation, elapsed * 1000, e)
+        raise
+    else:
+        elapsed = time.perf_counter() - start
+        OPERATION_DURATION.observe(elapsed, service=service, operation=operation, outcome="ok")
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("%s %s ok in %.0f ms", service, operation, elapsed * 1000)
+    finally:
+        OPERATIONS_IN_FLIGHT.dec(service=service)
+
+
+def record_error(service: str, operation: str, error: Exception) -> None:
+    """Count an error that was handled without raising out of ``track()``."""
+    OPERATION_ERRORS.inc(service=service, operation=operation)
+    (_loggers.get(service) or logging.getLogger(service)).error(
+        "%s %s error: %s", service, operation, error
+    )
+
+
+def record_retry(service: str, operation: str, attempt: int) -> None:
+    OPERATION_RETRIES.inc(service=service, operation=operation)
+    (_loggers.get(service) or logging.getLogger(service)).warning(
+        "%s %s retry, attempt %d", service, operation, attempt
+    )
+
+
+def record_llm_usage(operation: str, model: str, usage) -> None:
+    """Count prompt/completion tokens from a Groq ``usage`` object (if present)."""
+    if usage is None:
+        return
+    LLM_TOKENS.inc(getattr(usage, "prompt_tokens", 0) or 0, operation=operation, model=model, kind="prompt")
+    LLM_TOKENS.inc(getattr(usage, "completion_tokens", 0) or 0, operation=operation, model=model, kind="completion")
+
+
+def record_admission(operation: str, decision: str) -> None:
+    LLM_ADMISSIONS.inc(operation=operation, decision=decision)
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def record_body_normalization(original_bytes: int, removed: Dict[str, int]) -> None:
+    BODY_BYTES.inc(original_bytes, stage="input")
+    for stage, count in removed.items():
+        if count:
+            BODY_BYTES.inc(count, stage=stage)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware timing every HTTP request by route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            HTTP_REQUEST_DURATION.observe(
+                time.perf_counter() - start,
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=status_code
+            )
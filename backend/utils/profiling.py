@@ -0,0 +1,252 @@
+"""
+On-demand sampling profiler for slow requests.
+
+A single background thread samples the stacks of every busy thread
+(``sys._current_frames()``) while at least one profiled request is running.
+Each request collects the samples taken during its lifetime, so work done in
+threadpool and Gmail worker threads is included, which cProfile (one thread
+only) would miss. Under concurrency a profile also contains other requests'
+stacks; profile in isolation or with the header trigger for clean results.
+
+Profiles are saved as JSON (metadata plus collapsed ``a;b;c count`` stacks,
+loadable by speedscope / flamegraph.pl) in ``settings.profiling_dir``.
+
+The middleware is only installed when profiling is enabled, so a disabled
+profiler costs nothing.
+"""
+from collections import Counter
+from datetime import datetime, timezone
+from typing import List, Optional, Set
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from starlette.concurrency import run_in_threadpool
+from app.config import get_settings
+from utils.request_context import current_user_email
+
+settings = get_settings()
+
+logger = logging.getLogger("profiling")
+
+PROFILE_HEADER = b"x-profile"
+
+# Innermost frames of threads that are parked rather than working
+_IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    # Blocked inside C code: uvloop's run loop, SimpleQueue.get
+    ("runners.py", "run"),
+    ("handlers.py", "dequeue"),
+    ("thread.py", "_worker"),
+}
+
+
+def _is_idle(frame) -> bool:
+    code = frame.f_code
+    return (os.path.basename(code.co_filename), code.co_name) in _IDLE_FRAMES
+
+
+def _collapse(frame, max_depth: int = 128) -> str:
+    """Render a stack root-first as ``module:function;...``."""
+    parts: List[str] = []
+    while frame is not None and len(parts) < max_depth:
+        code = frame.f_code
+        parts.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+
+class _Session:
+    __slots__ = ("stacks", "samples")
+
+    def __init__(self):
+        self.stacks: Counter = Counter()
+        self.samples = 0
+
+
+class StackSampler:
+    """Process-wide stack sampler feeding every active profiling session."""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self._sessions: Set[_Session] = set()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def start_session(self) -> _Session:
+        session = _Session()
+        with self._lock:
+            self._sessions.add(session)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+                self._thread.start()
+        return session
+
+    def stop_session(self, session: _Session) -> None:
+        with self._lock:
+            self._sessions.discard(session)
+
+    def _run(self) -> None:
+        own_ident = threading.get_ident()
+        while True:
+            stacks = [
+                _collapse(frame)
+                for ident, frame in sys._current_frames().items()
+                if ident != own_ident and not _is_idle(frame)
+            ]
+            with self._lock:
+                if not self._sessions:
+                    # Exit when idle; the next session restarts the thread
+                    self._thread = None
+                    return
+                for session in self._sessions:
+                    session.samples += 1
+                    session.stacks.update(stacks)
+            time.sleep(self.interval)
+
+
+class ProfileStore:
+    """Profiles saved as JSON files in one directory."""
+
+    def __init__(self, directory: str, max_profiles: int = 200):
+        self.directory = directory
+        self.max_profiles = max_profiles
+
+    def save(self, meta: dict, stacks: Counter) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        route_tag = re.sub(r"[^A-Za-z0-9]+", "-", meta["route"]).strip("-") or "root"
+        name = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S}_{route_tag}_{uuid.uuid4().hex[:6]}"
+        document = dict(meta, name=name, stacks=dict(stacks.most_common()))
+        with open(os.path.join(self.directory, name + ".json"), "w", encoding="utf-8") as f:
+            json.dump(document, f)
+        self._prune()
+        return name
+
+    def _paths(self) -> List[str]:
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(
+            (os.path.join(self.directory, n) for n in os.listdir(self.directory) if n.endswith(".json")),
+            reverse=True
+        )
+
+    def _prune(self) -> None:
+        for path in self._paths()[self.max_profiles:]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def list(self, route: Optional[str] = None, user: Optional[str] = None) -> List[dict]:
+        """Metadata of saved profiles, newest first."""
+        entries = []
+        for path in self._paths():
+            try:
+                with open(path, encoding="utf-8") as f:
+                    document = json.load(f)
+            except (OSError, ValueError):
+                continue
+            document.pop("stacks", None)
+            if route and document.get("route") != route:
+                continue
+            if user and document.get("user") != user:
+                continue
+            entries.append(document)
+        return entries
+
+    def load(self, name: str) -> Optional[dict]:
+        if not re.fullmatch(r"[A-Za-z0-9_-]+", name):
+            return None
+        try:
+            with open(os.path.join(self.directory, name + ".json"), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+
+def user_tag(email: Optional[str]) -> Optional[str]:
+    """Stable, non-reversible tag for the profiled user."""
+    if not email:
+        return None
+    return hashlib.sha256(email.lower().encode()).hexdigest()[:12]
+
+
+class ProfilingMiddleware:
+    """
+    Pure ASGI middleware sampling requests and saving the slow ones.
+
+    Modes:
+        ``threshold``: every request is sampled; profiles of requests slower
+            than ``threshold_ms`` are saved
+        ``header``: only requests sending ``X-Profile: <admin token>`` are
+            sampled, and always saved
+    """
+
+    def __init__(self, app, store: ProfileStore, sampler: StackSampler, mode: str, threshold_ms: float, admin_token: Optional[str]):
+        self.app = app
+        self.store = store
+        self.sampler = sampler
+        self.mode = mode
+        self.threshold = threshold_ms / 1000
+        self.admin_token = admin_token.encode() if admin_token else None
+
+    def _requested(self, scope) -> bool:
+        if self.admin_token is None:
+            return False
+        return any(k == PROFILE_HEADER and v == self.admin_token for k, v in scope.get("headers", ()))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        forced = self._requested(scope)
+        if self.mode != "threshold" and not forced:
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        session = self.sampler.start_session()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.sampler.stop_session(session)
+            if forced or elapsed >= self.threshold:
+                route = getattr(scope.get("route"), "path", scope.get("path", ""))
+                meta = {
+                    "created": datetime.now(timezone.utc).isoformat(),
+                    "method": scope["method"],
+                    "route": route,
+                    "user": user_tag(current_user_email.get()),
+                    "status": status_code,
+                    "duration_ms": round(elapsed * 1000, 1),
+                    "samples": session.samples,
+                    "interval_ms": self.sampler.interval * 1000,
+                    "trigger": "header" if forced else "threshold",
+                }
+                try:
+                    name = await run_in_threadpool(self.store.save, meta, session.stacks)
+                    logger.info("Saved profile %s (%s %s, %.0f ms)", name, meta["method"], route, meta["duration_ms"])
+                except OSError as e:
+                    logger.warning("Could not save profile: %s", e)
+
+
+# Singleton instances
+profile_store = ProfileStore(settings.profiling_dir)
+stack_sampler = StackSampler(settings.profiling_interval_ms / 1000)
@@ -0,0 +1,54 @@
+from contextvars import ContextVar
+from typing import Optional
+import uuid
+
+REQUEST_ID_HEADER = b"x-request-id"
+
+# Identity of the request being served. Set by the auth dependency / WebSocket
+# handshake and read by instrumentation; propagates into threadpool calls.
+current_user_email: ContextVar[Optional[str]] = ContextVar("current_user_email", default=None)
+
+# Correlation ID of the request being served (see RequestContextMiddleware).
+current_request_id: ContextVar[Optional[str]] = ContextVar("current_request_id", default=None)
+
+
+def _incoming_request_id(scope) -> Optional[str]:
+    for name, value in scope.get("headers", ()):
+        if name == REQUEST_ID_HEADER:
+            value = value.decode("latin-1").strip()
+            # Accept caller-supplied IDs only if they are short and printable
+            if 0 < len(value) <= 128 and value.isprintable():
+                return value
+    return None
+
+
+class RequestContextMiddleware:
+    """
+    Pure ASGI middleware assigning a correlation ID to every request.
+
+    Reuses an incoming ``X-Request-ID`` header when present, otherwise
+    generates one, and echoes it on HTTP responses. WebSocket connections get
+    one ID for their lifetime.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        request_id = _incoming_request_id(scope) or uuid.uuid4().hex
+        token = current_request_id.set(request_id)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(REQUEST_ID_HEADER, request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_request_id.reset(token)
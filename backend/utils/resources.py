@@ -0,0 +1,211 @@
+"""
+Process-wide resources owned by the application lifespan.
+
+- ``executor``: shared thread pool for per-message Gmail/LLM work (replaces a
+  pool created and torn down on every inbox fetch). Each user (the
+  ``current_user_email`` of the submitter) runs at most ``per_user_jobs`` jobs
+  on it at a time; the rest wait in a per-user queue without holding a
+  thread, so one user's backlog (e.g. calls waiting out a Gmail rate limit)
+  can't take every worker
+- ``http_client``: pooled ``httpx.Client`` used by the Groq SDK
+- background tasks (e.g. coalesced fetches whose callers went away) are
+  tracked so shutdown can let them finish
+
+``start()`` runs at startup; ``shutdown()`` waits for in-flight jobs until the
+drain deadline, then cancels what is left and closes the pools. Resources are
+also created on first use, so scripts that call services without running the
+app keep working.
+"""
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+from app.config import get_settings
+from utils.request_context import current_user_email
+
+settings = get_settings()
+
+logger = logging.getLogger("api")
+
+
+class _UserJobs:
+    """A user's jobs on the shared executor: how many run, and those waiting for a slot."""
+
+    __slots__ = ("running", "pending")
+
+    def __init__(self):
+        self.running = 0
+        self.pending: Deque[Tuple[Future, contextvars.Context, Callable[..., Any], tuple]] = deque()
+
+
+class ResourceManager:
+    def __init__(self, worker_threads: int, http_max_connections: int, http_timeout: float, per_user_jobs: int = 0):
+        self.worker_threads = worker_threads
+        self.http_max_connections = http_max_connections
+        self.http_timeout = http_timeout
+        self.per_user_jobs = per_user_jobs  # 0 disables the per-user cap
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._http_client = None
+        self._lock = threading.Lock()
+        self._futures: Set[Future] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self._users: Dict[str, _UserJobs] = {}
+
+    def start(self) -> None:
+        """Create the pools eagerly (called from the lifespan)."""
+        self.executor
+        self.http_client
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.worker_threads, thread_name_prefix="email-worker"
+                    )
+        return self._executor
+
+    @property
+    def http_client(self):
+        """Shared ``httpx.Client`` with a bounded keep-alive pool."""
+        if self._http_client is None:
+            with self._lock:
+                if self._http_client is None:
+                    import httpx
+
+                    self._http_client = httpx.Client(
+                        timeout=httpx.Timeout(self.http_timeout, connect=5.0),
+                        limits=httpx.Limits(
+                            max_connections=self.http_max_connections,
+                            max_keepalive_connections=self.http_max_connections
+                        )
+                    )
+        return self._http_client
+
+    def submit(self, fn: Callable[..., Any], *args) -> Future:
+        """
+        Run ``fn(*args)`` on the shared executor in a copy of the caller's context.
+
+        A job beyond the user's ``per_user_jobs`` waits until one of their
+        jobs finishes; jobs must not wait on later jobs of the same user.
+        """
+        ctx = contextvars.copy_context()
+        user = current_user_email.get()
+        if user is None or self.per_user_jobs <= 0:
+            future = self.executor.submit(ctx.run, fn, *args)
+        else:
+            future = Future()
+            with self._lock:
+                jobs = self._users.get(user)
+                if jobs is None:
+                    jobs = self._users[user] = _UserJobs()
+                if jobs.running >= self.per_user_jobs:
+                    jobs.pending.append((future, ctx, fn, args))
+                    self._futures.add(future)
+                    future.add_done_callback(self._forget_future)
+                    return future
+                jobs.running += 1
+            self._dispatch(user, future, ctx, fn, args)
+        with self._lock:
+            self._futures.add(future)
+        future.add_done_callback(self._forget_future)
+        return future
+
+    def _dispatch(self, user: str, future: Future, ctx: contextvars.Context, fn: Callable[..., Any], args: tuple) -> None:
+        """Run one of a user's jobs (its slot is taken) and start their next one when it ends."""
+        def run() -> None:
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                result = ctx.run(fn, *args)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+        def release(_: Future) -> None:
+            if not future.done():
+                # Cancelled before it ran (executor shutdown)
+                future.cancel()
+            with self._lock:
+                jobs = self._users[user]
+                following = jobs.pending.popleft() if jobs.pending else None
+                if following is None:
+                    jobs.running -= 1
+                    if not jobs.running:
+                        del self._users[user]
+            if following is not None:
+                self._dispatch(user, *following)
+
+        try:
+            self.executor.submit(run).add_done_callback(release)
+        except RuntimeError as e:
+            # Executor shut down: fail this job and hand the slot on
+            future.set_exception(e)
+            release(future)
+
+    def _forget_future(self, future: Future) -> None:
+        with self._lock:
+            self._futures.discard(future)
+
+    def map(self, fn: Callable[[Any], Any], items: Iterable[Any]) -> List[Any]:
+        """Apply ``fn`` to every item on the shared executor; results in input order."""
+        futures = [self.submit(fn, item) for item in items]
+        return [future.result() for future in futures]
+
+    def track_task(self, task: asyncio.Task) -> asyncio.Task:
+        """Keep a background task alive and let shutdown wait for it."""
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def stats(self) -> dict:
+        with self._lock:
+            queued = sum(len(jobs.pending) for jobs in self._users.values())
+        return {
+            "executor_jobs": len(self._futures),
+            "executor_queued_jobs": queued,
+            "background_tasks": len(self._tasks),
+        }
+
+    async def shutdown(self, deadline: float) -> None:
+        """
+        Drain in-flight work for up to ``deadline`` seconds, then close the pools.
+
+        Args:
+            deadline: Seconds to wait for executor jobs and background tasks
+        """
+        start = time.monotonic()
+
+        with self._lock:
+            pending = [asyncio.wrap_future(f) for f in self._futures]
+        pending += list(self._tasks)
+        if pending:
+            logger.info("Draining %d in-flight jobs (deadline %.0fs)", len(pending), deadline)
+            _, still_running = await asyncio.wait(pending, timeout=deadline)
+            if still_running:
+                logger.warning("Cancelling %d jobs still running after %.0fs", len(still_running), deadline)
+                for job in still_running:
+                    job.cancel()
+
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        http_client, self._http_client = self._http_client, None
+        if http_client is not None:
+            http_client.close()
+        logger.info("Resources closed in %.0f ms", (time.monotonic() - start) * 1000)
+
+
+# Singleton instance
+resources = ResourceManager(
+    worker_threads=settings.email_worker_threads,
+    http_max_connections=settings.llm_http_max_connections,
+    http_timeout=settings.llm_http_timeout_seconds,
+    per_user_jobs=settings.email_worker_threads_per_user
+)
@@ -0,0 +1,144 @@
+"""
+Response encoding: orjson rendering and negotiated compression.
+
+Routes that declare a ``response_model`` are already serialized straight to
+JSON bytes by pydantic's core, so :class:`ORJSONResponse` is for routes that
+return plain dicts (it replaces ``jsonable_encoder`` + ``json.dumps``).
+Setting it as the app's default response class would turn that pydantic fast
+path off.
+
+:class:`CompressionMiddleware` compresses complete response bodies above a
+size threshold with brotli (when the ``brotli`` package is installed) or gzip,
+whichever the client prefers. Streamed responses pass through untouched.
+"""
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse
+from typing import Any, Dict, Optional
+from utils.serialization import dumps
+import gzip
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+# Content types worth compressing; images and archives are already compressed
+_COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "application/xml")
+
+
+class ORJSONResponse(JSONResponse):
+    """JSON response rendered with orjson (handles datetimes natively)."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def _parse_accept_encoding(header: str) -> Dict[str, float]:
+    """Map each coding in an ``Accept-Encoding`` header to its q-value."""
+    codings = {}
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        codings[coding] = q
+    return codings
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    Pick the response coding for an ``Accept-Encoding`` header.
+
+    Args:
+        accept_encoding: Raw header value
+
+    Returns:
+        ``"br"``, ``"gzip"`` or None for identity
+    """
+    codings = _parse_accept_encoding(accept_encoding)
+    wildcard = codings.get("*", 0.0)
+    candidates = (["br"] if brotli is not None else []) + ["gzip"]
+    best, best_q = None, 0.0
+    for coding in candidates:
+        q = codings.get(coding, wildcard)
+        # Ties keep the earlier candidate, so brotli wins when equally acceptable
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+class CompressionMiddleware:
+    """
+    Pure ASGI middleware compressing JSON/text bodies of at least ``minimum_size`` bytes.
+
+    Args:
+        app: Wrapped ASGI app
+        minimum_size: Smallest body (bytes) worth compressing
+        gzip_level: zlib level for gzip (1-9)
+        brotli_quality: Brotli quality (0-11); mid values are much cheaper than 11
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def compress(self, body: bytes, encoding: str) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                # Hold the headers until the first body chunk shows the size
+                start_message = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            headers = MutableHeaders(raw=start_message["headers"])
+            body = message.get("body", b"")
+            if (
+                message.get("more_body", False)
+                or len(body) < self.minimum_size
+                or "content-encoding" in headers
+                or not headers.get("content-type", "").startswith(_COMPRESSIBLE_TYPES)
+            ):
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            compressed = self.compress(body, encoding)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            headers.add_vary_header("Accept-Encoding")
+            await send(start_message)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,11 @@
+import orjson
+
+
+def dumps(value) -> bytes:
+    """Serialize a JSON-compatible value to compact bytes."""
+    return orjson.dumps(value)
+
+
+def loads(data: bytes):
+    """Deserialize bytes produced by :func:`dumps`."""
+    return orjson.loads(data)
@@ -0,0 +1,57 @@
+from starlette.concurrency import run_in_threadpool
+from typing import Any, Callable, Dict, Hashable, Tuple
+from utils.resources import resources
+import asyncio
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent identical calls into one execution.
+
+    While a call for ``key`` is in flight, later callers with the same key
+    await its result instead of starting their own. Blocking functions are run
+    in the threadpool. The shared task is shielded, so one caller going away
+    does not cancel the work for the others, and it is registered with the
+    app's resources so shutdown waits for it even if every caller is gone.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._counts: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, operation: str, field: str) -> None:
+        counts = self._counts.setdefault(operation, {"calls": 0, "executions": 0, "deduplicated": 0})
+        counts[field] += 1
+
+    async def run(self, operation: str, key: Tuple, fn: Callable[..., Any], *args) -> Any:
+        """
+        Run ``fn(*args)`` once per in-flight ``(operation, key)``.
+
+        Args:
+            operation: Operation name (also used for the counters)
+            key: Hashable arguments identifying the call (include the user)
+            fn: Blocking function to execute in the threadpool
+            args: Positional arguments for ``fn``
+
+        Returns:
+            The shared result of ``fn``
+        """
+        flight_key = (operation,) + tuple(key)
+        self._count(operation, "calls")
+        task = self._inflight.get(flight_key)
+        if task is None:
+            self._count(operation, "executions")
+            task = resources.track_task(asyncio.ensure_future(run_in_threadpool(fn, *args)))
+            self._inflight[flight_key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(flight_key, None))
+        else:
+            self._count(operation, "deduplicated")
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Per-operation call, execution and deduplication counters."""
+        return {op: dict(counts) for op, counts in self._counts.items()}
+
+
+# Singleton instance
+singleflight = SingleFlight()
@@ -0,0 +1,156 @@
+"""
+OpenTelemetry tracing.
+
+Spans are created through the OpenTelemetry API: per route (middleware),
+per Gmail/LLM call (``utils.metrics.track``), and around message processing
+and MIME parsing. Context lives in contextvars, so it follows
+``run_in_threadpool`` and any executor task started with
+``contextvars.copy_context().run``.
+
+Exporters (``TRACE_EXPORTER``):
+
+- ``none``: tracing disabled (API no-op, the default)
+- ``console``: spans printed to stdout
+- ``file``: one JSON span per line appended to ``TRACE_FILE``
+- ``otlp``: OTLP/HTTP to a collector (needs ``opentelemetry-exporter-otlp``)
+"""
+from typing import Optional, Sequence
+import json
+import logging
+import threading
+from opentelemetry import context as otel_context, propagate, trace
+from opentelemetry.trace import SpanKind, Status, StatusCode
+
+logger = logging.getLogger("tracing")
+
+tracer = trace.get_tracer("ai-email-assistant")
+
+_provider = None
+
+
+def _file_exporter(path: str):
+    from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult
+
+    class JsonLinesSpanExporter(SpanExporter):
+        """Append finished spans to a file, one compact JSON object per line."""
+
+        def __init__(self, file_path: str):
+            self._file = open(file_path, "a", encoding="utf-8")
+            self._lock = threading.Lock()
+
+        def export(self, spans: Sequence) -> "SpanExportResult":
+            lines = [json.dumps(json.loads(span.to_json(indent=None)), separators=(",", ":")) for span in spans]
+            with self._lock:
+                self._file.write("\n".join(lines) + "\n")
+                self._file.flush()
+            return SpanExportResult.SUCCESS
+
+        def shutdown(self) -> None:
+            with self._lock:
+                self._file.close()
+
+    return JsonLinesSpanExporter(path)
+
+
+def configure_tracing(exporter: str, sample_rate: float = 1.0, file_path: str = "traces.jsonl", service_name: str = "ai-email-assistant") -> bool:
+    """
+    Install a tracer provider with the requested exporter and sampling rate.
+
+    Args:
+        exporter: ``none``, ``console``, ``file`` or ``otlp``
+        sample_rate: Fraction of new traces to record (0.0-1.0); incoming
+            sampled parents are always honoured
+        file_path: Output path for the ``file`` exporter
+        service_name: ``service.name`` resource attribute
+
+    Returns:
+        True if tracing is active
+    """
+    global _provider
+    exporter = (exporter or "none").lower()
+    if exporter == "none" or _provider is not None:
+        return _provider is not None
+
+    try:
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+        from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+    except ImportError:
+        logger.warning("TRACE_EXPORTER=%s but opentelemetry-sdk is not installed; tracing disabled", exporter)
+        return False
+
+    if exporter == "console":
+        span_exporter = ConsoleSpanExporter()
+    elif exporter == "file":
+        span_exporter = _file_exporter(file_path)
+    elif exporter == "otlp":
+        try:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        except ImportError:
+            logger.warning("TRACE_EXPORTER=otlp needs opentelemetry-exporter-otlp; tracing disabled")
+            return False
+        span_exporter = OTLPSpanExporter()
+    else:
+        logger.warning("Unknown TRACE_EXPORTER %r; tracing disabled", exporter)
+        return False
+
+    sampler = ParentBased(TraceIdRatioBased(max(0.0, min(1.0, sample_rate))))
+    provider = TracerProvider(sampler=sampler, resource=Resource.create({"service.name": service_name}))
+    provider.add_span_processor(BatchSpanProcessor(span_exporter))
+    trace.set_tracer_provider(provider)
+    _provider = provider
+    logger.info("Tracing enabled (exporter=%s, sample_rate=%s)", exporter, sample_rate)
+    return True
+
+
+def shutdown_tracing() -> None:
+    """Flush pending spans and stop the exporter."""
+    global _provider
+    if _provider is not None:
+        _provider.shutdown()
+        _provider = None
+
+
+class TracingMiddleware:
+    """
+    Pure ASGI middleware opening a server span per HTTP request.
+
+    Continues an incoming W3C ``traceparent`` and names the span after the
+    matched route template once routing has happened. Newer FastAPI releases
+    open this span themselves; when one is already recording this is a no-op.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or trace.get_current_span().is_recording():
+            await self.app(scope, receive, send)
+            return
+
+        carrier = {k.decode("latin-1"): v.decode("latin-1") for k, v in scope.get("headers", ())}
+        parent = propagate.extract(carrier, context=otel_context.get_current())
+        method = scope["method"]
+        status_code: Optional[int] = None
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        with tracer.start_as_current_span(method, context=parent, kind=SpanKind.SERVER) as span:
+            span.set_attribute("http.request.method", method)
+            span.set_attribute("url.path", scope.get("path", ""))
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = getattr(scope.get("route"), "path", None)
+                if route:
+                    span.update_name(f"{method} {route}")
+                    span.set_attribute("http.route", route)
+                if status_code is not None:
+                    span.set_attribute("http.response.status_code", status_code)
+                    if status_code >= 500:
+                        span.set_status(Status(StatusCode.ERROR))
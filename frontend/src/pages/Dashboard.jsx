@@ -266,10 +266,10 @@ const Dashboard = () => {
                 return msg;
             }).filter(msg => msg !== null));
 
-            // Show success message
+            // The reply is queued; the outbox delivers it in the background
             setMessages(prev => [...prev, {
                 role: 'assistant',
-                content: "Reply sent successfully! 🚀",
+                content: "Reply queued for sending! 🚀",
                 timestamp: new Date().toISOString()
             }]);
         } catch (err) {